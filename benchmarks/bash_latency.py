@@ -0,0 +1,144 @@
+"""
+Latency of trivial commands and throughput of large outputs through `BashTool`.
+
+"before" is the previous reader, which slept `_output_delay` (0.2 s) between scans
+of the whole decoded stdout buffer for a fixed sentinel. "after" is the current
+reader, which consumes both pipes as data arrives and stops at a per-command
+sentinel. The old reader never drained the pipes, so asyncio stopped reading once
+its buffer was full and large outputs stalled until the timeout (`--timeout` here).
+
+    python -m benchmarks.bash_latency --samples 50
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import signal
+import time
+
+from computer_use_demo.tools import BashTool
+from computer_use_demo.tools.base import CLIResult, ToolError
+from computer_use_demo.tools.bash import _BashSession
+
+from .e2e import _percentiles
+
+TRIVIAL = ["true", "pwd", "echo ok"]
+OUTPUT_SIZES = [100_000, 1_000_000, 50_000_000]
+
+
+class LegacyBashSession(_BashSession):
+    """The session as it was: sleep, then rescan the whole stdout buffer."""
+
+    _output_delay: float = 0.2  # seconds
+    _legacy_sentinel = "<<exit>>"
+
+    async def run(self, command: str):
+        self._process.stdin.write(
+            command.encode() + f"; echo '{self._legacy_sentinel}'\n".encode()
+        )
+        await self._process.stdin.drain()
+        try:
+            async with asyncio.timeout(self._timeout):
+                while True:
+                    await asyncio.sleep(self._output_delay)
+                    output = self._process.stdout._buffer.decode()
+                    if self._legacy_sentinel in output:
+                        output = output[: output.index(self._legacy_sentinel)]
+                        break
+        except asyncio.TimeoutError:
+            self._timed_out = True
+            raise ToolError("timed out") from None
+        error = self._process.stderr._buffer.decode()
+        self._process.stdout._buffer.clear()
+        self._process.stderr._buffer.clear()
+        return CLIResult(output=output.removesuffix("\n"), error=error)
+
+
+async def _new_tool(legacy: bool, timeout: float) -> BashTool:
+    tool = BashTool()
+    if legacy:
+        tool._session = LegacyBashSession()
+        tool._session._timeout = timeout
+        await tool._session.start()
+    await tool(command="true")
+    return tool
+
+
+async def _close(tool: BashTool):
+    process = tool._session._process
+    # kill the whole process group, including a command that is still writing, and
+    # read the pipes to EOF so that they are closed before the loop is shut down
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+    await asyncio.gather(process.stdout.read(), process.stderr.read())
+    await tool.close()
+
+
+async def latencies(legacy: bool, samples: int) -> dict[str, list[float]]:
+    tool = await _new_tool(legacy, timeout=120.0)
+    times: dict[str, list[float]] = {command: [] for command in TRIVIAL}
+    for _ in range(samples):
+        for command in TRIVIAL:
+            start = time.perf_counter()
+            await tool(command=command)
+            times[command].append(time.perf_counter() - start)
+    await _close(tool)
+    return times
+
+
+async def throughput(legacy: bool, size: int, timeout: float) -> float | None:
+    """
+    MB/s of base64 output for `size` input bytes; None if the command stalled. The
+    output size is computed, since results hold only the head and tail of it.
+    """
+    tool = await _new_tool(legacy, timeout)
+    start = time.perf_counter()
+    try:
+        await tool(command=f"head -c {size} /dev/zero | base64")
+    except ToolError:
+        return None
+    finally:
+        await _close(tool)
+    elapsed = time.perf_counter() - start
+    # base64 wraps its output in lines of 76 characters
+    encoded = 4 * -(-size // 3)
+    return (encoded + -(-encoded // 76)) / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    args = parser.parse_args()
+
+    results = {}
+    for label, legacy in (("before", True), ("after", False)):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results[label] = (
+                asyncio.run(latencies(legacy, args.samples)),
+                [
+                    asyncio.run(throughput(legacy, size, args.timeout))
+                    for size in OUTPUT_SIZES
+                ],
+            )
+
+    print(
+        f"{'command':>10}{'before p50':>12}{'p99':>8}{'after p50':>11}{'p99':>8}  (ms)"
+    )
+    for command in TRIVIAL:
+        before = _percentiles(results["before"][0][command])
+        after = _percentiles(results["after"][0][command])
+        print(
+            f"{command:>10}{before[0] * 1000:>12.1f}{before[1] * 1000:>8.1f}"
+            f"{after[0] * 1000:>11.2f}{after[1] * 1000:>8.2f}"
+        )
+    print(f"\n{'input MB':>10}{'before MB/s':>13}{'after MB/s':>12}")
+    for index, size in enumerate(OUTPUT_SIZES):
+        cells = [results[label][1][index] for label in ("before", "after")]
+        before, after = ("stalled" if cell is None else f"{cell:.1f}" for cell in cells)
+        print(f"{size / 1e6:>10g}{before:>13}{after:>12}")
+
+
+if __name__ == "__main__":
+    main()
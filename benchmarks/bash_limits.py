@@ -0,0 +1,120 @@
+"""
+What a timed-out bash command leaves behind, and the cost of per-command accounting.
+
+A command starts a CPU-bound child in the background and then blocks past the
+session's timeout. "before" handles the timeout as `_BashSession` did: the shell
+is terminated when the tool is restarted, and nothing else. "after" is the current
+session, which kills the whole process group and starts a new shell. The report
+shows how many of the command's processes survive, and the CPU they keep using.
+
+Accounting reads the shell's children's CPU time from /proc before and after each
+command; its cost shows in the latency of trivial commands.
+
+    python -m benchmarks.bash_limits
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import signal
+import time
+
+from computer_use_demo.tools import BashTool
+from computer_use_demo.tools.bash import _BashSession
+from computer_use_demo.tools.base import ToolError
+from computer_use_demo.tools.limits import _CLOCK_TICKS, _stat_fields
+
+from .e2e import _percentiles
+
+RUNAWAY = "yes > /dev/null & sleep 600"
+
+
+class LegacyBashSession(_BashSession):
+    """On a timeout, leave everything running; `stop` terminates only the shell."""
+
+    async def _respawn(self):
+        return None
+
+    def stop(self):
+        self._process.terminate()
+
+
+def _group_members(pgid: int) -> list[str]:
+    members = []
+    for pid in os.listdir("/proc"):
+        if pid.isdigit():
+            fields = _stat_fields(pid)
+            if fields is not None and int(fields[2]) == pgid and fields[0] != "Z":
+                members.append(pid)
+    return members
+
+
+def _cpu_seconds(pids: list[str]) -> float:
+    total = 0.0
+    for pid in pids:
+        fields = _stat_fields(pid)
+        if fields is not None:
+            # utime and stime, fields 14 and 15 of proc(5)
+            total += (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    return total
+
+
+async def runaway(legacy: bool, timeout: float) -> tuple[int, float]:
+    """Processes of the runaway command left after the timeout, and their CPU/s."""
+    tool = BashTool()
+    session = LegacyBashSession() if legacy else _BashSession()
+    session._timeout = timeout
+    await session.start()
+    tool._session = session
+    pgid = session._process.pid
+    with contextlib.suppress(ToolError):
+        await tool(command=RUNAWAY)
+    if legacy:
+        # the model's next move after a timeout: restart the tool
+        session.stop()
+    await asyncio.sleep(0.2)
+    survivors = _group_members(pgid)
+    before = _cpu_seconds(survivors)
+    await asyncio.sleep(1.0)
+    used = _cpu_seconds(survivors) - before
+    # clean up what the legacy session left running
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(pgid, signal.SIGKILL)
+    await tool.close()
+    return len(survivors), used
+
+
+async def trivial_latencies(samples: int) -> list[float]:
+    tool = BashTool()
+    await tool(command="true")
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await tool(command="true")
+        times.append(time.perf_counter() - start)
+    await tool.close()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'policy':>8}{'survivors':>11}{'CPU s/s':>9}")
+    for label, legacy in (("before", True), ("after", False)):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            survivors, used = asyncio.run(runaway(legacy, args.timeout))
+        print(f"{label:>8}{survivors:>11}{used:>9.2f}")
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        p50, p99 = _percentiles(asyncio.run(trivial_latencies(args.samples)))
+    print(
+        f"\ntrivial command with accounting: p50 {p50 * 1000:.2f} ms  p99 {p99 * 1000:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Peak memory and result size of `BashTool` for commands with large output.
+
+"before" keeps all of a command's output in memory and returns it whole, as
+`BashTool` did; "after" uses the default `OutputSettings`, which keep the head and
+the tail and spill the rest to a file. Each run is a fresh process, so its peak RSS
+belongs to that command alone. The streaming run counts the partial results that
+reach the progress callback while a slow command prints a line every 0.1 s.
+
+    python -m benchmarks.bash_output --megabytes 1 50 500
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from computer_use_demo.tools import BashTool
+from computer_use_demo.tools.base import tool_progress
+from computer_use_demo.tools.output import OutputSettings
+
+POLICIES = {
+    "before": OutputSettings(head_bytes=2**62, tail_bytes=0, spill=False),
+    "after": OutputSettings(),
+}
+
+
+async def _run(tool: BashTool, command: str):
+    result = await tool(command=command)
+    # end the shells so that their pipes are closed before the loop is shut down
+    await tool.close()
+    return result
+
+
+def run_command(policy: str, megabytes: int) -> dict[str, float]:
+    tool = BashTool(output=POLICIES[policy])
+    # base64 output is 4/3 of its input; aim for `megabytes` of output
+    command = f"head -c {megabytes * 750_000} /dev/urandom | base64"
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = asyncio.run(_run(tool, command))
+    return {
+        "seconds": time.perf_counter() - start,
+        "result_chars": len(result.output or ""),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def stream_partials() -> tuple[int, float]:
+    """Partial results and the latency of the first for a command that runs 1 s."""
+    tool = BashTool(output=OutputSettings(stream_interval=0.2))
+    partials: list[float] = []
+    start = time.perf_counter()
+
+    def progress(partial):
+        partials.append(time.perf_counter() - start)
+
+    async def session():
+        token = tool_progress.set(progress)
+        try:
+            # a task of its own, as the sampling loop runs tool calls
+            return await asyncio.create_task(
+                _run(tool, "for i in $(seq 10); do echo line $i; sleep 0.1; done")
+            )
+        finally:
+            tool_progress.reset(token)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        asyncio.run(session())
+    return len(partials), partials[0] if partials else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megabytes", type=int, nargs="+", default=[1, 50, 500])
+    args = parser.parse_args()
+
+    print(
+        f"{'output MB':>10}{'policy':>8}{'seconds':>9}{'result chars':>14}{'peak RSS MB':>13}"
+    )
+    for megabytes in args.megabytes:
+        for policy in POLICIES:
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                stats = pool.submit(run_command, policy, megabytes).result()
+            print(
+                f"{megabytes:>10}{policy:>8}{stats['seconds']:>9.2f}"
+                f"{stats['result_chars']:>14}{stats['peak_rss_mb']:>13.1f}"
+            )
+
+    count, first = stream_partials()
+    print(
+        f"\nstreaming: {count} partial results, the first after {first * 1000:.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Throughput of several long bash commands, and the latency of `restart`.
+
+Each workload is `--commands` long commands issued in one assistant turn, through a
+`ToolScheduler` as the sampling loop runs them. "one session" sends them all to the
+default shell, which runs them one after another, as `BashTool` did; "sessions"
+gives each a named session of its own; "jobs" launches each as a background job
+and collects the results by polling every 0.1 s. Restart latency is measured with
+and without a warm shell in the pool.
+
+    python -m benchmarks.bash_pool --commands 4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+
+from computer_use_demo.tools import BashTool, ToolCollection
+from computer_use_demo.tools.bash import PoolSettings
+
+from .e2e import _percentiles
+
+WORKLOADS = {
+    "sleep 1": "sleep 1",
+    "cpu": "head -c 200000000 /dev/zero | sha256sum",
+    "download": "sleep 0.5; head -c 20000000 /dev/urandom | gzip -1 | wc -c",
+}
+
+
+async def run_workload(policy: str, command: str, commands: int) -> float:
+    tool = BashTool()
+    scheduler = ToolCollection(tool).scheduler()
+    start = time.perf_counter()
+    if policy == "one session":
+        await scheduler.run_all([("bash", {"command": command})] * commands)
+    elif policy == "sessions":
+        await scheduler.run_all(
+            [
+                ("bash", {"command": command, "session": f"s{i}"})
+                for i in range(commands)
+            ]
+        )
+    else:
+        launched = await scheduler.run_all(
+            [("bash", {"command": command, "background": True})] * commands
+        )
+        pending = {result.output.split()[-1] for result in launched}
+        while pending:
+            await asyncio.sleep(0.1)
+            for job in list(pending):
+                result = await tool(job=job)
+                if "is still running" not in (result.system or ""):
+                    pending.discard(job)
+    elapsed = time.perf_counter() - start
+    await tool.close()
+    return elapsed
+
+
+async def restart_latencies(warm: int, samples: int) -> list[float]:
+    tool = BashTool(pool=PoolSettings(warm=warm))
+    await tool(command="true")
+    times = []
+    for _ in range(samples):
+        # give the pool time to start a replacement, as a turn of the model would
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await tool(restart=True)
+        await tool(command="true")
+        times.append(time.perf_counter() - start)
+    await tool.close()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--commands", type=int, default=4)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'workload':>10}{'policy':>13}{'seconds':>9}{'commands/min':>14}")
+    for name, command in WORKLOADS.items():
+        for policy in ("one session", "sessions", "jobs"):
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                elapsed = asyncio.run(run_workload(policy, command, args.commands))
+            print(
+                f"{name:>10}{policy:>13}{elapsed:>9.2f}"
+                f"{args.commands / elapsed * 60:>14.1f}"
+            )
+
+    print()
+    for warm in (0, 1):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            p50, p99 = _percentiles(asyncio.run(restart_latencies(warm, args.samples)))
+        print(
+            f"restart with {warm} warm:  p50 {p50 * 1000:6.2f} ms  p99 {p99 * 1000:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Screen capture backends on an Xvfb display: latency and CPU per frame.
+
+Starts a private Xvfb server at each resolution and grabs `--frames` frames with
+every capture backend available on it. CPU time is reported for this process (the
+grab and the conversion to a PIL image) and for the X server, which does the copy
+for the socket-based backends.
+
+    python -m benchmarks.capture --frames 50
+"""
+
+import argparse
+import contextlib
+import os
+import shutil
+import subprocess
+import time
+
+from computer_use_demo.tools.capture import available_captures
+
+from .e2e import _percentiles
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def _cpu_seconds(pid: int) -> float:
+    # utime and stime, fields 14 and 15 of /proc/<pid>/stat; the command name in
+    # field 2 may contain spaces, so count from the closing parenthesis
+    with open(f"/proc/{pid}/stat") as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+@contextlib.contextmanager
+def xvfb(width: int, height: int):
+    """A private Xvfb server; yields its display name and process."""
+    read_fd, write_fd = os.pipe()
+    # with -displayfd the server picks a free display and writes its number
+    process = subprocess.Popen(
+        [
+            "Xvfb",
+            "-displayfd",
+            str(write_fd),
+            "-screen",
+            "0",
+            f"{width}x{height}x24",
+            "-nolisten",
+            "tcp",
+        ],
+        pass_fds=(write_fd,),
+        stderr=subprocess.DEVNULL,
+    )
+    os.close(write_fd)
+    try:
+        with os.fdopen(read_fd) as displayfd:
+            display = displayfd.readline().strip()
+        if not display:
+            raise RuntimeError("Xvfb did not start")
+        yield f":{display}", process
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=50)
+    args = parser.parse_args()
+    if shutil.which("Xvfb") is None:
+        parser.exit(1, "Xvfb is not installed\n")
+
+    print(
+        f"{'screen':>10}{'backend':>10}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'client CPU ms':>15}{'server CPU ms':>15}"
+    )
+    for width, height in ((1280, 800), (1920, 1080)):
+        with xvfb(width, height) as (display, server):
+            for capture in available_captures(display):
+                capture.grab()
+                times = []
+                client_start = time.process_time()
+                server_start = _cpu_seconds(server.pid)
+                for _ in range(args.frames):
+                    start = time.perf_counter()
+                    capture.grab()
+                    times.append(time.perf_counter() - start)
+                client_cpu = (time.process_time() - client_start) / args.frames
+                server_cpu = (_cpu_seconds(server.pid) - server_start) / args.frames
+                capture.close()
+                p50, p99 = _percentiles(times)
+                print(
+                    f"{f'{width}x{height}':>10}{capture.name:>10}"
+                    f"{p50 * 1000:>9.2f}{p99 * 1000:>9.2f}"
+                    f"{client_cpu * 1000:>15.2f}{server_cpu * 1000:>15.2f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Per-turn API client overhead: a new synchronous client per turn versus the shared,
+pooled async client from `computer_use_demo.clients`.
+
+Both variants talk to the local stub Messages endpoint, so the numbers are the client's
+own cost (construction, connection setup, request building, parsing). Real endpoints
+add TLS and credential resolution on top of the "fresh client" numbers, so the gap here
+is a lower bound.
+
+    python -m benchmarks.client_overhead --turns 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from anthropic import Anthropic
+
+from computer_use_demo.clients import APIProvider, ClientProvider
+
+from .stub_server import StubMessagesServer
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def _report(label: str, samples: list[float]):
+    samples_ms = sorted(s * 1000 for s in samples)
+    p99 = samples_ms[min(len(samples_ms) - 1, int(len(samples_ms) * 0.99))]
+    print(
+        f"{label:<28} mean {statistics.mean(samples_ms):7.2f} ms"
+        f"  p50 {statistics.median(samples_ms):7.2f} ms  p99 {p99:7.2f} ms"
+    )
+
+
+async def fresh_sync_client(turns: int) -> list[float]:
+    """The previous behaviour: a new client per turn, called on the event loop."""
+    samples = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        client = Anthropic(api_key="stub")
+        raw_response = client.beta.messages.with_raw_response.create(
+            max_tokens=16, messages=MESSAGES, model="stub", betas=[]
+        )
+        raw_response.parse()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def pooled_async_client(turns: int) -> list[float]:
+    provider = ClientProvider()
+    samples = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        client = provider.get(APIProvider.ANTHROPIC, api_key="stub")
+        raw_response = await client.beta.messages.with_raw_response.create(
+            max_tokens=16, messages=MESSAGES, model="stub", betas=[]
+        )
+        raw_response.parse()
+        samples.append(time.perf_counter() - start)
+    await provider.aclose()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    with StubMessagesServer(lambda body: None) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        # warm up imports and the server before measuring
+        asyncio.run(pooled_async_client(5))
+        _report(
+            "fresh sync client per turn", asyncio.run(fresh_sync_client(args.turns))
+        )
+        _report("pooled async client", asyncio.run(pooled_async_client(args.turns)))
+
+
+if __name__ == "__main__":
+    main()
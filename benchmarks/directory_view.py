@@ -0,0 +1,93 @@
+"""
+Latency of `EditTool`'s `view` of a directory on synthetic 100k-file trees.
+
+"before" runs `find PATH -maxdepth 2 -not -path '*/.*'` through `tools/run.py`, as
+the tool did, and truncates its output afterwards. "cold" is the in-process
+`DirectoryLister` of a fresh tool, so nothing is cached; "warm" views the same
+unchanged tree again with the same tool. The file system's own caches are warm in
+all three.
+
+    python -m benchmarks.directory_view --samples 10
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from computer_use_demo.tools import EditTool
+from computer_use_demo.tools.run import run
+
+from .e2e import _percentiles
+
+# name: (directories per level, files per leaf directory); 100k files each
+SHAPES = {
+    "flat": ([], 100_000),
+    "wide": ([100], 1_000),
+    "nested": ([10, 100], 100),
+}
+
+
+def build_tree(root: Path, fanout: list[int], files: int):
+    directories = [root]
+    for count in fanout:
+        directories = [
+            parent / f"d{i:03}" for parent in directories for i in range(count)
+        ]
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+        for i in range(files):
+            (directory / f"f{i:05}.txt").touch()
+        # a hidden entry in every directory, which the listing leaves out
+        (directory / ".hidden").touch()
+
+
+async def find_view(path: Path):
+    _, stdout, _ = await run(rf"find {path} -maxdepth 2 -not -path '*/\.*'")
+    return stdout
+
+
+async def latencies(path: Path, policy: str, samples: int) -> list[float]:
+    tool = EditTool()
+    if policy == "warm":
+        await tool(command="view", path=str(path))
+    times = []
+    for _ in range(samples):
+        if policy == "cold":
+            tool = EditTool()
+        start = time.perf_counter()
+        if policy == "before":
+            await find_view(path)
+        else:
+            await tool(command="view", path=str(path))
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'tree':>8}{'policy':>8}{'p50 ms':>9}{'p99 ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (fanout, files) in SHAPES.items():
+            root = Path(tmp) / name
+            build_tree(root, fanout, files)
+            # directories modified in the last seconds are not cached yet
+            time.sleep(2.5)
+            for policy in ("before", "cold", "warm"):
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(
+                    devnull
+                ):
+                    p50, p99 = _percentiles(
+                        asyncio.run(latencies(root, policy, args.samples))
+                    )
+                print(f"{name:>8}{policy:>8}{p50 * 1000:>9.2f}{p99 * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+End-to-end throughput of `sampling_loop` against a scripted model and an in-memory
+display.
+
+Every turn the stub Messages server asks for one `computer` action, cycling through a
+screenshot, a mouse move, a click and typing; `ComputerTool` draws into a
+`FakeBackend` canvas. For each session length, run in a fresh process, the report
+shows turns per second, the p50/p99 per-turn overhead (turn time minus time spent in
+tools, i.e. the loop, client and local server), and the peak RSS of the process.
+Screenshot encoding and bash round trips are measured separately.
+
+    python -m benchmarks.e2e --turns 10 50 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from PIL import ImageDraw
+
+from computer_use_demo.loop import sampling_loop
+from computer_use_demo.tools import BashTool, ComputerTool, ToolCollection
+from computer_use_demo.tools.backends import FakeBackend
+
+from .stub_server import StubMessagesServer, tool_use_block
+
+ACTIONS = [
+    {"action": "screenshot"},
+    {"action": "mouse_move", "coordinate": [640, 400]},
+    {"action": "left_click"},
+    {"action": "type", "text": "hello world"},
+]
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return statistics.median(samples), p99
+
+
+def desktop_like_backend(width: int = 1280, height: int = 800) -> FakeBackend:
+    """A fake display with windows and text on it, so PNGs are not trivially small."""
+    backend = FakeBackend(width, height)
+    draw = ImageDraw.Draw(backend.canvas)
+    rng = random.Random(0)
+    for _ in range(40):
+        x, y = rng.randrange(width - 200), rng.randrange(height - 150)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle(
+            (x, y, x + rng.randrange(80, 400), y + rng.randrange(40, 300)), fill=color
+        )
+    for row in range(0, height, 14):
+        draw.text(
+            (rng.randrange(40), row), "lorem ipsum dolor sit amet " * 4, fill="black"
+        )
+    return backend
+
+
+class TimedToolCollection(ToolCollection):
+    """Accumulates the wall time spent running tools."""
+
+    busy = 0.0
+
+    async def run(self, *, name, tool_input):
+        start = time.perf_counter()
+        try:
+            return await super().run(name=name, tool_input=tool_input)
+        finally:
+            self.busy += time.perf_counter() - start
+
+
+async def _session(turns: int) -> dict[str, float]:
+    tools = TimedToolCollection(ComputerTool(backend=desktop_like_backend()))
+    turn_ends: list[float] = []
+    tool_time: list[float] = []
+
+    def usage_callback(usage):
+        turn_ends.append(time.perf_counter())
+        tool_time.append(tools.busy)
+
+    start = time.perf_counter()
+    await sampling_loop(
+        model="stub",
+        provider="anthropic",
+        system_prompt_suffix="",
+        messages=[{"role": "user", "content": "go"}],
+        output_callback=lambda block: None,
+        tool_output_callback=lambda result, tool_use_id: None,
+        api_response_callback=lambda response: None,
+        api_key="stub",
+        only_n_most_recent_images=10,
+        tool_collection=tools,
+        usage_callback=usage_callback,
+    )
+    wall = time.perf_counter() - start
+
+    overheads = []
+    previous_end, previous_busy = start, 0.0
+    for end, busy in zip(turn_ends, tool_time):
+        overheads.append((end - previous_end) - (busy - previous_busy))
+        previous_end, previous_busy = end, busy
+    p50, p99 = _percentiles(overheads)
+    return {
+        "turns": len(turn_ends),
+        "turns_per_second": len(turn_ends) / wall,
+        "overhead_p50": p50,
+        "overhead_p99": p99,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_session(turns: int) -> dict[str, float]:
+    def script(body):
+        turn = len(body["messages"]) // 2
+        if turn >= turns - 1:
+            return None
+        return [tool_use_block("computer", **ACTIONS[turn % len(ACTIONS)])]
+
+    with StubMessagesServer(script) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        # keep the tools' progress prints out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return asyncio.run(_session(turns))
+
+
+async def screenshot_encode_times(samples: int, width: int, height: int) -> list[float]:
+    tool = ComputerTool(backend=desktop_like_backend(width, height))
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        await tool.screenshot()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+async def bash_round_trips(samples: int) -> list[float]:
+    tool = BashTool()
+    times = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await tool(command="true")
+        for _ in range(samples):
+            start = time.perf_counter()
+            await tool(command="echo ok")
+            times.append(time.perf_counter() - start)
+        # end the shells so that their pipes are closed before the loop is shut down
+        await tool.close()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'turns':>6}{'turns/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'peak RSS MB':>13}")
+    for turns in args.turns:
+        # a fresh process per session length, so peak RSS belongs to that run alone
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            stats = pool.submit(run_session, turns).result()
+        print(
+            f"{stats['turns']:>6}{stats['turns_per_second']:>10.1f}"
+            f"{stats['overhead_p50'] * 1000:>10.2f}{stats['overhead_p99'] * 1000:>10.2f}"
+            f"{stats['peak_rss_mb']:>13.1f}"
+        )
+
+    for width, height in ((1280, 800), (1920, 1080)):
+        p50, p99 = _percentiles(
+            asyncio.run(screenshot_encode_times(args.samples, width, height))
+        )
+        print(
+            f"screenshot encode {width}x{height}:"
+            f"  p50 {p50 * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms"
+        )
+    p50, p99 = _percentiles(asyncio.run(bash_round_trips(args.samples)))
+    print(f"bash round trip:  p50 {p50 * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Screenshot encoding: time and payload size per codec setting.
+
+Each setting scales and encodes a desktop-like frame to the 1280-pixel-wide size
+`ComputerTool` sends, from a 1280x800 screen (no scaling), a 2560x1600 screen (an
+integer downscale, served by `Image.reduce`) and a 1920x1080 screen (resampled).
+"baseline" is the previous pipeline: a default-filter resize and an optimized PNG.
+
+    python -m benchmarks.encoding --samples 10
+"""
+
+import argparse
+import io
+import time
+
+from PIL import Image
+
+from computer_use_demo.tools.encoding import EncodeSettings, encode_screenshot
+
+from .e2e import _percentiles, desktop_like_backend
+
+SETTINGS = {
+    "png-1": EncodeSettings(codec="png", compress_level=1),
+    "png-6": EncodeSettings(codec="png", compress_level=6),
+    "png-256c": EncodeSettings(codec="png", compress_level=1, palette=256),
+    "png-64c": EncodeSettings(codec="png", compress_level=1, palette=64),
+    "jpeg-80": EncodeSettings(codec="jpeg", quality=80),
+    "jpeg-60": EncodeSettings(codec="jpeg", quality=60),
+    "webp-80": EncodeSettings(codec="webp", quality=80),
+}
+
+
+def baseline(image: Image.Image, size: tuple[int, int]) -> bytes:
+    if image.size != size:
+        image = image.resize(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'screen':>10}{'setting':>10}{'p50 ms':>9}{'p99 ms':>9}{'KiB':>8}")
+    for width, height in ((1280, 800), (2560, 1600), (1920, 1080)):
+        frame = desktop_like_backend(width, height).canvas
+        target = (1280, 1280 * height // width)
+        encoders = {
+            "baseline": lambda: baseline(frame, target),
+            **{
+                name: lambda settings=settings: encode_screenshot(
+                    frame, target, settings
+                )[0]
+                for name, settings in SETTINGS.items()
+            },
+        }
+        for name, encode in encoders.items():
+            times = []
+            for _ in range(args.samples):
+                start = time.perf_counter()
+                data = encode()
+                times.append(time.perf_counter() - start)
+            p50, p99 = _percentiles(times)
+            print(
+                f"{f'{width}x{height}':>10}{name:>10}{p50 * 1000:>9.2f}"
+                f"{p99 * 1000:>9.2f}{len(data) / 1024:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Per-turn cost of keeping only the most recent screenshots in a growing history:
+the full-history scan the sampling loop used to do on every turn versus the
+incremental `ImageIndex` used by the sampling loop.
+
+Each synthetic turn appends an assistant message with a tool_use block and a user
+message with a tool_result holding a short text block and an image, then prunes.
+
+    python -m benchmarks.image_pruning --turns 500
+"""
+
+import argparse
+import copy
+import time
+
+from anthropic.types.beta import BetaMessageParam
+
+from computer_use_demo.history import ImageIndex
+
+# the pruning code never looks at the payload, so a placeholder keeps memory flat
+IMAGE_DATA = "iVBORw0KGgo" * 8
+
+
+def _turn(i: int):
+    tool_use_id = f"toolu_{i:06d}"
+    assistant = {
+        "role": "assistant",
+        "content": [
+            {"type": "text", "text": f"step {i}"},
+            {
+                "type": "tool_use",
+                "id": tool_use_id,
+                "name": "computer",
+                "input": {"action": "screenshot"},
+            },
+        ],
+    }
+    user = {
+        "role": "user",
+        "content": [
+            {
+                "type": "tool_result",
+                "tool_use_id": tool_use_id,
+                "is_error": False,
+                "content": [
+                    {"type": "text", "text": "ok"},
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": "image/png",
+                            "data": IMAGE_DATA,
+                        },
+                    },
+                ],
+            }
+        ],
+    }
+    return assistant, user
+
+
+def filter_to_n_most_recent_images(
+    messages: list[BetaMessageParam],
+    images_to_keep: int,
+    min_removal_threshold: int = 10,
+):
+    """
+    With the assumption that images are screenshots that are of diminishing value as
+    the conversation progresses, remove all but the final `images_to_keep` tool_result
+    images in place, with a chunk of min_removal_threshold to reduce the amount we
+    break the implicit prompt cache.
+
+    The loop's previous pruning, kept as the baseline: it rescans the whole history
+    on every call.
+    """
+    if images_to_keep is None:
+        return messages
+
+    tool_result_blocks = [
+        item
+        for message in messages
+        for item in (message["content"] if isinstance(message["content"], list) else [])
+        if isinstance(item, dict) and item.get("type") == "tool_result"
+    ]
+
+    total_images = sum(
+        1
+        for tool_result in tool_result_blocks
+        for content in tool_result.get("content", [])
+        if isinstance(content, dict) and content.get("type") == "image"
+    )
+
+    images_to_remove = total_images - images_to_keep
+    # for better cache behavior, we want to remove in chunks
+    images_to_remove -= images_to_remove % min_removal_threshold
+
+    for tool_result in tool_result_blocks:
+        if isinstance(tool_result.get("content"), list):
+            new_content = []
+            for content in tool_result.get("content", []):
+                if isinstance(content, dict) and content.get("type") == "image":
+                    if images_to_remove > 0:
+                        images_to_remove -= 1
+                        continue
+                new_content.append(content)
+            tool_result["content"] = new_content
+
+
+def run(turns: int, keep: int, prune) -> list[float]:
+    messages = [{"role": "user", "content": "start"}]
+    samples = []
+    for i in range(turns):
+        messages.extend(copy.deepcopy(_turn(i)))
+        start = time.perf_counter()
+        prune(messages, keep)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--keep", type=int, default=10)
+    args = parser.parse_args()
+
+    index = ImageIndex()
+    for label, prune in (
+        ("full scan", filter_to_n_most_recent_images),
+        ("incremental index", index.prune),
+    ):
+        samples = run(args.turns, args.keep, prune)
+        last = samples[-50:]
+        print(
+            f"{label:<18} total {sum(samples) * 1000:8.2f} ms"
+            f"  last 50 turns {sum(last) / len(last) * 1e6:8.1f} us/turn"
+        )
+
+
+if __name__ == "__main__":
+    main()
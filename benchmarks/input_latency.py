@@ -0,0 +1,153 @@
+"""
+Latency of typical input sequences through `PyAutoGUIBackend`, before and after the
+input worker.
+
+"before" replays the previous backend: one `asyncio.to_thread` hop per pyautogui
+call, each followed by pyautogui's `PAUSE` (0.1 s by default). "after" is the
+current backend with its `InputWorker` and `InputSettings`. Without a display (or
+pyautogui) the calls go to a simulated pyautogui that takes `--call-ms` per call
+and honours `PAUSE` and `_pause` as pyautogui does.
+
+    python -m benchmarks.input_latency --samples 5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+import types
+
+from PIL import Image
+
+from computer_use_demo.tools import ComputerTool
+from computer_use_demo.tools.backends import PyAutoGUIBackend
+from computer_use_demo.tools.capture import FakeCapture
+from computer_use_demo.tools.inputworker import InputSettings
+
+from .e2e import _percentiles
+
+SEQUENCES = {
+    "move+click": [
+        {"action": "mouse_move", "coordinate": [200, 200]},
+        {"action": "left_click"},
+    ],
+    "3 moves+click": [
+        {"action": "mouse_move", "coordinate": [200, 200]},
+        {"action": "mouse_move", "coordinate": [300, 250]},
+        {"action": "mouse_move", "coordinate": [400, 300]},
+        {"action": "left_click"},
+    ],
+    "drag": [{"action": "left_click_drag", "coordinate": [500, 400]}],
+    "key": [{"action": "key", "text": "ctrl+s"}],
+    "type": [{"action": "type", "text": "hello"}],
+    "position": [{"action": "cursor_position"}],
+}
+
+
+def simulated_pyautogui(call_seconds: float) -> types.ModuleType:
+    """A stand-in for pyautogui with its per-call cost and PAUSE behaviour."""
+    module = types.ModuleType("pyautogui")
+    module.PAUSE = 0.1
+    module.FAILSAFE = True
+    module.KEYBOARD_KEYS = [chr(c) for c in range(32, 127)] + ["enter", "tab"]
+    state = {"position": (0, 0)}
+
+    def call(*args, _pause=True, **kwargs):
+        time.sleep(call_seconds)
+        if _pause:
+            time.sleep(module.PAUSE)
+
+    def move_to(x, y, _pause=True, **kwargs):
+        state["position"] = (x, y)
+        call(_pause=_pause)
+
+    module.moveTo = move_to
+    module.mouseDown = module.mouseUp = module.click = module.hotkey = call
+    module.write = call
+    module.position = lambda: state["position"]
+    module.size = lambda: (1280, 800)
+    return module
+
+
+class LegacyPyAutoGUIBackend(PyAutoGUIBackend):
+    """The backend as it was: a thread hop and pyautogui's PAUSE per call."""
+
+    async def move_to(self, x, y):
+        await asyncio.to_thread(self._pyautogui.moveTo, x, y)
+
+    async def mouse_down(self, button="left"):
+        await asyncio.to_thread(self._pyautogui.mouseDown, button=button)
+
+    async def mouse_up(self, button="left"):
+        await asyncio.to_thread(self._pyautogui.mouseUp, button=button)
+
+    async def click(self, button="left", clicks=1):
+        await asyncio.to_thread(self._pyautogui.click, button=button, clicks=clicks)
+
+    async def drag(self, x, y, button="left"):
+        await self.mouse_down(button)
+        await self.move_to(x, y)
+        await self.mouse_up(button)
+
+    async def hotkey(self, *keys):
+        await asyncio.to_thread(self._pyautogui.hotkey, *keys)
+
+    async def write(self, text, interval):
+        await asyncio.to_thread(self._pyautogui.write, text, interval=interval)
+
+    async def position(self):
+        x, y = self._pyautogui.position()
+        return int(x), int(y)
+
+
+async def sequence_latencies(tool: ComputerTool, samples: int) -> dict[str, list]:
+    latencies: dict[str, list] = {name: [] for name in SEQUENCES}
+    for _ in range(samples):
+        for name, actions in SEQUENCES.items():
+            start = time.perf_counter()
+            for action in actions:
+                await tool(**action)
+            latencies[name].append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--call-ms", type=float, default=1.0)
+    parser.add_argument("--pause", type=float, default=InputSettings().pause)
+    args = parser.parse_args()
+
+    try:
+        import pyautogui  # noqa: F401
+    except Exception:
+        # pyautogui fails to import without a display
+        sys.modules["pyautogui"] = simulated_pyautogui(args.call_ms / 1000)
+        print("pyautogui is not usable here: simulating it")
+
+    # no screenshots are taken, so the capture is never used
+    capture = FakeCapture(Image.new("RGB", (1280, 800)))
+    backends = {
+        "before": LegacyPyAutoGUIBackend(capture=capture),
+        "after": PyAutoGUIBackend(
+            capture=capture, settings=InputSettings(pause=args.pause)
+        ),
+    }
+    results = {}
+    for label, backend in backends.items():
+        tool = ComputerTool(backend=backend)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results[label] = asyncio.run(sequence_latencies(tool, args.samples))
+
+    print(f"{'sequence':>14}{'before ms':>11}{'after ms':>10}")
+    for name in SEQUENCES:
+        before, _ = _percentiles(results["before"][name])
+        after, _ = _percentiles(results["after"][name])
+        print(f"{name:>14}{before * 1000:>11.1f}{after * 1000:>10.1f}")
+    print(f"moves coalesced: {backends['after'].input.coalesced}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Goodput of concurrent sessions against a throttling endpoint, with and without the
+shared `RateLimiter`.
+
+The stub Messages server admits `--server-rps` requests per second (token bucket with
+a small burst) and answers anything above that with 429 and a `retry-after` header;
+a fraction of the remaining requests fail with 529 "overloaded". Every session runs
+`--turns` turns of `sampling_loop` with in-memory tools.
+
+    python -m benchmarks.rate_limit --sessions 40 --turns 5
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+
+from computer_use_demo.orchestrator import Orchestrator, SessionSpec
+from computer_use_demo.ratelimit import RateLimiter
+from computer_use_demo.tools import ComputerTool, ToolCollection
+from computer_use_demo.tools.backends import FakeBackend
+
+from .stub_server import StubMessagesServer, tool_use_block
+
+
+class ThrottlingHook:
+    def __init__(self, rps: float, burst: int, overload_rate: float):
+        self.rps = rps
+        self.burst = burst
+        self.overload_rate = overload_rate
+        self.available = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def __call__(self, body):
+        with self.lock:
+            now = time.monotonic()
+            self.available = min(
+                self.burst, self.available + (now - self.updated) * self.rps
+            )
+            self.updated = now
+            if self.available < 1:
+                self.rejected += 1
+                error = {"type": "rate_limit_error", "message": "rate limited"}
+                return 429, {"retry-after": "1"}, {"type": "error", "error": error}
+            self.available -= 1
+            if random.random() < self.overload_rate:
+                self.rejected += 1
+                error = {"type": "overloaded_error", "message": "overloaded"}
+                return 529, {}, {"type": "error", "error": error}
+        return None
+
+
+def run(args, rate_limiter: RateLimiter | None):
+    hook = ThrottlingHook(args.server_rps, args.burst, args.overload_rate)
+
+    def script(body):
+        if len(body["messages"]) >= 2 * args.turns:
+            return None
+        return [tool_use_block("computer", action="cursor_position")]
+
+    with StubMessagesServer(script, latency=args.latency, hook=hook) as server:
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        orchestrator = Orchestrator(
+            model="stub",
+            provider="anthropic",
+            api_key="stub",
+            max_concurrency=args.sessions,
+            tool_factory=lambda spec: ToolCollection(
+                ComputerTool(backend=FakeBackend())
+            ),
+            rate_limiter=rate_limiter,
+        )
+        start = time.perf_counter()
+        stats = asyncio.run(
+            orchestrator.run([SessionSpec("go") for _ in range(args.sessions)])
+        )
+        wall = time.perf_counter() - start
+    turns = sum(s.turns for s in stats)
+    failed = sum(1 for s in stats if s.error)
+    label = "rate limiter" if rate_limiter else "SDK retries only"
+    print(
+        f"{label:<18} {turns / wall:7.2f} turns/s goodput  {turns:4} turns"
+        f"  {failed:3} failed sessions  {hook.rejected:4} rejected  {wall:6.2f} s"
+    )
+    if rate_limiter:
+        print(f"{'':<18} {rate_limiter.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--server-rps", type=float, default=30.0)
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--overload-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    run(args, None)
+    run(args, RateLimiter(initial_concurrency=4, base_delay=0.25))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Settle detection vs a fixed delay before screenshots.
+
+A scripted app answers every click with an animation of varying length (a progress
+bar filling up, from instant to slower than the fixed delay). After each click the
+screenshot is taken either `--delay` seconds later, as `_screenshot_delay` was meant
+to be used, or once the screen has settled (`SettleSettings`). The report shows the
+latency from the click to the screenshot and the share of screenshots that show the
+finished animation rather than a frame in the middle of it.
+
+By default the app draws into a `FakeBackend` canvas. With `--xvfb` it is a Tk
+window on a private Xvfb server, driven with xdotool.
+
+    python -m benchmarks.settle --trials 12
+    python -m benchmarks.settle --xvfb
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from PIL import ImageDraw
+
+from computer_use_demo.tools import ComputerTool
+from computer_use_demo.tools.backends import FakeBackend
+from computer_use_demo.tools.frames import SettleSettings, changed_box
+
+from .capture import xvfb
+from .e2e import _percentiles
+
+DURATIONS = [0.0, 0.05, 0.15, 0.4, 0.8, 1.5]
+COLORS = ["red", "green", "blue", "orange", "purple", "black"]
+FRAME_INTERVAL = 0.016
+
+TK_APP = """
+import sys, time, tkinter as tk
+
+durations = [float(d) for d in sys.argv[1].split(",")]
+colors = sys.argv[2].split(",")
+root = tk.Tk()
+root.geometry(f"{root.winfo_screenwidth()}x{root.winfo_screenheight()}+0+0")
+canvas = tk.Canvas(root, bg="white", highlightthickness=0)
+canvas.pack(fill="both", expand=True)
+clicks = 0
+
+def on_click(event):
+    global clicks
+    duration, color = durations[clicks % len(durations)], colors[clicks % len(colors)]
+    clicks += 1
+    start = time.monotonic()
+
+    def step():
+        elapsed = time.monotonic() - start
+        done = min(1.0, elapsed / duration) if duration else 1.0
+        canvas.delete("bar")
+        canvas.create_rectangle(
+            100, 100, 100 + int(600 * done), 140, fill=color, tags="bar"
+        )
+        if done < 1.0:
+            root.after(16, step)
+
+    step()
+
+root.bind("<Button-1>", on_click)
+root.mainloop()
+"""
+
+
+class AnimatedBackend(FakeBackend):
+    """A fake display that animates a progress bar after every click."""
+
+    def __init__(self, width: int = 1280, height: int = 800):
+        super().__init__(width, height)
+        self.clicks = 0
+        self._animation: asyncio.Task | None = None
+
+    async def click(self, button="left", clicks=1):
+        await super().click(button, clicks)
+        if self._animation:
+            self._animation.cancel()
+        duration = DURATIONS[self.clicks % len(DURATIONS)]
+        color = COLORS[self.clicks % len(COLORS)]
+        self.clicks += 1
+        self._animation = asyncio.create_task(self._animate(duration, color))
+        # the first frame is drawn before the click returns, as a real app would
+        await asyncio.sleep(0)
+
+    async def _animate(self, duration: float, color: str):
+        draw = ImageDraw.Draw(self.canvas)
+        start = time.monotonic()
+        while True:
+            elapsed = time.monotonic() - start
+            done = min(1.0, elapsed / duration) if duration else 1.0
+            draw.rectangle((100, 100, 700, 140), fill="white")
+            draw.rectangle((100, 100, 100 + int(600 * done), 140), fill=color)
+            if done >= 1.0:
+                return
+            await asyncio.sleep(FRAME_INTERVAL)
+
+
+async def run_trials(tool: ComputerTool, trials: int, delay: float | None):
+    """Click `trials` times; returns latencies and whether each frame was final."""
+    latencies, final = [], []
+    for _ in range(trials):
+        await tool(action="left_click")
+        start = time.perf_counter()
+        if delay is not None:
+            await asyncio.sleep(delay)
+        frame = await tool._capture()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(max(DURATIONS) + 0.3)
+        reference = await tool.backend.screenshot()
+        final.append(changed_box(frame, reference, tolerance=8) is None)
+    return latencies, final
+
+
+@contextlib.contextmanager
+def tk_app_display():
+    """A private Xvfb server running the Tk app; yields its display number."""
+    with xvfb(1280, 800) as (display, _):
+        app = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                TK_APP,
+                ",".join(map(str, DURATIONS)),
+                ",".join(COLORS),
+            ],
+            env={**os.environ, "DISPLAY": display},
+        )
+        try:
+            # give the window time to be mapped
+            time.sleep(1.0)
+            yield int(display[1:])
+        finally:
+            app.terminate()
+            app.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--trials", type=int, default=12)
+    parser.add_argument("--delay", type=float, default=ComputerTool._screenshot_delay)
+    parser.add_argument("--xvfb", action="store_true")
+    args = parser.parse_args()
+    if args.xvfb and not (shutil.which("Xvfb") and shutil.which("xdotool")):
+        parser.exit(1, "--xvfb needs Xvfb and xdotool\n")
+
+    print(f"{'policy':>12}{'p50 ms':>9}{'p99 ms':>9}{'final':>8}")
+    for name, delay, settle in (
+        (f"fixed {args.delay:g}s", args.delay, None),
+        ("settle", None, SettleSettings()),
+    ):
+        with contextlib.ExitStack() as stack, open(os.devnull, "w") as devnull:
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            if args.xvfb:
+                display_num = stack.enter_context(tk_app_display())
+                tool = ComputerTool(display_num=display_num, settle=settle)
+                # move onto the app once, so clicks land on it
+                asyncio.run(tool(action="mouse_move", coordinate=[640, 400]))
+            else:
+                tool = ComputerTool(backend=AnimatedBackend(), settle=settle)
+            latencies, final = asyncio.run(run_trials(tool, args.trials, delay))
+        p50, p99 = _percentiles(latencies)
+        print(
+            f"{name:>12}{p50 * 1000:>9.1f}{p99 * 1000:>9.1f}"
+            f"{sum(final) / len(final):>8.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Speculative screenshots in `ComputerTool`: hit rate and time saved.
+
+The scripted model alternates between actions that change the screen and, with
+probability `--followup`, a screenshot request right after them, as the real model
+mostly does. A model that is shown a screenshot with an action's result does not ask
+for one. Every reply takes `--latency` seconds. Each speculation mode runs the same
+script; the report shows the session time, the number of model turns and the
+speculation counters.
+
+    python -m benchmarks.speculation --steps 40 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import time
+
+from computer_use_demo.loop import sampling_loop
+from computer_use_demo.tools import ComputerTool, ToolCollection
+
+from .e2e import desktop_like_backend
+from .stub_server import StubMessagesServer, tool_use_block
+
+ACTIONS = [
+    {"action": "left_click"},
+    {"action": "type", "text": "hello world"},
+    {"action": "key", "text": "Return"},
+    {"action": "mouse_move", "coordinate": [320, 200]},
+]
+
+
+def _saw_screenshot(body) -> bool:
+    content = body["messages"][-1]["content"]
+    return isinstance(content, list) and any(
+        block.get("type") == "image"
+        for result in content
+        if result.get("type") == "tool_result"
+        for block in result.get("content", [])
+    )
+
+
+def make_script(steps: int, followup: float, seed: int = 0):
+    rng = random.Random(seed)
+    state = {"step": 0, "followup": False}
+
+    def script(body):
+        if state["followup"]:
+            state["followup"] = False
+            if not _saw_screenshot(body):
+                return [tool_use_block("computer", action="screenshot")]
+        if state["step"] >= steps:
+            return None
+        action = ACTIONS[state["step"] % len(ACTIONS)]
+        state["step"] += 1
+        state["followup"] = rng.random() < followup
+        return [tool_use_block("computer", **action)]
+
+    return script
+
+
+async def _session(tool: ComputerTool) -> int:
+    turns = 0
+
+    def api_response_callback(response):
+        nonlocal turns
+        turns += 1
+
+    await sampling_loop(
+        model="stub",
+        provider="anthropic",
+        system_prompt_suffix="",
+        messages=[{"role": "user", "content": "go"}],
+        output_callback=lambda block: None,
+        tool_output_callback=lambda result, tool_use_id: None,
+        api_response_callback=api_response_callback,
+        api_key="stub",
+        only_n_most_recent_images=3,
+        tool_collection=ToolCollection(tool),
+    )
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--steps", type=int, default=40)
+    parser.add_argument("--followup", type=float, default=0.9)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':>8}{'wall s':>9}{'turns':>7}{'requests':>10}{'hits':>6}"
+        f"{'hit rate':>10}{'attached':>10}{'wasted':>8}{'saved ms':>10}"
+    )
+    for mode in (None, "cache", "attach"):
+        tool = ComputerTool(
+            backend=desktop_like_backend(), speculative_screenshots=mode
+        )
+        tool._screenshot_delay = args.delay
+        script = make_script(args.steps, args.followup)
+        with StubMessagesServer(script, latency=args.latency) as server:
+            os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+            start = time.perf_counter()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                turns = asyncio.run(_session(tool))
+            wall = time.perf_counter() - start
+        stats = tool.speculation_stats
+        print(
+            f"{mode or 'off':>8}{wall:>9.2f}{turns:>7}{stats.requests:>10}"
+            f"{stats.hits:>6}{stats.hit_rate:>10.0%}{stats.attached:>10}"
+            f"{stats.wasted:>8}{stats.time_saved * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+A local stand-in for the Anthropic Messages API, used by the benchmarks.
+
+The server speaks just enough of `POST /v1/messages` for the SDK to parse its replies.
+Responses come from a script: a list of content-block lists that are returned in
+order, one per request. Once the script is exhausted a final text-only reply ends the
+turn, so `sampling_loop` returns. Requests with `"stream": true` are answered with
+server-sent events, optionally pausing between content blocks to mimic generation.
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+ContentBlocks = list[dict[str, Any]]
+
+FINAL_REPLY: ContentBlocks = [{"type": "text", "text": "Done."}]
+
+
+def text_block(text: str) -> dict[str, Any]:
+    return {"type": "text", "text": text}
+
+
+_tool_use_ids = itertools.count()
+
+
+def tool_use_block(name: str, **tool_input) -> dict[str, Any]:
+    return {
+        "type": "tool_use",
+        "id": f"toolu_stub_{next(_tool_use_ids):08d}",
+        "name": name,
+        "input": tool_input,
+    }
+
+
+def make_message(content: ContentBlocks, input_tokens: int = 0) -> dict[str, Any]:
+    stop_reason = (
+        "tool_use"
+        if any(block["type"] == "tool_use" for block in content)
+        else "end_turn"
+    )
+    return {
+        "id": "msg_stub",
+        "type": "message",
+        "role": "assistant",
+        "model": "stub",
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": 1},
+    }
+
+
+class StubMessagesServer:
+    """
+    Threaded HTTP server answering Messages API requests from a script.
+
+    `script` may also be a callable taking the decoded request body and returning the
+    content blocks to reply with, or None to end the turn. `latency` is added to every
+    response to model server-side processing time; `hook`, if given, may return an
+    `(status, headers, body)` tuple to override a response (used to inject errors).
+    `block_delay` is slept before each content block of a streamed response.
+    """
+
+    def __init__(
+        self,
+        script: list[ContentBlocks] | Callable[[dict], ContentBlocks | None] = (),
+        *,
+        latency: float = 0.0,
+        block_delay: float = 0.0,
+        hook: Callable[[dict], tuple[int, dict[str, str], dict] | None] | None = None,
+    ):
+        self.script = script if callable(script) else list(script)
+        self.latency = latency
+        self.block_delay = block_delay
+        self.hook = hook
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _next_reply(self, body: dict) -> tuple[int, dict[str, str], dict]:
+        if self.hook and (override := self.hook(body)):
+            return override
+        with self._lock:
+            if callable(self.script):
+                content = self.script(body)
+            else:
+                content = self.script.pop(0) if self.script else None
+        # rough estimate so usage-based reporting has something to show
+        input_tokens = len(json.dumps(body.get("messages", []))) // 4
+        return 200, {}, make_message(content or FINAL_REPLY, input_tokens)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, headers, payload = server._next_reply(body)
+                if status == 200 and body.get("stream"):
+                    return self._send_stream(payload)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, event: dict[str, Any]):
+                data = f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                chunk = data.encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+
+            def _send_stream(self, message: dict[str, Any]):
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+                content = message.pop("content")
+                self._send_event(
+                    {"type": "message_start", "message": {**message, "content": []}}
+                )
+                for index, block in enumerate(content):
+                    if server.block_delay:
+                        time.sleep(server.block_delay)
+                    if block["type"] == "tool_use":
+                        start = {**block, "input": {}}
+                        delta = {
+                            "type": "input_json_delta",
+                            "partial_json": json.dumps(block["input"]),
+                        }
+                    else:
+                        start = {**block, "text": ""}
+                        delta = {"type": "text_delta", "text": block["text"]}
+                    for event in (
+                        {
+                            "type": "content_block_start",
+                            "index": index,
+                            "content_block": start,
+                        },
+                        {"type": "content_block_delta", "index": index, "delta": delta},
+                        {"type": "content_block_stop", "index": index},
+                    ):
+                        self._send_event(event)
+                self._send_event(
+                    {
+                        "type": "message_delta",
+                        "delta": {
+                            "stop_reason": message["stop_reason"],
+                            "stop_sequence": None,
+                        },
+                        "usage": {"output_tokens": message["usage"]["output_tokens"]},
+                    }
+                )
+                self._send_event({"type": "message_stop"})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
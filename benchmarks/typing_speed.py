@@ -0,0 +1,198 @@
+"""
+Throughput and correctness of the `type` action.
+
+Types a short string, a line with capital letters and a 2,000-character email body
+(with newlines, tabs and non-ASCII characters) with the old policy (each run of text in one call with a 12 ms
+delay per key), with chunked typing at 12 ms and 1 ms per key, and with chunked
+typing plus clipboard paste for long strings. The report shows characters per
+second and whether the text arrived intact.
+
+By default the text goes to a `FakeBackend` that charges 12 ms per keystroke and
+5 ms per call, as `xdotool` roughly does. With `--xvfb` it goes into a Tk text
+widget on a private Xvfb server, once through xdotool (and xclip or xsel to paste)
+and once through pyautogui (and pyperclip), each run in a process of its own since
+pyautogui connects to the display it finds when it is imported.
+
+    python -m benchmarks.typing_speed
+    python -m benchmarks.typing_speed --xvfb
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from computer_use_demo.tools import ComputerTool
+from computer_use_demo.tools.backends import FakeBackend
+from computer_use_demo.tools.base import ToolError
+from computer_use_demo.tools.keyboard import SPECIAL_KEYS, TypingSettings
+
+from .capture import xvfb
+
+CALL_OVERHEAD = 0.005
+
+SHORT_TEXT = "user@example.com"
+MIXED_TEXT = "Hello World, the Q3 Review moved to 3PM (Room B)!"
+EMAIL_BODY = (
+    "Hi Zoë,\n\n\tThanks for the notes from Tuesday — attached is the revised plan. "
+    + "The rollout starts on the 3rd; every team signs off before the freeze. " * 26
+    + "\n\nBest,\nSam"
+)
+
+POLICIES = {
+    "unchunked": TypingSettings(chunk_size=10**9, paste_threshold=None),
+    "chunked": TypingSettings(paste_threshold=None),
+    "chunked 1ms": TypingSettings(delay_ms=1, paste_threshold=None),
+    "chunk+paste": TypingSettings(),
+}
+
+TK_APP = """
+import sys, tkinter as tk
+
+output = sys.argv[1]
+root = tk.Tk()
+root.geometry(f"{root.winfo_screenwidth()}x{root.winfo_screenheight()}+0+0")
+text = tk.Text(root)
+text.pack(fill="both", expand=True)
+text.focus_set()
+text.bind("<F5>", lambda event: text.delete("1.0", "end"))
+last = None
+
+def dump():
+    global last
+    content = text.get("1.0", "end-1c")
+    if content != last:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(content)
+        last = content
+    root.after(50, dump)
+
+dump()
+root.mainloop()
+"""
+
+
+class KeystrokeBackend(FakeBackend):
+    """A fake display that takes as long to type as xdotool and records the text."""
+
+    def __init__(self):
+        super().__init__()
+        self.typed = ""
+
+    async def write(self, text, interval):
+        await asyncio.sleep(CALL_OVERHEAD + interval * len(text))
+        self.typed += text
+
+    async def hotkey(self, *keys):
+        await asyncio.sleep(CALL_OVERHEAD)
+        keys_to_chars = {key: char for char, key in SPECIAL_KEYS.items()}
+        self.typed += keys_to_chars.get("+".join(keys), "")
+
+    async def paste(self, text, keys):
+        await asyncio.sleep(2 * CALL_OVERHEAD)
+        self.typed += text
+        return True
+
+
+async def _type(tool: ComputerTool, text: str) -> float:
+    start = time.perf_counter()
+    await tool(action="type", text=text)
+    return time.perf_counter() - start
+
+
+def run_fake(settings: TypingSettings, text: str) -> tuple[float, bool]:
+    backend = KeystrokeBackend()
+    tool = ComputerTool(backend=backend, typing=settings)
+    elapsed = asyncio.run(_type(tool, text))
+    return elapsed, backend.typed == text
+
+
+@contextlib.contextmanager
+def tk_text_app():
+    """Xvfb running a Tk text widget; yields the display number and output file."""
+    with tempfile.TemporaryDirectory() as tmp, xvfb(1280, 800) as (display, _):
+        output = Path(tmp) / "text"
+        app = subprocess.Popen(
+            [sys.executable, "-c", TK_APP, str(output)],
+            env={**os.environ, "DISPLAY": display},
+        )
+        try:
+            time.sleep(1.0)
+            yield int(display[1:]), output
+        finally:
+            app.terminate()
+            app.wait()
+
+
+def run_xvfb(backend: str, settings: TypingSettings, text: str) -> tuple[float, bool]:
+    with tk_text_app() as (display_num, output):
+        if backend == "pyautogui":
+            os.environ["DISPLAY"] = f":{display_num}"
+            tool = ComputerTool(typing=settings)
+        else:
+            tool = ComputerTool(display_num=display_num, typing=settings)
+
+        async def session():
+            await tool(action="mouse_move", coordinate=[640, 400])
+            await tool(action="left_click")
+            await tool(action="key", text="F5")
+            return await _type(tool, text)
+
+        try:
+            elapsed = asyncio.run(session())
+        except ToolError:
+            # for example a character that needs a clipboard where there is none
+            return float("nan"), False
+        # wait for the app to write out what it received
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            if output.exists() and output.read_text(encoding="utf-8") == text:
+                return elapsed, True
+            time.sleep(0.1)
+        return elapsed, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--xvfb", action="store_true")
+    args = parser.parse_args()
+    if args.xvfb and not (shutil.which("Xvfb") and shutil.which("xdotool")):
+        parser.exit(1, "--xvfb needs Xvfb and xdotool\n")
+    backends = ["xdotool", "pyautogui"] if args.xvfb else ["fake"]
+
+    print(
+        f"{'backend':>10}{'text':>7}{'policy':>13}{'seconds':>9}{'chars/s':>9}"
+        f"{'intact':>8}"
+    )
+    texts = (("short", SHORT_TEXT), ("mixed", MIXED_TEXT), ("email", EMAIL_BODY))
+    for backend in backends:
+        for label, text in texts:
+            for name, settings in POLICIES.items():
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(
+                    devnull
+                ):
+                    if backend == "fake":
+                        elapsed, intact = run_fake(settings, text)
+                    else:
+                        with ProcessPoolExecutor(
+                            1, mp_context=get_context("spawn")
+                        ) as pool:
+                            elapsed, intact = pool.submit(
+                                run_xvfb, backend, settings, text
+                            ).result()
+                print(
+                    f"{backend:>10}{label:>7}{name:>13}{elapsed:>9.2f}"
+                    f"{len(text) / elapsed:>9.0f}{'yes' if intact else 'NO':>8}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Content-addressed storage for screenshots and other binary tool output.
+
+A `BlobStore` keeps blobs keyed by their SHA-256 in a memory LRU and writes the
+least recently used ones to a spill directory once the LRU is over its size limit.
+Tool results and message history hold `BlobRef` handles instead of base64 strings;
+`resolve_blobs` turns the handles in a history into base64 data only for the
+request about to be sent, so long sessions keep one copy of each distinct image and
+identical screenshots are stored once. A blob is deleted, from memory and the spill
+directory, once no handle to it is left, e.g. after image pruning has dropped the
+last result that showed it.
+"""
+
+import base64
+import hashlib
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from anthropic.types.beta import BetaMessageParam
+
+
+@dataclass(frozen=True, kw_only=True)
+class BlobRef:
+    """A handle to a blob in a `BlobStore`."""
+
+    digest: str
+    media_type: str
+    size: int
+    width: int | None = None
+    height: int | None = None
+    store: "BlobStore" = field(repr=False, compare=False)
+
+    def data(self) -> bytes:
+        return self.store.get(self.digest)
+
+    def base64(self) -> str:
+        return base64.b64encode(self.data()).decode()
+
+    # the store counts live handles, so copies share the original
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class BlobStore:
+    """
+    Blobs by SHA-256, at most `memory_limit` bytes of them in memory. Evicted blobs
+    are written to `spill_dir`, a temporary directory by default, and read back on
+    access. Blobs are deleted once every `BlobRef` to them has been collected.
+    """
+
+    def __init__(
+        self,
+        memory_limit: int = 32 * 2**20,
+        spill_dir: str | Path | None = None,
+    ):
+        self.memory_limit = memory_limit
+        self._spill_dir = Path(spill_dir) if spill_dir else None
+        self._temp_dir: tempfile.TemporaryDirectory | None = None
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._spilled: set[str] = set()
+        # live handles per blob
+        self._refs: dict[str, int] = {}
+        # reentrant: a handle may be collected, and released, while the lock is held
+        self._lock = threading.RLock()
+
+    @property
+    def spill_dir(self) -> Path:
+        if self._spill_dir is None:
+            # created on first use and removed with the store
+            self._temp_dir = tempfile.TemporaryDirectory(prefix="computer-use-blobs-")
+            self._spill_dir = Path(self._temp_dir.name)
+        self._spill_dir.mkdir(parents=True, exist_ok=True)
+        return self._spill_dir
+
+    def __len__(self):
+        return len(self._memory.keys() | self._spilled)
+
+    def __contains__(self, digest: str):
+        return digest in self._memory or digest in self._spilled
+
+    def put(
+        self,
+        data: bytes,
+        media_type: str = "image/png",
+        *,
+        width: int | None = None,
+        height: int | None = None,
+    ) -> BlobRef:
+        """Store `data` (a no-op if identical bytes are stored) and return a handle."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+            elif digest not in self._spilled:
+                self._remember(digest, data)
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+        ref = BlobRef(
+            digest=digest,
+            media_type=media_type,
+            size=len(data),
+            width=width,
+            height=height,
+            store=self,
+        )
+        weakref.finalize(ref, self._release, digest).atexit = False
+        return ref
+
+    def get(self, digest: str) -> bytes:
+        with self._lock:
+            data = self._memory.get(digest)
+            if data is not None:
+                self._memory.move_to_end(digest)
+                return data
+            if digest not in self._spilled:
+                raise KeyError(digest)
+            data = (self.spill_dir / digest).read_bytes()
+            self._remember(digest, data)
+            return data
+
+    def _release(self, digest: str):
+        with self._lock:
+            count = self._refs[digest] - 1
+            if count:
+                self._refs[digest] = count
+                return
+            del self._refs[digest]
+            data = self._memory.pop(digest, None)
+            if data is not None:
+                self._memory_bytes -= len(data)
+            if digest in self._spilled:
+                self._spilled.discard(digest)
+                (self.spill_dir / digest).unlink(missing_ok=True)
+
+    def _remember(self, digest: str, data: bytes):
+        self._memory[digest] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.memory_limit and len(self._memory) > 1:
+            old_digest, old_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_data)
+            if old_digest not in self._spilled:
+                (self.spill_dir / old_digest).write_bytes(old_data)
+                self._spilled.add(old_digest)
+
+
+class BlobDirectory:
+    """
+    Images written once to `<path>/<sha256>`, for on-disk logs (cassettes, session
+    journals) that reference images by hash instead of embedding them.
+    """
+
+    # base64 strings recently hashed; the same screenshot is usually seen twice in
+    # a row, as a tool result and in the message carrying it
+    HASH_CACHE_SIZE = 16
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._stored = {blob.name for blob in self.path.iterdir()}
+        self._hashes: OrderedDict[str, str] = OrderedDict()
+        self._loaded: dict[str, BlobRef] = {}
+
+    def store(self, data: str | BlobRef) -> str:
+        """Write a blob or base64 string unless already present; return its hash."""
+        if isinstance(data, BlobRef):
+            # blobs are already keyed by the SHA-256 of their bytes
+            if data.digest not in self._stored:
+                (self.path / data.digest).write_bytes(data.data())
+                self._stored.add(data.digest)
+            return data.digest
+        digest = self._hashes.get(data)
+        if digest is not None:
+            self._hashes.move_to_end(data)
+            return digest
+        raw = base64.b64decode(data)
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in self._stored:
+            (self.path / digest).write_bytes(raw)
+            self._stored.add(digest)
+        self._hashes[data] = digest
+        if len(self._hashes) > self.HASH_CACHE_SIZE:
+            self._hashes.popitem(last=False)
+        return digest
+
+    def load(
+        self,
+        digest: str,
+        media_type: str = "image/png",
+        *,
+        width: int | None = None,
+        height: int | None = None,
+    ) -> BlobRef:
+        """Read a stored image into the default `BlobStore`."""
+        ref = self._loaded.get(digest)
+        if ref is None:
+            ref = self._loaded[digest] = default_blob_store().put(
+                (self.path / digest).read_bytes(),
+                media_type,
+                width=width,
+                height=height,
+            )
+        return ref
+
+    def encode_images(self, value: Any, drop_keys: tuple[str, ...] = ()) -> Any:
+        """
+        Return a copy of `value` (messages or blocks) with image sources replaced by
+        references to stored images, leaving out any `drop_keys`.
+        """
+        if isinstance(value, list):
+            return [self.encode_images(item, drop_keys) for item in value]
+        if not isinstance(value, dict):
+            return value
+        source = value.get("source")
+        if (
+            value.get("type") == "image"
+            and isinstance(source, dict)
+            and source.get("type") == "base64"
+        ):
+            data = source["data"]
+            encoded = {
+                "type": "sha256",
+                "media_type": source.get("media_type"),
+                "sha256": self.store(data),
+            }
+            if isinstance(data, BlobRef) and data.width and data.height:
+                encoded.update(width=data.width, height=data.height)
+            return {
+                **{k: v for k, v in value.items() if k not in drop_keys},
+                "source": encoded,
+            }
+        return {
+            key: self.encode_images(item, drop_keys)
+            for key, item in value.items()
+            if key not in drop_keys
+        }
+
+    def decode_images(self, value: Any) -> Any:
+        """Reverse `encode_images`, loading images into the default store."""
+        if isinstance(value, list):
+            return [self.decode_images(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        source = value.get("source")
+        if (
+            value.get("type") == "image"
+            and isinstance(source, dict)
+            and source.get("type") == "sha256"
+        ):
+            media_type = source.get("media_type") or "image/png"
+            ref = self.load(
+                source["sha256"],
+                media_type,
+                width=source.get("width"),
+                height=source.get("height"),
+            )
+            return {
+                **value,
+                "source": {"type": "base64", "media_type": media_type, "data": ref},
+            }
+        return {key: self.decode_images(item) for key, item in value.items()}
+
+
+_default_store: BlobStore | None = None
+
+
+def default_blob_store() -> BlobStore:
+    """The process-wide store used by tools that are not given one."""
+    global _default_store
+    if _default_store is None:
+        _default_store = BlobStore()
+    return _default_store
+
+
+def _resolve_block(block: Any) -> Any:
+    if not isinstance(block, dict):
+        return block
+    if block.get("type") == "image":
+        source = block.get("source")
+        if isinstance(source, dict) and isinstance(source.get("data"), BlobRef):
+            return {**block, "source": {**source, "data": source["data"].base64()}}
+    elif block.get("type") == "tool_result" and isinstance(block.get("content"), list):
+        content = _resolve_blocks(block["content"])
+        if content is not block["content"]:
+            return {**block, "content": content}
+    return block
+
+
+def _resolve_blocks(blocks: list[Any]) -> list[Any]:
+    resolved = [_resolve_block(block) for block in blocks]
+    if all(new is old for new, old in zip(resolved, blocks)):
+        return blocks
+    return resolved
+
+
+def resolve_blobs(messages: list[BetaMessageParam]) -> list[BetaMessageParam]:
+    """
+    Return `messages` with every `BlobRef` image replaced by its base64 data. Only
+    the messages and blocks on the way to an image are copied; the rest, and the
+    input itself, are left as they are.
+    """
+    resolved = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, list):
+            new_content = _resolve_blocks(content)
+            if new_content is not content:
+                message = {**message, "content": new_content}
+        resolved.append(message)
+    return resolved
@@ -0,0 +1,400 @@
+"""
+Recording `sampling_loop` runs to disk and replaying them offline.
+
+A cassette is a directory with an `events.jsonl` log and an `images/` folder. While
+recording, every model request and response and every tool result is appended to the
+log; screenshots are written once to `images/<sha256>` and referenced by hash. A
+replayed loop gets its responses and tool results from the cassette instead of the
+API and the desktop, either as fast as possible or with the recorded timings, so the
+loop's own overhead can be measured without any network or display.
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Literal
+
+import httpx
+from anthropic.types.beta import (
+    BetaMessage,
+    BetaMessageParam,
+    BetaRawContentBlockDeltaEvent,
+    BetaRawContentBlockStartEvent,
+    BetaRawContentBlockStopEvent,
+    BetaRawMessageDeltaEvent,
+    BetaRawMessageStartEvent,
+    BetaRawMessageStopEvent,
+    BetaRawMessageStreamEvent,
+    BetaToolUnionParam,
+)
+
+from .blobs import BlobDirectory
+from .tools import CLIResult, ToolCollection, ToolResult
+from .tools.base import DESKTOP, ToolFailure
+
+EVENTS_FILE = "events.jsonl"
+IMAGES_DIR = "images"
+
+_RESULT_TYPES: dict[str, type[ToolResult]] = {
+    cls.__name__: cls for cls in (ToolResult, CLIResult, ToolFailure)
+}
+
+
+def _tool_key(name: str, tool_input: dict[str, Any]) -> tuple[str, str]:
+    return name, json.dumps(tool_input, sort_keys=True)
+
+
+def _to_json(value: Any) -> Any:
+    # assistant content is kept in the history as SDK models
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Cassette:
+    """
+    A recording of one or more `sampling_loop` runs; pass it as `cassette=`.
+
+    Open one with `Cassette.record(path)` or `Cassette.replay(path, realtime=...)`.
+    When replaying, responses are returned in recorded order and tool results are
+    matched by tool name and input, so the replayed loop must make the same calls.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        mode: Literal["record", "replay"],
+        *,
+        realtime: bool = False,
+    ):
+        self.path = Path(path)
+        self.mode = mode
+        self.realtime = realtime
+        self._blobs = BlobDirectory(self.path / IMAGES_DIR)
+        if mode == "record":
+            self._log = (self.path / EVENTS_FILE).open("w", encoding="utf-8")
+            self._messages: list[BetaMessageParam] | None = None
+            self._recorded_messages = 0
+        else:
+            self._load()
+
+    @classmethod
+    def record(cls, path: str | Path) -> "Cassette":
+        return cls(path, "record")
+
+    @classmethod
+    def replay(cls, path: str | Path, *, realtime: bool = False) -> "Cassette":
+        return cls(path, "replay", realtime=realtime)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def close(self):
+        if self.mode == "record":
+            self._log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # recording
+
+    def record_tools(self, tool_collection: ToolCollection) -> ToolCollection:
+        """Wrap `tool_collection` so that every result it returns is recorded."""
+        self._write({"event": "tools", "tools": tool_collection.to_params()})
+        return _RecordingToolCollection(tool_collection, self)
+
+    def record_turn(
+        self, request: dict[str, Any], response: BetaMessage, elapsed: float
+    ):
+        """
+        Record a model call. Only the messages appended since the previous request
+        of the same history are written, so the log grows with the conversation
+        rather than with its square.
+        """
+        messages = request["messages"]
+        offset = self._recorded_messages
+        if messages is not self._messages or len(messages) < offset:
+            offset = 0
+        self._write(
+            {
+                "event": "request",
+                "offset": offset,
+                "messages": self._blobs.encode_images(messages[offset:]),
+                **{
+                    key: value
+                    for key, value in request.items()
+                    if key in ("model", "max_tokens", "betas")
+                },
+            }
+        )
+        self._messages = messages
+        self._recorded_messages = len(messages)
+        self._write(
+            {
+                "event": "response",
+                "elapsed": round(elapsed, 6),
+                "message": response.model_dump(mode="json"),
+            }
+        )
+
+    def _record_tool_result(
+        self,
+        name: str,
+        tool_input: dict[str, Any],
+        result: ToolResult,
+        elapsed: float,
+    ):
+        self._write(
+            {
+                "event": "tool",
+                "name": name,
+                "input": tool_input,
+                "elapsed": round(elapsed, 6),
+                "result": {
+                    "type": type(result).__name__,
+                    "output": result.output,
+                    "error": result.error,
+                    "system": result.system,
+                    "image": self._describe_image(result),
+                },
+            }
+        )
+
+    def _describe_image(self, result: ToolResult) -> dict[str, Any] | None:
+        if result.image:
+            return {
+                "sha256": self._blobs.store(result.image),
+                "media_type": result.image.media_type,
+                "width": result.image.width,
+                "height": result.image.height,
+            }
+        if result.base64_image:
+            return {"sha256": self._blobs.store(result.base64_image)}
+        return None
+
+    def _write(self, event: dict[str, Any]):
+        self._log.write(json.dumps(event, default=_to_json) + "\n")
+        self._log.flush()
+
+    # replaying
+
+    def _load(self):
+        self.tools_params: list[BetaToolUnionParam] = []
+        self._responses: deque[tuple[float, dict[str, Any]]] = deque()
+        self._results: defaultdict[tuple[str, str], deque[dict[str, Any]]] = (
+            defaultdict(deque)
+        )
+        with (self.path / EVENTS_FILE).open(encoding="utf-8") as log:
+            for line in log:
+                event = json.loads(line)
+                kind = event["event"]
+                if kind == "tools" and not self.tools_params:
+                    self.tools_params = event["tools"]
+                elif kind == "response":
+                    self._responses.append((event["elapsed"], event["message"]))
+                elif kind == "tool":
+                    key = _tool_key(event["name"], event["input"])
+                    self._results[key].append(event)
+
+    def client(self) -> "_ReplayClient":
+        """A stand-in for the API client that returns the recorded responses."""
+        return _ReplayClient(self)
+
+    def replay_tools(self) -> ToolCollection:
+        """A tool collection that returns the recorded results; needs no display."""
+        return _ReplayToolCollection(self)
+
+    async def _next_response(self) -> dict[str, Any]:
+        if not self._responses:
+            raise RuntimeError(f"cassette {self.path} has no more recorded responses")
+        elapsed, message = self._responses.popleft()
+        if self.realtime:
+            await asyncio.sleep(elapsed)
+        return message
+
+    async def _next_tool_result(
+        self, name: str, tool_input: dict[str, Any]
+    ) -> ToolResult:
+        recorded = self._results.get(_tool_key(name, tool_input))
+        if not recorded:
+            return ToolFailure(error=f"No recorded result for a {name} call")
+        event = recorded.popleft()
+        if self.realtime:
+            await asyncio.sleep(event["elapsed"])
+        result = event["result"]
+        image = result["image"]
+        return _RESULT_TYPES.get(result["type"], ToolResult)(
+            output=result["output"],
+            error=result["error"],
+            system=result["system"],
+            image=(
+                self._blobs.load(
+                    image["sha256"],
+                    image.get("media_type") or "image/png",
+                    width=image.get("width"),
+                    height=image.get("height"),
+                )
+                if image
+                else None
+            ),
+        )
+
+
+class _RecordingToolCollection(ToolCollection):
+    def __init__(self, tool_collection: ToolCollection, cassette: Cassette):
+        super().__init__(*tool_collection.tools)
+        self._inner = tool_collection
+        self._cassette = cassette
+
+    def to_params(self):
+        return self._inner.to_params()
+
+    def resource_keys(self, *, name, tool_input):
+        return self._inner.resource_keys(name=name, tool_input=tool_input)
+
+    async def run(self, *, name, tool_input):
+        start = time.perf_counter()
+        result = await self._inner.run(name=name, tool_input=tool_input)
+        self._cassette._record_tool_result(
+            name, tool_input, result, time.perf_counter() - start
+        )
+        return result
+
+
+class _ReplayToolCollection(ToolCollection):
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self._cassette = cassette
+
+    def to_params(self):
+        return self._cassette.tools_params
+
+    def resource_keys(self, *, name, tool_input):
+        # the real tools are not available: order edits per path, as `EditTool`
+        # does, and everything else on the desktop
+        if "path" in tool_input:
+            return (name, tool_input["path"])
+        return (DESKTOP,)
+
+    async def run(self, *, name, tool_input):
+        return await self._cassette._next_tool_result(name, tool_input)
+
+
+class _ReplayResponse:
+    """Quacks like the SDK's raw response as far as the loop and frontends care."""
+
+    def __init__(self, message: dict[str, Any]):
+        self._message = message
+        self.headers = httpx.Headers()
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self._message)
+
+    def parse(self) -> BetaMessage:
+        return BetaMessage.model_validate(self._message)
+
+
+class _ReplayStream:
+    def __init__(self, events: list[BetaRawMessageStreamEvent]):
+        self._events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def __aiter__(self):
+        for event in self._events:
+            yield event
+
+
+def _stream_events(message: dict[str, Any]) -> list[BetaRawMessageStreamEvent]:
+    """Split a recorded message back into the events a streamed request yields."""
+    events: list[BetaRawMessageStreamEvent] = [
+        BetaRawMessageStartEvent(
+            type="message_start",
+            message=BetaMessage.model_validate(
+                {**message, "content": [], "stop_reason": None}
+            ),
+        )
+    ]
+    for index, block in enumerate(message["content"]):
+        start, delta = block, None
+        if block["type"] == "text":
+            start = {**block, "text": ""}
+            delta = {"type": "text_delta", "text": block["text"]}
+        elif block["type"] == "tool_use":
+            start = {**block, "input": {}}
+            delta = {
+                "type": "input_json_delta",
+                "partial_json": json.dumps(block["input"]),
+            }
+        events.append(
+            BetaRawContentBlockStartEvent.model_validate(
+                {"type": "content_block_start", "index": index, "content_block": start}
+            )
+        )
+        if delta:
+            events.append(
+                BetaRawContentBlockDeltaEvent.model_validate(
+                    {"type": "content_block_delta", "index": index, "delta": delta}
+                )
+            )
+        events.append(
+            BetaRawContentBlockStopEvent(type="content_block_stop", index=index)
+        )
+    events.append(
+        BetaRawMessageDeltaEvent.model_validate(
+            {
+                "type": "message_delta",
+                "delta": {
+                    "stop_reason": message["stop_reason"],
+                    "stop_sequence": message.get("stop_sequence"),
+                },
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            }
+        )
+    )
+    events.append(BetaRawMessageStopEvent(type="message_stop"))
+    return events
+
+
+class _ReplayMessages:
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+        self.with_raw_response = _ReplayRawMessages(cassette)
+
+    async def create(self, *, stream: bool = False, **request):
+        message = await self._cassette._next_response()
+        if stream:
+            return _ReplayStream(_stream_events(message))
+        return BetaMessage.model_validate(message)
+
+
+class _ReplayRawMessages:
+    def __init__(self, cassette: Cassette):
+        self._cassette = cassette
+
+    async def create(self, **request) -> _ReplayResponse:
+        return _ReplayResponse(await self._cassette._next_response())
+
+
+class _ReplayBeta:
+    def __init__(self, cassette: Cassette):
+        self.messages = _ReplayMessages(cassette)
+
+
+class _ReplayClient:
+    def __init__(self, cassette: Cassette):
+        self.beta = _ReplayBeta(cassette)
+
+    def with_options(self, **options) -> "_ReplayClient":
+        return self
@@ -0,0 +1,141 @@
+"""
+Shared async API clients for the sampling loop.
+
+Clients are created once per provider/region/credentials and reused across turns and
+sessions, so each turn only pays for the request itself instead of connection setup,
+TLS and credential resolution.
+"""
+
+import asyncio
+import weakref
+from dataclasses import dataclass
+from enum import Enum
+
+import httpx
+from anthropic import (
+    NOT_GIVEN,
+    AsyncAnthropic,
+    AsyncAnthropicBedrock,
+    AsyncAnthropicVertex,
+    DefaultAsyncHttpxClient,
+)
+
+DEFAULT_BEDROCK_REGION = "us-west-2"
+DEFAULT_AWS_PROFILE = "default"
+
+
+# Replace StrEnum with custom implementation for Python < 3.11
+class APIProvider(str, Enum):
+    ANTHROPIC = "anthropic"
+    BEDROCK = "bedrock"
+    VERTEX = "vertex"
+
+    def __str__(self):
+        return self.value
+
+
+AsyncClient = AsyncAnthropic | AsyncAnthropicBedrock | AsyncAnthropicVertex
+
+
+@dataclass(frozen=True)
+class ClientPoolOptions:
+    """HTTP connection pool settings shared by every client of a provider."""
+
+    max_connections: int = 32
+    max_keepalive_connections: int = 16
+    keepalive_expiry: float = 120.0  # seconds
+    timeout: float = 600.0  # seconds
+
+    def make_http_client(self) -> httpx.AsyncClient:
+        return DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+        )
+
+
+class ClientProvider:
+    """
+    Creates async API clients on first use and hands out the same instance afterwards.
+
+    httpx connection pools are bound to the event loop they were created on, so clients
+    are cached per running loop; a loop that goes away takes its clients with it.
+    """
+
+    def __init__(self, pool_options: ClientPoolOptions | None = None):
+        self.pool_options = pool_options or ClientPoolOptions()
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[tuple, AsyncClient]
+        ] = weakref.WeakKeyDictionary()
+
+    def get(
+        self,
+        provider: APIProvider,
+        *,
+        api_key: str = "",
+        region: str | None = None,
+        aws_profile: str | None = DEFAULT_AWS_PROFILE,
+    ) -> AsyncClient:
+        """Return the shared client for this provider, creating it if necessary."""
+        loop = asyncio.get_running_loop()
+        clients = self._clients.setdefault(loop, {})
+        key = (APIProvider(provider), api_key, region, aws_profile)
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = self._create(
+                key[0], api_key=api_key, region=region, aws_profile=aws_profile
+            )
+        return client
+
+    def _create(
+        self,
+        provider: APIProvider,
+        *,
+        api_key: str,
+        region: str | None,
+        aws_profile: str | None,
+    ) -> AsyncClient:
+        http_client = self.pool_options.make_http_client()
+        if provider == APIProvider.ANTHROPIC:
+            return AsyncAnthropic(api_key=api_key, http_client=http_client)
+        elif provider == APIProvider.VERTEX:
+            return AsyncAnthropicVertex(
+                region=region or NOT_GIVEN, http_client=http_client
+            )
+        elif provider == APIProvider.BEDROCK:
+            return AsyncAnthropicBedrock(
+                aws_region=region or DEFAULT_BEDROCK_REGION,
+                aws_profile=aws_profile,
+                http_client=http_client,
+            )
+        raise ValueError(f"Unsupported API provider: {provider}")
+
+    async def aclose(self):
+        """Close every client owned by the current event loop."""
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        await asyncio.gather(*(client.close() for client in clients.values()))
+
+
+_default_provider = ClientProvider()
+
+
+def get_client(
+    provider: APIProvider,
+    *,
+    api_key: str = "",
+    region: str | None = None,
+    aws_profile: str | None = DEFAULT_AWS_PROFILE,
+) -> AsyncClient:
+    """Return the process-wide shared client for `provider`."""
+    return _default_provider.get(
+        provider, api_key=api_key, region=region, aws_profile=aws_profile
+    )
+
+
+def configure_client_pool(pool_options: ClientPoolOptions):
+    """Replace the process-wide client provider with one using `pool_options`."""
+    global _default_provider
+    _default_provider = ClientProvider(pool_options)
@@ -0,0 +1,318 @@
+"""
+Token-budgeted management of the conversation history sent on every turn.
+
+`ContextManager.compact` keeps the estimated request size under a budget by first
+truncating the text of old tool results (bash output, `cat -n` file views) and then,
+if that is not enough, replacing the oldest turns with a summary or a short note.
+The estimator is a cheap local approximation, not a tokenizer: it is meant to keep
+request size flat, not to count exactly.
+"""
+
+import base64
+import binascii
+import re
+import struct
+from collections.abc import Awaitable, Callable
+from typing import Any, cast
+
+from anthropic.types.beta import BetaMessageParam
+
+from .blobs import BlobRef
+
+CHARS_PER_TOKEN = 4
+# images are billed by area, roughly (width * height) / 750 tokens
+IMAGE_PIXELS_PER_TOKEN = 750
+DEFAULT_IMAGE_TOKENS = 1600
+# fixed per-block overhead for the JSON structure around each content block
+BLOCK_OVERHEAD_TOKENS = 4
+
+TRUNCATED_TOOL_RESULT_NOTICE = (
+    "\n<NOTE>The rest of this earlier tool output was removed to save context.</NOTE>"
+)
+SUMMARY_NOTE = "Summary of {count} earlier turns of this conversation:\n{summary}"
+_SUMMARY_RE = re.compile(
+    re.escape(SUMMARY_NOTE)
+    .replace(r"\{count\}", r"(\d+)")
+    .replace(r"\{summary\}", r".*"),
+    re.DOTALL,
+)
+EVICTED_TURNS_NOTE = (
+    "{count} earlier turns were removed from this conversation to save context."
+)
+_EVICTED_TURNS_RE = re.compile(
+    re.escape(EVICTED_TURNS_NOTE).replace(r"\{count\}", r"(\d+)")
+)
+SUMMARY_INSTRUCTION = (
+    "Below is a transcript of an agent operating a computer. Summarize the actions "
+    "taken and the results observed, including anything needed to continue the "
+    "task. Reply with the summary only.\n\n"
+)
+
+Summarizer = Callable[[list[BetaMessageParam]], Awaitable[str]]
+
+
+def estimate_text_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_image_tokens(source: dict[str, Any]) -> int:
+    """Estimate the tokens of an image block, reading PNG dimensions when possible."""
+    data = source.get("data")
+    if isinstance(data, BlobRef) and data.width and data.height:
+        return max(1, data.width * data.height // IMAGE_PIXELS_PER_TOKEN)
+    if source.get("media_type") == "image/png" and isinstance(data, str):
+        try:
+            # the IHDR chunk holding width and height ends at byte 24
+            header = base64.b64decode(data[:32])
+            if header[12:16] == b"IHDR":
+                width, height = struct.unpack(">II", header[16:24])
+                return max(1, width * height // IMAGE_PIXELS_PER_TOKEN)
+        except (binascii.Error, struct.error):
+            pass
+    return DEFAULT_IMAGE_TOKENS
+
+
+def _get(block: Any, key: str, default: Any = None) -> Any:
+    # assistant content is kept as SDK models, everything else as plain dicts
+    if isinstance(block, dict):
+        return block.get(key, default)
+    return getattr(block, key, default)
+
+
+def _estimate_block_tokens(block: Any) -> int:
+    if isinstance(block, str):
+        return estimate_text_tokens(block)
+    block_type = _get(block, "type")
+    tokens = BLOCK_OVERHEAD_TOKENS
+    if block_type == "text":
+        tokens += estimate_text_tokens(_get(block, "text", ""))
+    elif block_type == "image":
+        tokens += estimate_image_tokens(_get(block, "source", {}))
+    elif block_type == "tool_use":
+        tokens += estimate_text_tokens(str(_get(block, "input", "")))
+    elif block_type == "tool_result":
+        content = _get(block, "content", "")
+        if isinstance(content, str):
+            tokens += estimate_text_tokens(content)
+        else:
+            tokens += sum(_estimate_block_tokens(item) for item in content)
+    return tokens
+
+
+def estimate_message_tokens(message: BetaMessageParam) -> int:
+    content = message["content"]
+    if isinstance(content, str):
+        return BLOCK_OVERHEAD_TOKENS + estimate_text_tokens(content)
+    return BLOCK_OVERHEAD_TOKENS + sum(_estimate_block_tokens(b) for b in content)
+
+
+def estimate_tokens(messages: list[BetaMessageParam]) -> int:
+    """Roughly estimate the input tokens `messages` will cost."""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+class ContextManager:
+    """
+    Keeps the history passed to the API under `token_budget` estimated tokens.
+
+    The most recent `keep_recent_turns` assistant/user turn pairs are never touched.
+    Once the budget is exceeded, history is compacted down to `target_ratio` of the
+    budget, so compaction (which also invalidates the prompt cache) happens once in a
+    while instead of on every turn:
+
+    1. text in older tool results is cut to its first `truncate_tool_results_to`
+       characters, oldest first;
+    2. if that is not enough, the oldest turns are replaced by a summary from
+       `summarizer` or, without one, by a short note that they were removed. A
+       later compaction folds the previous summary or note into its own.
+
+    The estimated input size of every turn is recorded in `turn_input_tokens`.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        *,
+        keep_recent_turns: int = 3,
+        truncate_tool_results_to: int = 500,
+        target_ratio: float = 0.75,
+        summarizer: Summarizer | None = None,
+    ):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.truncate_tool_results_to = truncate_tool_results_to
+        self.target_ratio = target_ratio
+        self.summarizer = summarizer
+        self.turn_input_tokens: list[int] = []
+
+    async def compact(
+        self, messages: list[BetaMessageParam], reserved_tokens: int = 0
+    ) -> bool:
+        """
+        Compact `messages` in place if they exceed the budget. `reserved_tokens`
+        accounts for the system prompt and tool definitions. Returns True if any
+        messages were removed from the list.
+        """
+        estimate = reserved_tokens + estimate_tokens(messages)
+        removed = False
+        if estimate > self.token_budget:
+            target = int(self.token_budget * self.target_ratio)
+            estimate -= self._truncate_tool_results(messages, estimate - target)
+            if estimate > target:
+                removed = await self._drop_oldest_turns(messages, estimate - target)
+                estimate = reserved_tokens + estimate_tokens(messages)
+        self.turn_input_tokens.append(estimate)
+        return removed
+
+    def _protected_start(self, messages: list[BetaMessageParam]) -> int:
+        """Index of the first message that belongs to the recent, untouched turns."""
+        return max(1, len(messages) - 2 * self.keep_recent_turns)
+
+    def _truncate_tool_results(
+        self, messages: list[BetaMessageParam], tokens_to_free: int
+    ) -> int:
+        freed = 0
+        limit = self.truncate_tool_results_to
+        for message in messages[: self._protected_start(messages)]:
+            content = message["content"]
+            if message["role"] != "user" or not isinstance(content, list):
+                continue
+            for item in content:
+                if not isinstance(item, dict) or item.get("type") != "tool_result":
+                    continue
+                tool_result = cast(dict[str, Any], item)
+                result_content = tool_result.get("content")
+                if isinstance(result_content, str):
+                    blocks = [tool_result]
+                    key = "content"
+                else:
+                    blocks = [
+                        block
+                        for block in result_content or []
+                        if isinstance(block, dict) and block.get("type") == "text"
+                    ]
+                    key = "text"
+                for block in blocks:
+                    text = block[key]
+                    if len(text) <= limit + len(TRUNCATED_TOOL_RESULT_NOTICE):
+                        continue
+                    block[key] = text[:limit] + TRUNCATED_TOOL_RESULT_NOTICE
+                    freed += estimate_text_tokens(text) - estimate_text_tokens(
+                        block[key]
+                    )
+                if freed >= tokens_to_free:
+                    return freed
+        return freed
+
+    async def _drop_oldest_turns(
+        self, messages: list[BetaMessageParam], tokens_to_free: int
+    ) -> bool:
+        first = messages[0]
+        if first["role"] != "user" or _has_tool_results(first):
+            # the history does not start with a plain instruction to fold the
+            # summary into; leave it alone rather than break tool_use pairing
+            return False
+
+        # drop whole turns (assistant message plus the user tool results answering
+        # it) starting right after the instruction, so the history still
+        # alternates and every tool_result keeps its tool_use
+        end, freed = 1, 0
+        protected_start = self._protected_start(messages)
+        while end + 1 < protected_start and freed < tokens_to_free:
+            if (
+                messages[end]["role"] != "assistant"
+                or messages[end + 1]["role"] != "user"
+            ):
+                break
+            freed += estimate_message_tokens(messages[end])
+            freed += estimate_message_tokens(messages[end + 1])
+            end += 2
+        if end == 1:
+            return False
+
+        dropped = messages[1:end]
+        count = len(dropped) // 2
+        content = first["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        else:
+            content = list(content)
+
+        # fold repeated compactions into a single running note
+        last = content[-1] if content else None
+        last_text = (
+            last.get("text", "")
+            if isinstance(last, dict) and last.get("type") == "text"
+            else ""
+        )
+        if self.summarizer:
+            match = _SUMMARY_RE.fullmatch(last_text)
+            if match:
+                # the previous summary is summarized again along with the turns
+                count += int(match.group(1))
+                content.pop()
+                dropped = [{"role": "user", "content": last_text}, *dropped]
+            summary = await self.summarizer(dropped)
+            note = SUMMARY_NOTE.format(count=count, summary=summary)
+        else:
+            match = _EVICTED_TURNS_RE.fullmatch(last_text)
+            if match:
+                count += int(match.group(1))
+                content.pop()
+            note = EVICTED_TURNS_NOTE.format(count=count)
+
+        first["content"] = [*content, {"type": "text", "text": note}]
+        del messages[1:end]
+        return True
+
+
+def _has_tool_results(message: BetaMessageParam) -> bool:
+    content = message["content"]
+    return isinstance(content, list) and any(
+        isinstance(item, dict) and item.get("type") == "tool_result" for item in content
+    )
+
+
+def render_transcript(messages: list[BetaMessageParam]) -> str:
+    """Render turns as plain text, dropping images, for summarization."""
+    lines = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        for block in content:
+            block_type = _get(block, "type")
+            if block_type == "text":
+                lines.append(f"{message['role']}: {_get(block, 'text', '')}")
+            elif block_type == "tool_use":
+                lines.append(
+                    f"tool call {_get(block, 'name')}: {_get(block, 'input', {})}"
+                )
+            elif block_type == "tool_result":
+                result_content = _get(block, "content", "")
+                if not isinstance(result_content, str):
+                    result_content = "\n".join(
+                        _get(item, "text", "[image]") for item in result_content
+                    )
+                prefix = "tool error" if _get(block, "is_error") else "tool result"
+                lines.append(f"{prefix}: {result_content}")
+    return "\n".join(lines)
+
+
+def model_summarizer(client: Any, model: str, max_tokens: int = 1024) -> Summarizer:
+    """Build a summarizer that asks `model` to condense the turns being dropped."""
+
+    async def summarize(turns: list[BetaMessageParam]) -> str:
+        response = await client.beta.messages.create(
+            max_tokens=max_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": SUMMARY_INSTRUCTION + render_transcript(turns),
+                }
+            ],
+            model=model,
+        )
+        return "".join(block.text for block in response.content if block.type == "text")
+
+    return summarize
@@ -0,0 +1,82 @@
+"""
+Bookkeeping over the conversation history that the sampling loop keeps across turns.
+"""
+
+from collections import deque
+from typing import Any, cast
+
+from anthropic.types.beta import BetaMessageParam
+
+
+class ImageIndex:
+    """
+    Locations of `tool_result` images in a message history, kept up to date as
+    messages are appended.
+
+    Each call to `update` only scans messages appended since the previous call, and
+    `prune` only touches the tool results whose images are evicted, so keeping the
+    most recent images costs time proportional to the new and evicted blocks rather
+    than to the length of the history.
+    """
+
+    def __init__(self):
+        self._images: deque[tuple[dict[str, Any], dict[str, Any]]] = deque()
+        self._messages: list[BetaMessageParam] | None = None
+        self._scanned = 0
+
+    def __len__(self):
+        return len(self._images)
+
+    def reset(self):
+        """Forget everything; the next `update` rescans the whole history."""
+        self._images.clear()
+        self._messages = None
+        self._scanned = 0
+
+    def update(self, messages: list[BetaMessageParam]):
+        """Index the images of messages appended since the last call."""
+        if messages is not self._messages or len(messages) < self._scanned:
+            # a different or truncated history: start over
+            self.reset()
+            self._messages = messages
+        for message in messages[self._scanned :]:
+            content = message["content"]
+            if not isinstance(content, list):
+                continue
+            for item in content:
+                if not isinstance(item, dict) or item.get("type") != "tool_result":
+                    continue
+                tool_result = cast(dict[str, Any], item)
+                tool_result_content = tool_result.get("content")
+                if not isinstance(tool_result_content, list):
+                    continue
+                for block in tool_result_content:
+                    if isinstance(block, dict) and block.get("type") == "image":
+                        self._images.append((tool_result, block))
+        self._scanned = len(messages)
+
+    def prune(
+        self,
+        messages: list[BetaMessageParam],
+        images_to_keep: int,
+        min_removal_threshold: int = 10,
+    ) -> int:
+        """
+        Remove all but the final `images_to_keep` tool_result images in place, in
+        chunks of `min_removal_threshold`. Returns the number of images removed.
+        """
+        self.update(messages)
+        images_to_remove = len(self._images) - images_to_keep
+        # for better cache behavior, we want to remove in chunks
+        images_to_remove -= images_to_remove % min_removal_threshold
+        removed = 0
+        while removed < images_to_remove:
+            tool_result, image = self._images.popleft()
+            content = tool_result.get("content")
+            if isinstance(content, list):
+                for i, block in enumerate(content):
+                    if block is image:
+                        del content[i]
+                        break
+            removed += 1
+        return removed
@@ -0,0 +1,241 @@
+"""
+Crash-safe journaling of sampling loop sessions.
+
+A `SessionJournal` is a directory with an append-only `journal.jsonl` and an
+`images/` folder. `sampling_loop(journal=...)` appends every completed turn (the
+assistant message and the tool results answering it) with images referenced by
+hash, plus any new entries of the `EditTool` undo history. Lines are flushed after
+every turn, so they survive a crash of the process; `fsync` is only called every
+`fsync_every` turns, so journaling costs next to nothing per turn.
+
+`resume_session(path, ...)` rebuilds the history and continues the loop where it
+stopped.
+"""
+
+import json
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from anthropic.types.beta import BetaMessageParam
+
+from .blobs import BlobDirectory
+from .tools import BashTool, ComputerTool, EditTool, ToolCollection
+
+JOURNAL_FILE = "journal.jsonl"
+IMAGES_DIR = "images"
+
+# sampling_loop options recorded with the session and reused on resume
+JOURNALED_OPTIONS = (
+    "model",
+    "provider",
+    "system_prompt_suffix",
+    "only_n_most_recent_images",
+    "max_tokens",
+    "region",
+)
+
+RESUMED_NOTE = (
+    "The session was interrupted and has been resumed. The bash shell was restarted, "
+    "so its working directory and environment variables were reset."
+)
+
+
+def _to_json(value: Any) -> Any:
+    # assistant content is kept in the history as SDK models
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class SessionJournal:
+    """
+    Append-only record of one session; see the module docstring.
+
+    Messages are journaled as they are appended. After `ContextManager` compaction,
+    which drops turns and rewrites the first message, the caller passes
+    `checkpoint=True` and the whole history is written again as a checkpoint;
+    reading the journal starts over from there.
+    """
+
+    def __init__(self, path: str | Path, *, fsync_every: int = 10):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fsync_every = fsync_every
+        self._blobs = BlobDirectory(self.path / IMAGES_DIR)
+        self._file = (self.path / JOURNAL_FILE).open("a", encoding="utf-8")
+        self._messages: list[BetaMessageParam] | None = None
+        self._journaled = 0
+        self._unsynced = 0
+        self._edit_history_lengths: dict[str, int] = {}
+        self.options: dict[str, Any] = {}
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sync(self):
+        """Flush the journal to stable storage."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def record_options(self, **options: Any):
+        """Record the loop options of a new session; a no-op when resuming."""
+        if self.options:
+            return
+        self.options = {key: options[key] for key in JOURNALED_OPTIONS}
+        self._write({"event": "session", "options": self.options})
+
+    def record_turn(
+        self,
+        messages: list[BetaMessageParam],
+        tools: Iterable[Any] = (),
+        *,
+        checkpoint: bool = False,
+    ):
+        """
+        Append the messages added since the last call and new edit history.
+        `checkpoint` writes the whole history instead, for a history that was
+        changed in place rather than appended to.
+        """
+        if (
+            checkpoint
+            or messages is not self._messages
+            or len(messages) < self._journaled
+        ):
+            # a new or compacted history: write it whole
+            self._write(
+                {"event": "checkpoint", "messages": self._encode(messages)},
+            )
+        elif len(messages) > self._journaled:
+            self._write(
+                {
+                    "event": "append",
+                    "messages": self._encode(messages[self._journaled :]),
+                }
+            )
+        self._messages = messages
+        self._journaled = len(messages)
+
+        for tool in tools:
+            if isinstance(tool, EditTool):
+                self._record_edit_history(tool)
+
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def _record_edit_history(self, tool: EditTool):
+        for path, versions in tool._file_history.items():
+            key = str(path)
+            known = self._edit_history_lengths.get(key, 0)
+            if len(versions) < known:
+                # undo popped versions: record the history of this file anew
+                known = 0
+                self._write({"event": "edit_history_reset", "path": key})
+            if len(versions) > known:
+                self._write(
+                    {"event": "edit_history", "path": key, "versions": versions[known:]}
+                )
+            self._edit_history_lengths[key] = len(versions)
+
+    def _encode(self, messages: list[BetaMessageParam]) -> list[Any]:
+        # cache breakpoints are placed afresh on every turn of the resumed loop
+        return self._blobs.encode_images(messages, drop_keys=("cache_control",))
+
+    def _write(self, event: dict[str, Any]):
+        self._file.write(json.dumps(event, default=_to_json) + "\n")
+
+    def read(self) -> tuple[list[BetaMessageParam], dict[str, list[str]]]:
+        """
+        Rebuild the journaled history and `EditTool` file history. Later calls to
+        `record_turn` with the returned list append to the journal.
+        """
+        messages: list[BetaMessageParam] = []
+        edit_history: dict[str, list[str]] = {}
+        with (self.path / JOURNAL_FILE).open(encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # a line cut short by a crash: everything before it is intact
+                    break
+                kind = event["event"]
+                if kind == "session":
+                    self.options = event["options"]
+                elif kind == "checkpoint":
+                    messages = self._blobs.decode_images(event["messages"])
+                elif kind == "append":
+                    messages.extend(self._blobs.decode_images(event["messages"]))
+                elif kind == "edit_history":
+                    edit_history.setdefault(event["path"], []).extend(event["versions"])
+                elif kind == "edit_history_reset":
+                    edit_history.pop(event["path"], None)
+        self._messages = messages
+        self._journaled = len(messages)
+        self._edit_history_lengths = {
+            path: len(versions) for path, versions in edit_history.items()
+        }
+        return messages, edit_history
+
+
+async def resume_session(
+    path: str | Path,
+    *,
+    tool_collection: ToolCollection | None = None,
+    **loop_options: Any,
+) -> list[BetaMessageParam]:
+    """
+    Continue the session journaled at `path`. Options recorded with the session
+    (model, provider, ...) are reused unless given; callbacks and the API key must
+    be passed again. Returns the history, as `sampling_loop` does.
+    """
+    from .loop import sampling_loop
+
+    journal = SessionJournal(path)
+    try:
+        messages, edit_history = journal.read()
+        if not messages:
+            raise ValueError(f"no session to resume in {path}")
+        if messages[-1]["role"] == "assistant":
+            # the session had already finished
+            return messages
+
+        owned_tools = None
+        if tool_collection is None:
+            tool_collection = owned_tools = ToolCollection(
+                ComputerTool(), BashTool(), EditTool()
+            )
+        for tool in tool_collection.tools:
+            if isinstance(tool, EditTool):
+                for file_path, versions in edit_history.items():
+                    tool._file_history[Path(file_path)] = list(versions)
+
+        content = messages[-1]["content"]
+        if isinstance(content, list):
+            messages[-1]["content"] = [
+                *content,
+                {"type": "text", "text": RESUMED_NOTE},
+            ]
+
+        try:
+            return await sampling_loop(
+                **{**journal.options, **loop_options},
+                messages=messages,
+                tool_collection=tool_collection,
+                journal=journal,
+            )
+        finally:
+            if owned_tools:
+                await owned_tools.close()
+    finally:
+        journal.close()
@@ -2,16 +2,15 @@
 Agentic sampling loop that calls the Anthropic API and local implenmentation of anthropic-defined computer use tools.
 """
 
+import asyncio
+import contextlib
 import platform
-from collections.abc import Callable
+import time
+from collections.abc import Awaitable, Callable
 from datetime import datetime
-from enum import Enum
-from typing import Any, cast
+from typing import Any, TypeVar, cast
 
-from anthropic import Anthropic, AnthropicBedrock, AnthropicVertex, APIResponse
-from anthropic.types import (
-    ToolResultBlockParam,
-)
+from anthropic import APIResponse
 from anthropic.types.beta import (
     BetaContentBlock,
     BetaContentBlockParam,
@@ -20,22 +19,32 @@ from anthropic.types.beta import (
     BetaMessageParam,
     BetaTextBlockParam,
     BetaToolResultBlockParam,
+    BetaToolUnionParam,
+    BetaUsage,
 )
 
+from . import tracing
+from .blobs import resolve_blobs
+from .cassette import Cassette
+from .clients import APIProvider, get_client
+from .context import ContextManager, estimate_text_tokens, estimate_tokens
+from .history import ImageIndex
+from .journal import SessionJournal
+from .ratelimit import RateLimiter
+from .streaming import stream_message
 from .tools import BashTool, ComputerTool, EditTool, ToolCollection, ToolResult
+from .tools.base import tool_progress
+from .tools.encoding import sniff_media_type
+from .tracing import Tracer
 
-BETA_FLAG = "computer-use-2024-10-22"
-
+T = TypeVar("T")
 
-# Replace StrEnum with custom implementation for Python < 3.11
-class APIProvider(str, Enum):
-    ANTHROPIC = "anthropic"
-    BEDROCK = "bedrock"
-    VERTEX = "vertex"
-
-    def __str__(self):
-        return self.value
+BETA_FLAG = "computer-use-2024-10-22"
+PROMPT_CACHING_BETA_FLAG = "prompt-caching-2024-07-31"
 
+# the API allows four cache breakpoints per request: one each on the system prompt and
+# the tool list, the rest roll forward with the conversation history
+HISTORY_CACHE_BREAKPOINTS = 2
 
 PROVIDER_TO_DEFAULT_MODEL_NAME: dict[APIProvider, str] = {
     APIProvider.ANTHROPIC: "claude-3-5-sonnet-20241022",
@@ -104,122 +113,341 @@ async def sampling_loop(
     api_key: str,
     only_n_most_recent_images: int | None = None,
     max_tokens: int = 4096,
+    region: str | None = None,
+    stream: bool = False,
+    text_delta_callback: Callable[[str], None] | None = None,
+    prompt_caching: bool | None = None,
+    usage_callback: Callable[[BetaUsage], None] | None = None,
+    context_manager: ContextManager | None = None,
+    tool_collection: ToolCollection | None = None,
+    rate_limiter: RateLimiter | None = None,
+    cassette: Cassette | None = None,
+    tracer: Tracer | None = None,
+    journal: SessionJournal | None = None,
 ):
     """
     Agentic sampling loop for the assistant/tool interaction of computer use.
+
+    With `stream=True` the response is streamed: each content block reaches
+    `output_callback` as soon as it is complete, text fragments are passed to
+    `text_delta_callback`, and every tool call starts executing as soon as its input
+    is complete instead of after the whole message. `api_response_callback` is only
+    called in non-streaming mode, since there is no single raw response to report.
+
+    `prompt_caching` marks the system prompt, the tool list and the most recent
+    history turns as cache breakpoints; it defaults to on for the Anthropic API.
+    `usage_callback` receives the token usage of every turn, including cache reads
+    and writes.
+
+    `context_manager`, if given, compacts the history before every request to keep
+    it within its token budget.
+
+    `tool_collection` defaults to a computer, bash and edit tool for the current
+    desktop, which are closed when the loop returns; pass one to give the loop its
+    own display and shell, and close it when done.
+
+    `rate_limiter` paces and retries model calls; share one instance between all
+    sessions of a process. The client's own retries are turned off while it is used.
+
+    `cassette` records every request, response and tool result, or, if it was opened
+    for replay, serves them from disk in place of the API and the tools.
+
+    `tracer` records nested spans for every turn: the model call, each tool call,
+    screenshots and the callbacks, with the turn's token usage attached.
+
+    `journal` appends every completed turn to disk, so that `resume_session` can
+    continue the session after a crash.
+
+    Tools that run for a while, such as bash, also pass `tool_output_callback` the
+    output they have produced so far as `PartialResult`s, before the final result.
     """
-    tool_collection = ToolCollection(
-        ComputerTool(),
-        BashTool(),
-        EditTool(),
-    )
+    if cassette and cassette.replaying:
+        tool_collection = cassette.replay_tools()
+    # tools the loop builds itself are closed when it returns
+    owned_tools = None
+    if tool_collection is None:
+        tool_collection = owned_tools = ToolCollection(
+            ComputerTool(),
+            BashTool(),
+            EditTool(),
+        )
+    if cassette and not cassette.replaying:
+        tool_collection = cassette.record_tools(tool_collection)
+
+    if journal:
+        journal.record_options(
+            model=model,
+            provider=provider,
+            system_prompt_suffix=system_prompt_suffix,
+            only_n_most_recent_images=only_n_most_recent_images,
+            max_tokens=max_tokens,
+            region=region,
+        )
 
     tools_params = tool_collection.to_params()
-    system = (
+    system: str | list[BetaTextBlockParam] = (
         f"{SYSTEM_PROMPT}{' ' + system_prompt_suffix if system_prompt_suffix else ''}"
     )
+    betas = [BETA_FLAG]
+    image_removal_threshold = 10
+    # the system prompt and tool definitions are sent with every request
+    reserved_tokens = estimate_text_tokens(system) + estimate_text_tokens(
+        str(tools_params)
+    )
 
-    while True:
+    if prompt_caching is None:
+        prompt_caching = provider == APIProvider.ANTHROPIC
+    if prompt_caching:
+        betas.append(PROMPT_CACHING_BETA_FLAG)
+        system = [
+            {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+        ]
+        tools_params = _with_cache_breakpoint_on_last_tool(tools_params)
+        # every pruning pass invalidates the cached history after the first removed
+        # image, so prune in chunks as large as the number of images kept: the
+        # cached prefix then survives that many screenshots between breaks
         if only_n_most_recent_images:
-            _maybe_filter_to_n_most_recent_images(messages, only_n_most_recent_images)
-
-        if provider == APIProvider.ANTHROPIC:
-            client = Anthropic(api_key=api_key)
-        elif provider == APIProvider.VERTEX:
-            client = AnthropicVertex()
-        elif provider == APIProvider.BEDROCK:
-            client = AnthropicBedrock(aws_region="us-west-2", aws_profile="default")
-
-        # Call the API
-        # we use raw_response to provide debug information to streamlit. Your
-        # implementation may be able call the SDK directly with:
-        # `response = client.messages.create(...)` instead.
-        raw_response = client.beta.messages.with_raw_response.create(
-            max_tokens=max_tokens,
-            messages=messages,
-            model=model,
-            system=system,
-            tools=tool_collection.to_params(),
-            betas=["computer-use-2024-10-22"],
-        )
-
-        api_response_callback(cast(APIResponse[BetaMessage], raw_response))
-
-        response = raw_response.parse()
+            image_removal_threshold = max(
+                image_removal_threshold, only_n_most_recent_images
+            )
 
-        messages.append(
-            {
-                "role": "assistant",
-                "content": cast(list[BetaContentBlockParam], response.content),
-            }
+    # clients are shared across turns and sessions, so connections are kept alive
+    if cassette and cassette.replaying:
+        client = cassette.client()
+    else:
+        client = get_client(provider, api_key=api_key, region=region)
+    if rate_limiter:
+        client = client.with_options(max_retries=0)
+    image_index = ImageIndex()
+
+    turn = 0
+    async with contextlib.AsyncExitStack() as stack:
+        if owned_tools:
+            stack.push_async_callback(owned_tools.close)
+        if tracer:
+            stack.enter_context(tracer.activate())
+        stack.enter_context(
+            tracing.span("sampling_loop", model=model, provider=str(provider))
         )
-
-        tool_result_content: list[BetaToolResultBlockParam] = []
-        for content_block in cast(list[BetaContentBlock], response.content):
-            output_callback(content_block)
-            if content_block.type == "tool_use":
-                result = await tool_collection.run(
-                    name=content_block.name,
-                    tool_input=cast(dict[str, Any], content_block.input),
+        while True:
+            turn += 1
+            with tracing.span("turn", turn=turn) as turn_span:
+                if only_n_most_recent_images:
+                    with tracing.span("history.prune") as prune_span:
+                        removed_images = image_index.prune(
+                            messages,
+                            only_n_most_recent_images,
+                            min_removal_threshold=image_removal_threshold,
+                        )
+                        prune_span.set(removed_images=removed_images)
+                compacted = False
+                if context_manager:
+                    with tracing.span("context.compact") as compact_span:
+                        compacted = await context_manager.compact(
+                            messages, reserved_tokens
+                        )
+                        compact_span.set(
+                            compacted=compacted,
+                            estimated_tokens=context_manager.turn_input_tokens[-1],
+                        )
+                    if compacted:
+                        image_index.reset()
+                if prompt_caching:
+                    _inject_history_cache_breakpoints(
+                        messages, HISTORY_CACHE_BREAKPOINTS
+                    )
+
+                # tool calls are started as soon as their block is available;
+                # independent calls overlap, and results are collected in order
+                # once the response is done
+                scheduler = tool_collection.scheduler()
+                tool_tasks: list[tuple[str, asyncio.Task[ToolResult]]] = []
+                emitted_blocks = 0
+
+                def on_content_block(content_block: BetaContentBlock):
+                    nonlocal emitted_blocks
+                    emitted_blocks += 1
+                    with tracing.span("callback.output"):
+                        output_callback(content_block)
+                    if content_block.type == "tool_use":
+                        # the call's task copies the context, and with it the
+                        # callback for its partial output
+                        token = tool_progress.set(
+                            lambda partial, tool_use_id=content_block.id: (
+                                tool_output_callback(partial, tool_use_id)
+                            )
+                        )
+                        try:
+                            task = scheduler.submit(
+                                name=content_block.name,
+                                tool_input=cast(dict[str, Any], content_block.input),
+                            )
+                        finally:
+                            tool_progress.reset(token)
+                        tool_tasks.append((content_block.id, task))
+
+                request = dict(
+                    max_tokens=max_tokens,
+                    messages=messages,
+                    model=model,
+                    system=system,
+                    tools=tools_params,
+                    betas=betas,
+                )
+                estimated_tokens = (
+                    reserved_tokens + estimate_tokens(messages) + max_tokens
+                    if rate_limiter
+                    else 0
                 )
-                tool_result_content.append(
-                    _make_api_tool_result(result, content_block.id)
+                # the API gets a copy of the history with image handles resolved
+                api_request = {**request, "messages": resolve_blobs(messages)}
+                started = time.perf_counter()
+                try:
+                    with tracing.span("model.call", stream=stream):
+                        if stream:
+                            response = await _call_model(
+                                rate_limiter,
+                                lambda: stream_message(
+                                    client,
+                                    on_block=on_content_block,
+                                    on_text_delta=text_delta_callback,
+                                    **api_request,
+                                ),
+                                estimated_tokens,
+                                # a stream that already produced blocks cannot
+                                # be replayed
+                                can_retry=lambda: emitted_blocks == 0,
+                            )
+                        else:
+                            # Call the API
+                            # we use raw_response to provide debug information
+                            # to streamlit. Your implementation may be able call
+                            # the SDK directly with:
+                            # `response = await client.messages.create(...)`
+                            # instead.
+                            raw_response = await _call_model(
+                                rate_limiter,
+                                lambda: client.beta.messages.with_raw_response.create(
+                                    **api_request
+                                ),
+                                estimated_tokens,
+                            )
+                    if not stream:
+                        with tracing.span("callback.api_response"):
+                            api_response_callback(
+                                cast(APIResponse[BetaMessage], raw_response)
+                            )
+
+                        response = raw_response.parse()
+                        for content_block in cast(
+                            list[BetaContentBlock], response.content
+                        ):
+                            on_content_block(content_block)
+                except BaseException:
+                    scheduler.cancel()
+                    raise
+
+                usage = response.usage
+                turn_span.set(
+                    input_tokens=usage.input_tokens,
+                    output_tokens=usage.output_tokens,
+                    cache_read_input_tokens=usage.cache_read_input_tokens,
+                    cache_creation_input_tokens=usage.cache_creation_input_tokens,
+                    tool_calls=len(tool_tasks),
                 )
-                tool_output_callback(result, content_block.id)
+                if cassette and not cassette.replaying:
+                    cassette.record_turn(
+                        request, response, time.perf_counter() - started
+                    )
+                if rate_limiter:
+                    rate_limiter.record_usage(
+                        estimated_tokens, usage.input_tokens + usage.output_tokens
+                    )
+                if usage_callback:
+                    with tracing.span("callback.usage"):
+                        usage_callback(usage)
+
+                messages.append(
+                    {
+                        "role": "assistant",
+                        "content": cast(list[BetaContentBlockParam], response.content),
+                    }
+                )
+
+                tool_result_content: list[BetaToolResultBlockParam] = []
+                try:
+                    for tool_use_id, task in tool_tasks:
+                        with tracing.span("tool.wait"):
+                            result = await task
+                        tool_result_content.append(
+                            _make_api_tool_result(result, tool_use_id)
+                        )
+                        with tracing.span("callback.tool_output"):
+                            tool_output_callback(result, tool_use_id)
+                except BaseException:
+                    scheduler.cancel()
+                    raise
+
+                if tool_result_content:
+                    messages.append({"content": tool_result_content, "role": "user"})
+                if journal:
+                    with tracing.span("journal.record"):
+                        journal.record_turn(
+                            messages, tool_collection.tools, checkpoint=compacted
+                        )
+                if not tool_result_content:
+                    return messages
+
+
+async def _call_model(
+    rate_limiter: RateLimiter | None,
+    make_request: Callable[[], Awaitable[T]],
+    estimated_tokens: int,
+    can_retry: Callable[[], bool] = lambda: True,
+) -> T:
+    if rate_limiter is None:
+        return await make_request()
+    return await rate_limiter.call(
+        make_request, estimated_tokens=estimated_tokens, can_retry=can_retry
+    )
 
-        if not tool_result_content:
-            return messages
 
-        messages.append({"content": tool_result_content, "role": "user"})
+def _with_cache_breakpoint_on_last_tool(
+    tools_params: list[BetaToolUnionParam],
+) -> list[BetaToolUnionParam]:
+    """Return a copy of the tool list whose last entry is a cache breakpoint."""
+    if not tools_params:
+        return tools_params
+    last_tool = cast(BetaToolUnionParam, {**tools_params[-1]})
+    last_tool["cache_control"] = {"type": "ephemeral"}
+    return [*tools_params[:-1], last_tool]
 
 
-def _maybe_filter_to_n_most_recent_images(
+def _inject_history_cache_breakpoints(
     messages: list[BetaMessageParam],
-    images_to_keep: int,
-    min_removal_threshold: int = 10,
+    breakpoints: int,
 ):
     """
-    With the assumption that images are screenshots that are of diminishing value as
-    the conversation progresses, remove all but the final `images_to_keep` tool_result
-    images in place, with a chunk of min_removal_threshold to reduce the amount we
-    break the implicit prompt cache.
-    """
-    if images_to_keep is None:
-        return messages
-
-    tool_result_blocks = cast(
-        list[ToolResultBlockParam],
-        [
-            item
-            for message in messages
-            for item in (
-                message["content"] if isinstance(message["content"], list) else []
-            )
-            if isinstance(item, dict) and item.get("type") == "tool_result"
-        ],
-    )
+    Mark the last block of the `breakpoints` most recent user turns as a cache
+    breakpoint and clear the marks left on older turns by earlier calls.
 
-    total_images = sum(
-        1
-        for tool_result in tool_result_blocks
-        for content in tool_result.get("content", [])
-        if isinstance(content, dict) and content.get("type") == "image"
-    )
-
-    images_to_remove = total_images - images_to_keep
-    # for better cache behavior, we want to remove in chunks
-    images_to_remove -= images_to_remove % min_removal_threshold
-
-    for tool_result in tool_result_blocks:
-        if isinstance(tool_result.get("content"), list):
-            new_content = []
-            for content in tool_result.get("content", []):
-                if isinstance(content, dict) and content.get("type") == "image":
-                    if images_to_remove > 0:
-                        images_to_remove -= 1
-                        continue
-                new_content.append(content)
-            tool_result["content"] = new_content
+    The newest breakpoint writes the prefix that the next request will read; the
+    older one still covers the prefix written by the previous request, so each turn
+    reads everything up to its previous user turn from the cache.
+    """
+    for message in reversed(messages):
+        if message["role"] != "user" or not isinstance(message["content"], list):
+            continue
+        last_block = cast(dict[str, Any], message["content"][-1])
+        if breakpoints > 0:
+            last_block["cache_control"] = {"type": "ephemeral"}
+            breakpoints -= 1
+        elif "cache_control" in last_block:
+            del last_block["cache_control"]
+        else:
+            # marks are only ever placed on the most recent turns, so nothing older
+            # can carry one
+            break
 
 
 def _make_api_tool_result(
@@ -239,13 +467,25 @@ def _make_api_tool_result(
                     "text": _maybe_prepend_system_tool_result(result, result.output),
                 }
             )
-        if result.base64_image:
+        if result.image:
+            # the history keeps the handle; it is resolved to base64 per request
+            tool_result_content.append(
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": result.image.media_type,
+                        "data": cast(str, result.image),
+                    },
+                }
+            )
+        elif result.base64_image:
             tool_result_content.append(
                 {
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/png",
+                        "media_type": sniff_media_type(result.base64_image),
                         "data": result.base64_image,
                     },
                 }
@@ -0,0 +1,256 @@
+"""
+Running many agent sessions concurrently on one event loop.
+
+Each session gets its own tools: a `ComputerTool` bound to the session's X display, a
+bash shell whose `DISPLAY` points at that display, and an `EditTool` with its own edit
+history. Sessions share the pooled API clients and are started as slots under the
+concurrency cap become free.
+"""
+
+import asyncio
+import itertools
+import os
+import shutil
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from anthropic.types.beta import BetaContentBlock, BetaMessageParam, BetaUsage
+
+from .clients import APIProvider
+from .loop import sampling_loop
+from .tools import (
+    BashTool,
+    CLIResult,
+    ComputerTool,
+    EditTool,
+    PartialResult,
+    ToolCollection,
+    ToolResult,
+)
+from .tools.limits import ResourceLimits
+
+
+@dataclass
+class SessionSpec:
+    """What a session should do, and on which X display."""
+
+    instruction: str | list[BetaMessageParam]
+    display_num: int | None = None
+    session_id: str = ""
+
+
+@dataclass
+class SessionStats:
+    """Outcome and throughput of one session."""
+
+    session_id: str
+    turns: int = 0
+    tool_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # what the session's bash commands used, to spot sessions that hog the host
+    bash_cpu_seconds: float = 0.0
+    bash_peak_rss_bytes: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    error: str | None = None
+    messages: list[BetaMessageParam] = field(default_factory=list, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return max(self.finished_at - self.started_at, 0.0)
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+
+ToolFactory = Callable[[SessionSpec], ToolCollection]
+
+
+def default_tool_factory(spec: SessionSpec) -> ToolCollection:
+    env = {"DISPLAY": f":{spec.display_num}"} if spec.display_num is not None else None
+    return ToolCollection(
+        ComputerTool(display_num=spec.display_num),
+        # the report shows the peak memory of each session's commands
+        BashTool(env=env, limits=ResourceLimits(track_peak_rss=True)),
+        EditTool(),
+    )
+
+
+class XvfbDisplay:
+    """An Xvfb server on display `:display_num`, started and stopped as a context."""
+
+    def __init__(self, display_num: int, width: int = 1280, height: int = 800):
+        self.display_num = display_num
+        self.width = width
+        self.height = height
+        self._process: asyncio.subprocess.Process | None = None
+
+    async def __aenter__(self):
+        if not shutil.which("Xvfb"):
+            raise RuntimeError("Xvfb is not installed")
+        self._process = await asyncio.create_subprocess_exec(
+            "Xvfb",
+            f":{self.display_num}",
+            "-screen",
+            "0",
+            f"{self.width}x{self.height}x24",
+            "-nolisten",
+            "tcp",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        socket_path = f"/tmp/.X11-unix/X{self.display_num}"
+        async with asyncio.timeout(10):
+            while not os.path.exists(socket_path):
+                if self._process.returncode is not None:
+                    raise RuntimeError(f"Xvfb :{self.display_num} failed to start")
+                await asyncio.sleep(0.05)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._process and self._process.returncode is None:
+            self._process.terminate()
+            await self._process.wait()
+
+
+class Orchestrator:
+    """
+    Runs sessions of `sampling_loop` concurrently, at most `max_concurrency` at a
+    time, each with the tools built by `tool_factory`.
+
+    With `start_xvfb=True`, every session with a `display_num` gets a fresh Xvfb
+    server of `screen_size` for its lifetime. `output_callback` and
+    `tool_output_callback` receive the session id as their first argument; any other
+    keyword arguments are passed through to `sampling_loop`.
+    """
+
+    def __init__(
+        self,
+        *,
+        model: str,
+        provider: APIProvider,
+        api_key: str = "",
+        system_prompt_suffix: str = "",
+        max_concurrency: int = 8,
+        tool_factory: ToolFactory = default_tool_factory,
+        start_xvfb: bool = False,
+        screen_size: tuple[int, int] = (1280, 800),
+        output_callback: Callable[[str, BetaContentBlock], None] | None = None,
+        tool_output_callback: Callable[[str, ToolResult, str], None] | None = None,
+        **loop_options: Any,
+    ):
+        self.model = model
+        self.provider = provider
+        self.api_key = api_key
+        self.system_prompt_suffix = system_prompt_suffix
+        self.max_concurrency = max_concurrency
+        self.tool_factory = tool_factory
+        self.start_xvfb = start_xvfb
+        self.screen_size = screen_size
+        self.output_callback = output_callback
+        self.tool_output_callback = tool_output_callback
+        self.usage_callback = loop_options.pop("usage_callback", None)
+        self.loop_options = loop_options
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._ids = itertools.count(1)
+
+    async def run(self, specs: list[SessionSpec]) -> list[SessionStats]:
+        """Run every session to completion and return their stats in order."""
+        return await asyncio.gather(*(self.run_session(spec) for spec in specs))
+
+    async def run_session(self, spec: SessionSpec) -> SessionStats:
+        session_id = spec.session_id or f"session-{next(self._ids)}"
+        stats = SessionStats(session_id=session_id)
+        async with self._semaphore:
+            stats.started_at = time.perf_counter()
+            try:
+                if self.start_xvfb and spec.display_num is not None:
+                    width, height = self.screen_size
+                    async with XvfbDisplay(spec.display_num, width, height):
+                        await self._run_loop(spec, stats)
+                else:
+                    await self._run_loop(spec, stats)
+            except Exception as e:
+                # one failing session must not take the others down
+                stats.error = f"{type(e).__name__}: {e}"
+            finally:
+                stats.finished_at = time.perf_counter()
+        return stats
+
+    async def _run_loop(self, spec: SessionSpec, stats: SessionStats):
+        if isinstance(spec.instruction, str):
+            stats.messages = [{"role": "user", "content": spec.instruction}]
+        else:
+            stats.messages = spec.instruction
+        session_id = stats.session_id
+
+        def output_callback(content_block: BetaContentBlock):
+            if self.output_callback:
+                self.output_callback(session_id, content_block)
+
+        def tool_output_callback(result: ToolResult, tool_use_id: str):
+            if not isinstance(result, PartialResult):
+                stats.tool_calls += 1
+            if isinstance(result, CLIResult):
+                stats.bash_cpu_seconds += result.cpu_seconds or 0.0
+                stats.bash_peak_rss_bytes = max(
+                    stats.bash_peak_rss_bytes, result.peak_rss_bytes or 0
+                )
+            if self.tool_output_callback:
+                self.tool_output_callback(session_id, result, tool_use_id)
+
+        def usage_callback(usage: BetaUsage):
+            stats.turns += 1
+            stats.input_tokens += usage.input_tokens
+            stats.output_tokens += usage.output_tokens
+            if self.usage_callback:
+                self.usage_callback(usage)
+
+        tool_collection = self.tool_factory(spec)
+        try:
+            await sampling_loop(
+                **{
+                    "api_response_callback": lambda response: None,
+                    **self.loop_options,
+                },
+                model=self.model,
+                provider=self.provider,
+                api_key=self.api_key,
+                system_prompt_suffix=self.system_prompt_suffix,
+                messages=stats.messages,
+                output_callback=output_callback,
+                tool_output_callback=tool_output_callback,
+                usage_callback=usage_callback,
+                tool_collection=tool_collection,
+            )
+        finally:
+            # the session's shells, warm pool and input threads
+            await tool_collection.close()
+
+
+def format_report(stats: list[SessionStats]) -> str:
+    """A per-session throughput table followed by totals."""
+    lines = [
+        f"{'session':<16}{'turns':>7}{'tools':>7}{'secs':>9}{'turns/s':>9}"
+        f"{'bash cpu s':>12}{'bash MB':>9}  error"
+    ]
+    for s in stats:
+        lines.append(
+            f"{s.session_id:<16}{s.turns:>7}{s.tool_calls:>7}{s.elapsed:>9.2f}"
+            f"{s.turns_per_second:>9.2f}{s.bash_cpu_seconds:>12.2f}"
+            f"{s.bash_peak_rss_bytes / 2**20:>9.1f}  {s.error or ''}"
+        )
+    if stats:
+        wall = max(s.finished_at for s in stats) - min(s.started_at for s in stats)
+        turns = sum(s.turns for s in stats)
+        lines.append(
+            f"{'total':<16}{turns:>7}{sum(s.tool_calls for s in stats):>7}"
+            f"{wall:>9.2f}{(turns / wall if wall else 0.0):>9.2f}"
+            f"{sum(s.bash_cpu_seconds for s in stats):>12.2f}"
+            f"{max(s.bash_peak_rss_bytes for s in stats) / 2**20:>9.1f}"
+        )
+    return "\n".join(lines)
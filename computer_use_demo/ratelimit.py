@@ -0,0 +1,298 @@
+"""
+Client-side rate limiting, retries and adaptive concurrency for model calls.
+
+A single `RateLimiter` is meant to be shared by every session in a process. It
+paces requests against requests-per-minute and tokens-per-minute budgets, follows
+the rate-limit headers the API returns, retries throttled (429), overloaded (529)
+and transient failures with jittered exponential backoff, and adapts how many
+requests it lets run at once AIMD-style: the limit grows by about one per
+round of successful requests and halves whenever the server pushes back. Tokens
+charged for an attempt that does not complete are given back, so retries are not
+paid for twice; a completed request is reconciled with its real usage through
+`record_usage`.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Mapping
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TypeVar
+
+from anthropic import APIConnectionError, APIStatusError
+
+T = TypeVar("T")
+
+# 408/409 are retried by the SDK as well; 529 is the API's "overloaded" status
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+THROTTLE_STATUS_CODES = frozenset({429, 529})
+
+REQUESTS_REMAINING_HEADER = "anthropic-ratelimit-requests-remaining"
+REQUESTS_RESET_HEADER = "anthropic-ratelimit-requests-reset"
+TOKENS_REMAINING_HEADER = "anthropic-ratelimit-tokens-remaining"
+TOKENS_RESET_HEADER = "anthropic-ratelimit-tokens-reset"
+RETRY_AFTER_HEADER = "retry-after"
+
+
+def _parse_reset(value: str | None) -> float | None:
+    """Convert an RFC 3339 reset timestamp header into seconds from now."""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(reset_at.timestamp() - time.time(), 0.0)
+
+
+def _parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    value = headers.get(RETRY_AFTER_HEADER)
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+class _Bucket:
+    """A token bucket refilled continuously at `per_minute / 60` units per second."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.available = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(
+            self.per_minute,
+            self.available + (now - self._updated) * self.per_minute / 60.0,
+        )
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available; takes it and returns 0 if it is."""
+        self._refill()
+        # never wait for more than a full bucket, or oversized requests stall forever
+        amount = min(amount, self.per_minute)
+        if self.available >= amount:
+            self.available -= amount
+            return 0.0
+        return (amount - self.available) * 60.0 / self.per_minute
+
+    def adjust(self, amount: float):
+        """Charge (or refund, if negative) `amount` after the fact."""
+        self._refill()
+        self.available -= amount
+
+    def sync(self, remaining: int, reset_in: float | None):
+        """Align with the server's view of what is left in the current window."""
+        self._refill()
+        self.available = min(self.available, float(remaining))
+        if remaining == 0 and reset_in:
+            # nothing left until the window resets: go into debt until then
+            self.available = -reset_in * self.per_minute / 60.0
+
+
+@dataclass
+class RateLimiterStats:
+    requests: int = 0
+    successes: int = 0
+    throttled: int = 0
+    retries: int = 0
+    failures: int = 0
+    waited: float = 0.0  # seconds spent pacing or backing off
+
+
+class RateLimiter:
+    """
+    Shared limiter wrapping model calls; see the module docstring.
+
+    `requests_per_minute` / `tokens_per_minute` are the budgets to pace against (None
+    means unlimited until the server says otherwise). Concurrency starts at
+    `initial_concurrency` and moves between `min_concurrency` and `max_concurrency`.
+    """
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        max_retries: int = 8,
+        base_delay: float = 0.5,  # seconds
+        max_delay: float = 60.0,  # seconds
+    ):
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = float(initial_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = RateLimiterStats()
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._blocked_until = 0.0
+
+    async def call(
+        self,
+        make_request: Callable[[], Awaitable[T]],
+        *,
+        estimated_tokens: int = 0,
+        can_retry: Callable[[], bool] = lambda: True,
+    ) -> T:
+        """
+        Run `make_request` under the limiter, retrying retryable failures. The
+        request must return an object with `headers` (as raw responses do), or the
+        headers are simply not consulted. `can_retry` is checked before every retry,
+        e.g. to stop retrying a stream once its tool calls have started running.
+        """
+        for attempt in range(self.max_retries + 1):
+            charged = await self._pace(estimated_tokens)
+            try:
+                await self._acquire_slot()
+            except BaseException:
+                self._refund_tokens(charged)
+                raise
+            self.stats.requests += 1
+            try:
+                response = await make_request()
+            except APIStatusError as e:
+                throttled = e.status_code in THROTTLE_STATUS_CODES
+                self._release_slot(succeeded=False, throttled=throttled)
+                self._refund_tokens(charged)
+                if e.status_code not in RETRYABLE_STATUS_CODES:
+                    self.stats.failures += 1
+                    raise
+                self._observe_headers(e.response.headers)
+                retry_after = _parse_retry_after(e.response.headers)
+                delay = self._backoff(attempt, retry_after)
+                if throttled:
+                    self.stats.throttled += 1
+                if retry_after is not None:
+                    # the server named a time: every caller waits it out, not just
+                    # this one, instead of piling more requests onto the limit
+                    self._blocked_until = max(
+                        self._blocked_until, time.monotonic() + retry_after
+                    )
+                error: Exception = e
+            except APIConnectionError as e:
+                self._release_slot(succeeded=False, throttled=False)
+                self._refund_tokens(charged)
+                delay = self._backoff(attempt, None)
+                error = e
+            except BaseException:
+                self._release_slot(succeeded=False, throttled=False)
+                self._refund_tokens(charged)
+                raise
+            else:
+                self._release_slot(succeeded=True, throttled=False)
+                self.stats.successes += 1
+                headers = getattr(response, "headers", None)
+                if headers is not None:
+                    self._observe_headers(headers)
+                return response
+
+            if attempt == self.max_retries or not can_retry():
+                self.stats.failures += 1
+                raise error
+            self.stats.retries += 1
+            self.stats.waited += delay
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token budget once a response reports its real usage."""
+        if self._tokens:
+            self._tokens.adjust(actual_tokens - self._charge(estimated_tokens))
+
+    def _charge(self, estimated_tokens: int) -> float:
+        # what pacing takes from the token budget for a request of this estimate;
+        # a request larger than the whole budget is charged the budget
+        if self._tokens and estimated_tokens:
+            return min(estimated_tokens, self._tokens.per_minute)
+        return 0
+
+    def _refund_tokens(self, charged: float):
+        # the attempt did not complete; the tokens are charged again on a retry
+        if self._tokens and charged:
+            self._tokens.adjust(-charged)
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        # "full jitter": spreads retries of concurrent sessions apart
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if retry_after is not None:
+            delay = retry_after + delay * 0.1
+        return delay
+
+    async def _pace(self, estimated_tokens: int) -> float:
+        """Wait for the budgets to allow a request; returns the tokens charged."""
+        while True:
+            wait = self._blocked_until - time.monotonic()
+            if wait <= 0 and self._requests:
+                wait = self._requests.wait_time(1)
+            if wait <= 0 and self._tokens and estimated_tokens:
+                wait = self._tokens.wait_time(estimated_tokens)
+                if wait > 0 and self._requests:
+                    # give back the request taken above; it is retaken after waiting
+                    self._requests.adjust(-1)
+            if wait <= 0:
+                return self._charge(estimated_tokens)
+            self.stats.waited += wait
+            await asyncio.sleep(wait)
+
+    def _observe_headers(self, headers: Mapping[str, str]):
+        for bucket, remaining_header, reset_header in (
+            (self._requests, REQUESTS_REMAINING_HEADER, REQUESTS_RESET_HEADER),
+            (self._tokens, TOKENS_REMAINING_HEADER, TOKENS_RESET_HEADER),
+        ):
+            remaining = headers.get(remaining_header)
+            if bucket is None or remaining is None:
+                continue
+            try:
+                bucket.sync(int(remaining), _parse_reset(headers.get(reset_header)))
+            except ValueError:
+                continue
+
+    async def _acquire_slot(self):
+        while self._in_flight >= int(self.concurrency_limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # woken but no longer interested: pass the slot on
+                    self._wake_waiters()
+                raise
+        self._in_flight += 1
+
+    def _release_slot(self, *, succeeded: bool, throttled: bool):
+        self._in_flight -= 1
+        if throttled:
+            # multiplicative decrease
+            self.concurrency_limit = max(
+                self.min_concurrency, self.concurrency_limit / 2
+            )
+        elif succeeded:
+            # additive increase: about +1 once every slot has completed a request
+            self.concurrency_limit = min(
+                self.max_concurrency,
+                self.concurrency_limit + 1 / self.concurrency_limit,
+            )
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        free = int(self.concurrency_limit) - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
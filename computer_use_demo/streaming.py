@@ -0,0 +1,90 @@
+"""
+Incremental assembly of streamed Messages API responses.
+
+`stream_message` consumes the raw server-sent events of a streamed `create` call and
+hands every content block to `on_block` as soon as the block is complete, so callers
+can start acting on a `tool_use` block while the rest of the message is still being
+generated.
+"""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+from anthropic.types.beta import (
+    BetaContentBlock,
+    BetaMessage,
+    BetaTextBlock,
+    BetaToolUseBlock,
+)
+
+
+class _BlockBuilder:
+    """Accumulates the deltas of a single content block."""
+
+    def __init__(self, block: BetaContentBlock):
+        self.block = block
+        self.parts: list[str] = []
+
+    def build(self) -> BetaContentBlock:
+        if isinstance(self.block, BetaTextBlock):
+            return self.block.model_copy(
+                update={"text": self.block.text + "".join(self.parts)}
+            )
+        if isinstance(self.block, BetaToolUseBlock):
+            partial_json = "".join(self.parts)
+            tool_input = json.loads(partial_json) if partial_json else self.block.input
+            return self.block.model_copy(update={"input": tool_input})
+        return self.block
+
+
+async def stream_message(
+    client: Any,
+    *,
+    on_block: Callable[[BetaContentBlock], None],
+    on_text_delta: Callable[[str], None] | None = None,
+    **request,
+) -> BetaMessage:
+    """
+    Stream a beta Messages API request and return the assembled `BetaMessage`.
+
+    `on_block` is called with each finished content block, in order. `on_text_delta`,
+    if given, receives text fragments as they arrive.
+    """
+    message: BetaMessage | None = None
+    builders: dict[int, _BlockBuilder] = {}
+    content: list[BetaContentBlock] = []
+
+    stream = await client.beta.messages.create(**request, stream=True)
+    async with stream:
+        async for event in stream:
+            if event.type == "message_start":
+                message = event.message
+            elif event.type == "content_block_start":
+                builders[event.index] = _BlockBuilder(event.content_block)
+            elif event.type == "content_block_delta":
+                delta = event.delta
+                if delta.type == "text_delta":
+                    builders[event.index].parts.append(delta.text)
+                    if on_text_delta:
+                        on_text_delta(delta.text)
+                elif delta.type == "input_json_delta":
+                    builders[event.index].parts.append(delta.partial_json)
+            elif event.type == "content_block_stop":
+                block = builders.pop(event.index).build()
+                content.append(block)
+                on_block(block)
+            elif event.type == "message_delta" and message is not None:
+                message = message.model_copy(
+                    update={
+                        "stop_reason": event.delta.stop_reason,
+                        "stop_sequence": event.delta.stop_sequence,
+                        "usage": message.usage.model_copy(
+                            update={"output_tokens": event.usage.output_tokens}
+                        ),
+                    }
+                )
+
+    if message is None:
+        raise RuntimeError("stream ended before a message_start event was received")
+    return message.model_copy(update={"content": content})
@@ -1,6 +1,6 @@
-from .base import CLIResult, ToolResult
+from .base import CLIResult, PartialResult, ToolResult
 from .bash import BashTool
-from .collection import ToolCollection
+from .collection import ToolCollection, ToolScheduler
 from .computer import ComputerTool
 from .edit import EditTool
 
@@ -9,6 +9,8 @@ __ALL__ = [
     CLIResult,
     ComputerTool,
     EditTool,
+    PartialResult,
     ToolCollection,
     ToolResult,
+    ToolScheduler,
 ]
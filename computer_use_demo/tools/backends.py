@@ -0,0 +1,371 @@
+"""
+Display backends used by `ComputerTool` to drive a screen, mouse and keyboard.
+
+`PyAutoGUIBackend` controls the screen of the current desktop session, which is what
+the tool has always done. `XdotoolBackend` drives a specific X display (for example an
+Xvfb server per agent), so several tools can run side by side on one host.
+`FakeBackend` renders into an in-memory canvas and needs no display at all.
+Screenshots go through the fastest `ScreenCapture` available for the display.
+"""
+
+import asyncio
+import contextlib
+import os
+import shlex
+import shutil
+import sys
+from abc import ABCMeta, abstractmethod
+from typing import Literal
+
+from PIL import Image, ImageDraw
+
+from .base import ToolError
+from .capture import FakeCapture, PyAutoGUICapture, ScreenCapture, select_capture
+from .inputworker import InputSettings, InputStep, InputWorker
+from .run import run
+
+MouseButton = Literal["left", "right", "middle"]
+
+
+class DisplayBackend(metaclass=ABCMeta):
+    """Screen, mouse and keyboard of one display. Key names follow pyautogui."""
+
+    # the shortcut that pastes the clipboard into the focused window
+    paste_keys: tuple[str, ...] = ("ctrl", "v")
+
+    @abstractmethod
+    def size(self) -> tuple[int, int]:
+        """Width and height of the screen in pixels."""
+        ...
+
+    @abstractmethod
+    async def move_to(self, x: int, y: int): ...
+
+    @abstractmethod
+    async def mouse_down(self, button: MouseButton = "left"): ...
+
+    @abstractmethod
+    async def mouse_up(self, button: MouseButton = "left"): ...
+
+    @abstractmethod
+    async def click(self, button: MouseButton = "left", clicks: int = 1): ...
+
+    async def drag(self, x: int, y: int, button: MouseButton = "left"):
+        """Press `button`, move to (`x`, `y`) and release it."""
+        await self.mouse_down(button)
+        await self.move_to(x, y)
+        await self.mouse_up(button)
+
+    @abstractmethod
+    async def hotkey(self, *keys: str): ...
+
+    @abstractmethod
+    async def write(self, text: str, interval: float): ...
+
+    def can_type(self, char: str) -> bool:
+        """Whether `write` can type `char`."""
+        return char.isprintable()
+
+    async def paste(self, text: str, keys: tuple[str, ...]) -> bool:
+        """
+        Put `text` on the clipboard and press `keys` to paste it, then put back what
+        the clipboard held. Returns False, without doing anything, if the backend
+        has no clipboard.
+        """
+        return False
+
+    @abstractmethod
+    async def position(self) -> tuple[int, int]: ...
+
+    @abstractmethod
+    async def screenshot(self) -> Image.Image: ...
+
+    async def close(self):
+        """Release the backend's threads and capture resources."""
+
+
+class PyAutoGUIBackend(DisplayBackend):
+    """
+    The screen of the current desktop session, driven through pyautogui. Input runs
+    on an `InputWorker` thread with `settings.pause` after each action instead of
+    pyautogui's `PAUSE` after every call. Every action, moves included, is waited
+    for, so it has happened and its errors are raised by the time it returns.
+    """
+
+    paste_keys = ("command", "v") if sys.platform == "darwin" else ("ctrl", "v")
+    # time for the focused application to read the clipboard before it is restored
+    _clipboard_restore_delay = 0.2
+
+    def __init__(
+        self,
+        capture: ScreenCapture | None = None,
+        settings: InputSettings | None = None,
+    ):
+        # imported lazily: pyautogui needs a usable display as soon as it is imported
+        import pyautogui
+
+        self._pyautogui = pyautogui
+        self.settings = settings or InputSettings()
+        pyautogui.FAILSAFE = self.settings.failsafe
+        self.input = InputWorker(self.settings.pause)
+        self.capture = capture or select_capture(
+            os.environ.get("DISPLAY"), fallback=PyAutoGUICapture
+        )
+
+    def _step(
+        self, name: str, *args, coalesce: str | None = None, pauses=True, **kwargs
+    ):
+        # the worker pauses once per action; pyautogui's own pause is skipped
+        function = getattr(self._pyautogui, name)
+        return InputStep(function, args, {**kwargs, "_pause": False}, coalesce, pauses)
+
+    def size(self):
+        width, height = self._pyautogui.size()
+        return int(width), int(height)
+
+    async def move_to(self, x, y):
+        # the next action pauses after it, as when moves were merged into its batch
+        await self.input.run(self._step("moveTo", x, y, coalesce="move", pauses=False))
+
+    async def mouse_down(self, button="left"):
+        await self.input.run(self._step("mouseDown", button=button))
+
+    async def mouse_up(self, button="left"):
+        await self.input.run(self._step("mouseUp", button=button))
+
+    async def click(self, button="left", clicks=1):
+        await self.input.run(self._step("click", button=button, clicks=clicks))
+
+    async def drag(self, x, y, button="left"):
+        await self.input.run(
+            self._step("mouseDown", button=button),
+            self._step("moveTo", x, y),
+            self._step("mouseUp", button=button),
+        )
+
+    async def hotkey(self, *keys):
+        await self.input.run(self._step("hotkey", *keys))
+
+    async def write(self, text, interval):
+        await self.input.run(self._step("write", text, interval=interval))
+
+    def can_type(self, char):
+        # pyautogui.write silently skips characters that are not key names; capital
+        # letters are not key names themselves, but are typed with shift
+        keys = self._pyautogui.KEYBOARD_KEYS
+        return char in keys or (len(char) == 1 and char.lower() in keys)
+
+    async def paste(self, text, keys):
+        try:
+            import pyperclip
+
+            previous = await asyncio.to_thread(pyperclip.paste)
+            await asyncio.to_thread(pyperclip.copy, text)
+            copied = await asyncio.to_thread(pyperclip.paste) == text
+        except Exception:
+            # not installed, or no clipboard mechanism on this system
+            return False
+        if not copied:
+            return False
+        await self.hotkey(*keys)
+        await asyncio.sleep(self._clipboard_restore_delay)
+        with contextlib.suppress(Exception):
+            await asyncio.to_thread(pyperclip.copy, previous)
+        return True
+
+    async def position(self):
+        x, y = await self.input.run(InputStep(self._pyautogui.position, pauses=False))
+        return int(x), int(y)
+
+    async def screenshot(self):
+        # show the effect of input that is still queued
+        await self.input.flush()
+        return await asyncio.to_thread(self.capture.grab)
+
+    async def close(self):
+        self.input.close()
+        self.capture.close()
+
+
+# pyautogui key names that differ from X keysym names
+_XDOTOOL_KEYS = {
+    "ctrl": "ctrl",
+    "alt": "alt",
+    "shift": "shift",
+    "command": "super",
+    "win": "super",
+    "enter": "Return",
+    "return": "Return",
+    "tab": "Tab",
+    "esc": "Escape",
+    "escape": "Escape",
+    "space": "space",
+    "backspace": "BackSpace",
+    "delete": "Delete",
+    "del": "Delete",
+    "up": "Up",
+    "down": "Down",
+    "left": "Left",
+    "right": "Right",
+    "home": "Home",
+    "end": "End",
+    "pageup": "Prior",
+    "pagedown": "Next",
+    **{f"f{i}": f"F{i}" for i in range(1, 13)},
+}
+_XDOTOOL_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+
+class XdotoolBackend(DisplayBackend):
+    """
+    An X display such as an Xvfb server, driven with `xdotool` and captured with
+    the fastest capture backend it supports. Every instance talks to its own display,
+    so the tools of different agents do not interfere.
+    """
+
+    def __init__(self, display_num: int, capture: ScreenCapture | None = None):
+        self.display_num = display_num
+        self.display = f":{display_num}"
+        self.capture = capture or select_capture(self.display)
+        self._size = self.capture.size()
+
+    def size(self):
+        return self._size
+
+    async def _xdotool(self, *args: str | int) -> str:
+        command = "xdotool " + " ".join(shlex.quote(str(arg)) for arg in args)
+        returncode, stdout, stderr = await run(f"DISPLAY={self.display} {command}")
+        if returncode:
+            raise ToolError(stderr or f"xdotool exited with {returncode}")
+        return stdout
+
+    async def move_to(self, x, y):
+        await self._xdotool("mousemove", "--sync", x, y)
+
+    async def mouse_down(self, button="left"):
+        await self._xdotool("mousedown", _XDOTOOL_BUTTONS[button])
+
+    async def mouse_up(self, button="left"):
+        await self._xdotool("mouseup", _XDOTOOL_BUTTONS[button])
+
+    async def click(self, button="left", clicks=1):
+        await self._xdotool("click", "--repeat", clicks, _XDOTOOL_BUTTONS[button])
+
+    async def drag(self, x, y, button="left"):
+        # one xdotool run for the whole sequence
+        number = _XDOTOOL_BUTTONS[button]
+        await self._xdotool(
+            "mousedown", number, "mousemove", "--sync", x, y, "mouseup", number
+        )
+
+    async def hotkey(self, *keys):
+        await self._xdotool("key", "+".join(_XDOTOOL_KEYS.get(k, k) for k in keys))
+
+    async def write(self, text, interval):
+        await self._xdotool("type", "--delay", int(interval * 1000), "--", text)
+
+    async def paste(self, text, keys):
+        if shutil.which("xclip"):
+            command = ["xclip", "-selection", "clipboard"]
+            read, write = ["-out"], ["-in"]
+        elif shutil.which("xsel"):
+            command = ["xsel", "--clipboard"]
+            read, write = ["--output"], ["--input"]
+        else:
+            return False
+        env = {**os.environ, "DISPLAY": self.display}
+        reader = await asyncio.create_subprocess_exec(
+            *command,
+            *read,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=env,
+        )
+        previous, _ = await reader.communicate()
+        if not await self._set_clipboard(command + write, text.encode(), env):
+            return False
+        await self._xdotool(
+            "key", "--clearmodifiers", "+".join(_XDOTOOL_KEYS.get(k, k) for k in keys)
+        )
+        if reader.returncode == 0:
+            await asyncio.sleep(self._clipboard_restore_delay)
+            await self._set_clipboard(command + write, previous, env)
+        return True
+
+    async def _set_clipboard(
+        self, command: list[str], data: bytes, env: dict[str, str]
+    ) -> bool:
+        # the clipboard tool forks to serve the selection; it must not hold on to
+        # pipes we wait on
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=env,
+        )
+        await process.communicate(data)
+        return process.returncode == 0
+
+    async def position(self):
+        output = await self._xdotool("getmouselocation", "--shell")
+        values = dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+        return int(values["X"]), int(values["Y"])
+
+    async def screenshot(self):
+        return await asyncio.to_thread(self.capture.grab)
+
+    async def close(self):
+        self.capture.close()
+
+
+class FakeBackend(DisplayBackend):
+    """
+    An in-memory display for tests and benchmarks. Input is recorded in `events`
+    and drawn onto a PIL canvas, which `screenshot` returns a copy of.
+    """
+
+    def __init__(self, width: int = 1280, height: int = 800):
+        self.canvas = Image.new("RGB", (width, height), "white")
+        self.capture = FakeCapture(self.canvas)
+        self._draw = ImageDraw.Draw(self.canvas)
+        self._position = (0, 0)
+        self._text_origin = (10, 10)
+        self.events: list[tuple] = []
+
+    def size(self):
+        return self.canvas.size
+
+    async def move_to(self, x, y):
+        self._position = (x, y)
+        self.events.append(("move_to", x, y))
+
+    async def mouse_down(self, button="left"):
+        self.events.append(("mouse_down", button))
+
+    async def mouse_up(self, button="left"):
+        self.events.append(("mouse_up", button))
+
+    async def click(self, button="left", clicks=1):
+        x, y = self._position
+        self._draw.ellipse((x - 4, y - 4, x + 4, y + 4), fill="red")
+        self._text_origin = (x, y)
+        self.events.append(("click", button, clicks))
+
+    async def hotkey(self, *keys):
+        self.events.append(("hotkey", *keys))
+
+    async def write(self, text, interval):
+        self._draw.text(self._text_origin, text, fill="black")
+        self.events.append(("write", text))
+
+    async def paste(self, text, keys):
+        self._draw.text(self._text_origin, text, fill="black")
+        self.events.append(("paste", text))
+        return True
+
+    async def position(self):
+        return self._position
+
+    async def screenshot(self):
+        return self.capture.grab()
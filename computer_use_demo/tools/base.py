@@ -1,9 +1,18 @@
+import base64
 from abc import ABCMeta, abstractmethod
+from collections.abc import Callable, Hashable
+from contextvars import ContextVar
 from dataclasses import dataclass, fields, replace
 from typing import Any
 
 from anthropic.types.beta import BetaToolUnionParam
 
+from ..blobs import BlobRef
+
+# resource key of everything a call can change on screen, which is what the
+# `computer` tool sees: bash commands can open windows and change files shown in them
+DESKTOP = "desktop"
+
 
 class BaseAnthropicTool(metaclass=ABCMeta):
     """Abstract base class for Anthropic-defined tools."""
@@ -19,15 +28,31 @@ class BaseAnthropicTool(metaclass=ABCMeta):
     ) -> BetaToolUnionParam:
         raise NotImplementedError
 
+    def resource_keys(self, **kwargs) -> tuple[Hashable, ...]:
+        """
+        Keys of the resources a call with these arguments uses. Calls sharing a key are
+        run in the order they were issued; calls with disjoint keys may overlap. By
+        default every call uses the desktop, so it keeps its order with every other
+        call that does.
+        """
+        return (DESKTOP,)
+
+    async def close(self):
+        """Release what the tool holds, such as processes and threads."""
+
 
 @dataclass(kw_only=True, frozen=True)
 class ToolResult:
-    """Represents the result of a tool execution."""
+    """
+    Represents the result of a tool execution. An image is either `image`, a handle
+    into a `BlobStore`, or an inline `base64_image`.
+    """
 
     output: str | None = None
     error: str | None = None
     base64_image: str | None = None
     system: str | None = None
+    image: BlobRef | None = None
 
     def __bool__(self):
         return any(getattr(self, field.name) for field in fields(self))
@@ -47,15 +72,44 @@ class ToolResult:
             error=combine_fields(self.error, other.error),
             base64_image=combine_fields(self.base64_image, other.base64_image, False),
             system=combine_fields(self.system, other.system),
+            image=combine_fields(self.image, other.image, False),
         )
 
+    def image_data(self) -> bytes | None:
+        """The raw bytes of the result's image, if it has one."""
+        if self.image:
+            return self.image.data()
+        if self.base64_image:
+            return base64.b64decode(self.base64_image)
+        return None
+
     def replace(self, **kwargs):
         """Returns a new ToolResult with the given fields replaced."""
         return replace(self, **kwargs)
 
 
+@dataclass(kw_only=True, frozen=True)
 class CLIResult(ToolResult):
-    """A ToolResult that can be rendered as a CLI output."""
+    """
+    A ToolResult that can be rendered as a CLI output. The exit status and resource
+    use of the command are for the caller; they are not shown to the model.
+    """
+
+    exit_code: int | None = None
+    cpu_seconds: float | None = None
+    peak_rss_bytes: int | None = None
+    wall_seconds: float | None = None
+
+
+class PartialResult(ToolResult):
+    """Output of a tool call that is still running, reported as it arrives."""
+
+
+# set by the sampling loop for each tool call; tools that run for a while can pass
+# `PartialResult`s to it
+tool_progress: ContextVar[Callable[[PartialResult], None] | None] = ContextVar(
+    "tool_progress", default=None
+)
 
 
 class ToolFailure(ToolResult):
@@ -1,63 +1,141 @@
 import asyncio
+import contextlib
+import itertools
 import os
+import re
+import secrets
+import shutil
+import signal
+import tempfile
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
 from typing import ClassVar, Literal
 
 from anthropic.types.beta import BetaToolBash20241022Param
 
-from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
+from .base import (
+    BaseAnthropicTool,
+    CLIResult,
+    PartialResult,
+    ToolError,
+    ToolFailure,
+    ToolResult,
+    tool_progress,
+)
+from .limits import ResourceLimits, children_cpu_seconds, group_rss
+from .output import BoundedOutput, OutputSettings
+
+DEFAULT_SESSION = "default"
+RESPAWNED = (
+    "bash has been restarted, so its working directory and environment variables "
+    "were reset"
+)
 
 
 class _BashSession:
-    """A session of a bash shell."""
+    """
+    A session of a bash shell.
+
+    Each command is followed by a sentinel unique to it, printed to stdout with the
+    command's exit status and to stderr. Both pipes are read as data arrives, and
+    the command is done as soon as both sentinels have been seen. What a command
+    prints is kept in a `BoundedOutput`, so memory use does not grow with it.
+
+    The shell leads a process group, capped by `ResourceLimits`. When a command
+    times out or the shell dies, the whole group is killed and a new shell started.
+    """
 
     _started: bool
     _process: asyncio.subprocess.Process
 
     command: str = "/bin/bash"
-    _output_delay: float = 0.2  # seconds
     _timeout: float = 120.0  # seconds
-    _sentinel: str = "<<exit>>"
+    _exit_timeout: float = 5.0  # seconds
+    _sentinel: str = "<<exit"
+    _read_size: int = 2**16
+    # more than the length of a sentinel
+    _overlap: int = 64
 
-    def __init__(self):
+    def __init__(
+        self,
+        env: dict[str, str] | None = None,
+        output: OutputSettings = OutputSettings(),
+        limits: ResourceLimits = ResourceLimits(),
+    ):
         self._started = False
-        self._timed_out = False
+        self._env = env
+        self._output = output
+        self._limits = limits
+        # output that has not been handed to a command yet: what may be the start of
+        # a sentinel, or what arrived after the last one, e.g. from background jobs
+        self._stdout_pending = bytearray()
+        self._stderr_pending = bytearray()
 
     async def start(self):
         if self._started:
             return
 
-        self._process = await asyncio.create_subprocess_shell(
+        # started directly rather than through `sh -c`, so that the process is the
+        # shell, whose children's CPU time can be read
+        self._process = await asyncio.create_subprocess_exec(
             self.command,
-            preexec_fn=os.setsid,
-            shell=True,
+            preexec_fn=self._setup_child,
             bufsize=0,
             stdin=asyncio.subprocess.PIPE,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            env=self._env,
         )
 
         self._started = True
 
+    def _setup_child(self):
+        os.setsid()
+        self._limits.apply()
+
     def stop(self):
-        """Terminate the bash shell."""
+        """Terminate the bash shell and everything it started."""
         if not self._started:
             raise ToolError("Session has not started.")
         if self._process.returncode is not None:
             return
-        self._process.terminate()
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(self._process.pid, signal.SIGTERM)
+
+    async def close(self):
+        """Kill the shell and everything it started, and wait for it to exit."""
+        if not self._started:
+            return
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(self._process.pid, signal.SIGKILL)
+        # a process that moved to a group of its own may hold the pipes open
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._process.wait(), self._exit_timeout)
+        # close the pipes now, not when the process object is collected, which may
+        # be after the event loop is closed
+        self._process._transport.close()
+
+    async def _respawn(self) -> int | None:
+        """Kill the shell's process group and start a new shell; returns the old
+        shell's exit status."""
+        await self.close()
+        self._started = False
+        self._stdout_pending.clear()
+        self._stderr_pending.clear()
+        returncode = self._process.returncode
+        await self.start()
+        return returncode
 
     async def run(self, command: str):
         """Execute a command in the bash shell."""
         if not self._started:
             raise ToolError("Session has not started.")
         if self._process.returncode is not None:
+            returncode = await self._respawn()
             return ToolResult(
-                system="tool must be restarted",
-                error=f"bash has exited with returncode {self._process.returncode}",
-            )
-        if self._timed_out:
-            raise ToolError(
-                f"timed out: bash has not returned in {self._timeout} seconds and must be restarted",
+                system=RESPAWNED,
+                error=f"bash had exited with returncode {returncode}",
             )
 
         # we know these are not None because we created the process with PIPEs
@@ -65,82 +143,393 @@ class _BashSession:
         assert self._process.stdout
         assert self._process.stderr
 
-        # send command to the process
+        # send the command, then the sentinels on a line of their own, so that
+        # commands ending in `&` or a comment are not changed
+        token = f"{self._sentinel}:{secrets.token_hex(8)}"
         self._process.stdin.write(
-            command.encode() + f"; echo '{self._sentinel}'\n".encode()
+            f"{command}\n"
+            f"printf '{token}:%d>>\\n' \"$?\"; printf '{token}>>\\n' >&2\n".encode()
         )
         await self._process.stdin.drain()
 
-        # read output from the process, until the sentinel is found
+        stdout_marker = re.compile(re.escape(token.encode()) + rb":(\d+)>>\n")
+        stderr_marker = re.compile(re.escape(token.encode()) + rb">>\n")
+        progress = tool_progress.get()
+        interval = self._output.stream_interval if progress else None
+        stdout = BoundedOutput(self._output, "stdout", stream=interval is not None)
+        stderr = BoundedOutput(self._output, "stderr", stream=interval is not None)
+        reads = asyncio.gather(
+            self._read_until(
+                self._process.stdout, self._stdout_pending, stdout_marker, stdout
+            ),
+            self._read_until(
+                self._process.stderr, self._stderr_pending, stderr_marker, stderr
+            ),
+        )
+        usage = _Usage(
+            started_at=time.monotonic(),
+            cpu_before=children_cpu_seconds(self._process.pid),
+        )
+        watch = (
+            asyncio.create_task(self._watch(usage))
+            if self._limits.samples_memory
+            else None
+        )
         try:
             async with asyncio.timeout(self._timeout):
                 while True:
-                    await asyncio.sleep(self._output_delay)
-                    # if we read directly from stdout/stderr, it will wait forever for
-                    # EOF. use the StreamReader buffer directly instead.
-                    output = (
-                        self._process.stdout._buffer.decode()  # pyright: ignore[reportAttributeAccessIssue]
-                    )
-                    if self._sentinel in output:
-                        # strip the sentinel and break
-                        output = output[: output.index(self._sentinel)]
+                    done, _ = await asyncio.wait({reads}, timeout=interval)
+                    if done:
                         break
+                    if progress:
+                        partial = PartialResult(
+                            output=stdout.take_new(), error=stderr.take_new()
+                        )
+                        if partial:
+                            progress(partial)
+            status, _ = reads.result()
         except asyncio.TimeoutError:
-            self._timed_out = True
+            await self._respawn()
             raise ToolError(
-                f"timed out: bash has not returned in {self._timeout} seconds and must be restarted",
+                f"timed out: bash has not returned in {self._timeout} seconds; it was killed with everything it started and restarted",
             ) from None
+        except EOFError:
+            returncode = await self._respawn()
+            return ToolResult(
+                system=RESPAWNED,
+                error=(
+                    f"killed: the command used more than "
+                    f"{self._limits.group_memory_bytes} bytes of memory"
+                    if usage.over_memory
+                    else f"bash has exited with returncode {returncode}"
+                ),
+            )
+        finally:
+            reads.cancel()
+            # the reads may end with an error as the shell is killed; it is handled
+            # above, so keep asyncio from logging it
+            reads.add_done_callback(
+                lambda future: future.cancelled() or future.exception()
+            )
+            if watch:
+                watch.cancel()
+            stdout.close()
+            stderr.close()
 
+        output = stdout.text()
         if output.endswith("\n"):
             output = output[:-1]
-
-        error = (
-            self._process.stderr._buffer.decode()  # pyright: ignore[reportAttributeAccessIssue]
-        )
+        error = stderr.text()
         if error.endswith("\n"):
             error = error[:-1]
 
-        # clear the buffers so that the next output can be read correctly
-        self._process.stdout._buffer.clear()  # pyright: ignore[reportAttributeAccessIssue]
-        self._process.stderr._buffer.clear()  # pyright: ignore[reportAttributeAccessIssue]
+        cpu_after = children_cpu_seconds(self._process.pid)
+        return CLIResult(
+            output=output,
+            error=error,
+            exit_code=status,
+            cpu_seconds=(
+                cpu_after - usage.cpu_before
+                if cpu_after is not None and usage.cpu_before is not None
+                else None
+            ),
+            peak_rss_bytes=usage.peak_rss_bytes,
+            wall_seconds=time.monotonic() - usage.started_at,
+        )
+
+    async def _watch(self, usage: "_Usage"):
+        """
+        Sample the memory of the shell's process group until cancelled, and kill the
+        group if it exceeds `group_memory_bytes`.
+        """
+        limits = self._limits
+        while True:
+            await asyncio.sleep(limits.sample_interval)
+            # reading /proc takes a few milliseconds on a busy host
+            rss = await asyncio.to_thread(group_rss, self._process.pid)
+            if rss is None:
+                return
+            usage.peak_rss_bytes = max(usage.peak_rss_bytes or 0, rss)
+            if (
+                limits.group_memory_bytes is not None
+                and rss > limits.group_memory_bytes
+            ):
+                usage.over_memory = True
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(self._process.pid, signal.SIGKILL)
+                return
+
+    async def _read_until(
+        self,
+        stream: asyncio.StreamReader,
+        pending: bytearray,
+        marker: re.Pattern[bytes],
+        sink: BoundedOutput,
+    ) -> int | None:
+        """
+        Read `stream` into `sink` until `marker` appears; returns the marker's status
+        group, if any. Only `pending` is searched: the bytes just read and the few
+        before them that may hold the start of a marker (which starts with "<").
+        """
+        while True:
+            match = marker.search(pending)
+            if match:
+                status = int(match.group(1)) if marker.groups else None
+                sink.write(pending[: match.start()])
+                del pending[: match.end()]
+                return status
+            # hand over everything but what may be the start of a marker
+            start = pending.find(b"<", max(0, len(pending) - self._overlap))
+            ready = len(pending) if start == -1 else start
+            sink.write(pending[:ready])
+            del pending[:ready]
+            chunk = await stream.read(self._read_size)
+            if not chunk:
+                raise EOFError
+            pending += chunk
+
+
+@dataclass
+class _Usage:
+    started_at: float
+    cpu_before: float | None
+    # sampled while the command runs; None if memory is not sampled or the command
+    # finished before the first sample
+    peak_rss_bytes: int | None = None
+    over_memory: bool = False
+
+
+@dataclass(frozen=True, kw_only=True)
+class PoolSettings:
+    """
+    `warm` shells are kept started and idle, so that a restart, a new named session
+    or a background job does not wait for bash to start; none by default, since
+    the model's own calls only ever use one shell. At most `max_sessions`
+    shells, named sessions and running jobs together, are in use at once. A
+    background job may run for `job_timeout` seconds.
+    """
+
+    warm: int = 0
+    max_sessions: int = 8
+    job_timeout: float = 3600.0
+
+
+class _SessionPool:
+    """Started, idle shells, refilled in the background as they are handed out."""
+
+    def __init__(self, factory: Callable[[], _BashSession], warm: int):
+        self._factory = factory
+        self._warm = warm
+        self._idle: list[_BashSession] = []
+        self._refill: asyncio.Task | None = None
+
+    async def acquire(self) -> _BashSession:
+        while self._idle:
+            session = self._idle.pop()
+            if session._process.returncode is None:
+                break
+        else:
+            session = self._factory()
+            await session.start()
+        if self._warm and (self._refill is None or self._refill.done()):
+            self._refill = asyncio.create_task(self._fill())
+        return session
+
+    async def _fill(self):
+        while len(self._idle) < self._warm:
+            session = self._factory()
+            await session.start()
+            self._idle.append(session)
+
+    async def close(self):
+        if self._refill:
+            self._refill.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refill
+        await asyncio.gather(*(session.close() for session in self._idle))
+        self._idle.clear()
+
 
-        return CLIResult(output=output, error=error)
+@dataclass
+class _Job:
+    command: str
+    session: _BashSession
+    task: asyncio.Task[ToolResult]
+    started_at: float = field(default_factory=time.monotonic)
 
 
 class BashTool(BaseAnthropicTool):
     """
     A tool that allows the agent to run bash commands.
     The tool parameters are defined by Anthropic and are not editable.
+
+    `env` adds environment variables to the shell, e.g. the `DISPLAY` of the
+    agent's own X server. `output` bounds what a command's result holds, and how
+    often the output of a running command is reported to the sampling loop.
+
+    Besides the tool's own parameters, which are all the model knows of, code that
+    calls the tool directly (a harness, or a benchmark) may name a `session`: each
+    name is a shell of its own, and calls on different sessions run concurrently.
+    With `background=True` the command runs in a fresh shell and the call returns a
+    job ID at once; a later call with `job=<ID>` returns its result, or reports that
+    it is still running. Shells are started on demand, or taken from a pool of
+    started ones if `PoolSettings.warm` asks for one.
+
+    `limits` caps the CPU time and memory of what commands start. Results of
+    commands carry their CPU time, wall time and, if `limits` samples memory, their
+    peak memory.
     """
 
-    _session: _BashSession | None
     name: ClassVar[Literal["bash"]] = "bash"
     api_type: ClassVar[Literal["bash_20241022"]] = "bash_20241022"
 
-    def __init__(self):
-        self._session = None
+    def __init__(
+        self,
+        env: dict[str, str] | None = None,
+        output: OutputSettings = OutputSettings(),
+        pool: PoolSettings = PoolSettings(),
+        limits: ResourceLimits = ResourceLimits(),
+    ):
+        self._env = {**os.environ, **env} if env else None
+        self._output = output
+        self._limits = limits
+        self._pool_settings = pool
+        self._pool: _SessionPool | None = None
+        # where the output of this tool's sessions spills to; removed by `close`
+        self._spill_dir: str | None = None
+        self._sessions: dict[str, _BashSession] = {}
+        self._jobs: dict[str, _Job] = {}
+        self._job_ids = itertools.count(1)
         super().__init__()
 
+    @property
+    def _session(self) -> _BashSession | None:
+        return self._sessions.get(DEFAULT_SESSION)
+
+    @_session.setter
+    def _session(self, session: _BashSession):
+        self._sessions[DEFAULT_SESSION] = session
+
+    def resource_keys(
+        self,
+        *,
+        session: str = DEFAULT_SESSION,
+        background: bool = False,
+        job: str | None = None,
+        **kwargs,
+    ):
+        """
+        Commands in the default shell, and job launches, use the desktop like
+        `computer` actions do. A named session or a job's results, which only code
+        calling the tool directly asks for, are serialized on their own.
+        """
+        if job is not None:
+            return ((type(self), "job", job),)
+        if session != DEFAULT_SESSION and not background:
+            return ((type(self), session),)
+        return super().resource_keys()
+
     async def __call__(
-        self, command: str | None = None, restart: bool = False, **kwargs
+        self,
+        command: str | None = None,
+        restart: bool = False,
+        session: str = DEFAULT_SESSION,
+        background: bool = False,
+        job: str | None = None,
+        **kwargs,
     ):
         print("### Running bash command:", command)
+        if job is not None:
+            return self._collect(job)
+
         if restart:
-            if self._session:
-                self._session.stop()
-            self._session = _BashSession()
-            await self._session.start()
+            if session in self._sessions:
+                await self._sessions.pop(session).close()
+            self._sessions[session] = await self._acquire()
 
             return ToolResult(system="tool has been restarted.")
 
-        if self._session is None:
-            self._session = _BashSession()
-            await self._session.start()
+        if command is None:
+            raise ToolError("no command provided.")
+
+        if background:
+            return await self._launch(command)
+
+        if session not in self._sessions:
+            self._sessions[session] = await self._acquire()
+        return await self._sessions[session].run(command)
+
+    async def _acquire(self) -> _BashSession:
+        if len(self._sessions) + len(self._jobs) >= self._pool_settings.max_sessions:
+            raise ToolError(
+                f"too many bash sessions and jobs (at most "
+                f"{self._pool_settings.max_sessions}); collect a finished job first"
+            )
+        if self._pool is None:
+            output = self._output
+            if output.spill:
+                self._spill_dir = tempfile.mkdtemp(prefix="bash-", dir=output.spill_dir)
+                output = replace(output, spill_dir=self._spill_dir)
+            self._pool = _SessionPool(
+                lambda: _BashSession(env=self._env, output=output, limits=self._limits),
+                self._pool_settings.warm,
+            )
+        return await self._pool.acquire()
+
+    async def _launch(self, command: str) -> ToolResult:
+        session = await self._acquire()
+        session._timeout = self._pool_settings.job_timeout
 
-        if command is not None:
-            return await self._session.run(command)
+        async def run() -> ToolResult:
+            # a job outlives the call that started it; its output is collected
+            # later rather than reported as the launching call's progress
+            tool_progress.set(None)
+            try:
+                return await session.run(command)
+            finally:
+                await session.close()
 
-        raise ToolError("no command provided.")
+        job_id = f"job-{next(self._job_ids)}"
+        self._jobs[job_id] = _Job(command, session, asyncio.create_task(run()))
+        return ToolResult(
+            output=f"started {job_id}",
+            system=f"collect its output with job={job_id!r}",
+        )
+
+    def _collect(self, job_id: str) -> ToolResult:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ToolError(f"no such job: {job_id}")
+        if not job.task.done():
+            elapsed = time.monotonic() - job.started_at
+            return ToolResult(
+                system=f"{job_id} is still running ({elapsed:.0f} s): {job.command}"
+            )
+        del self._jobs[job_id]
+        try:
+            return job.task.result()
+        except ToolError as e:
+            return ToolFailure(error=f"{job_id}: {e.message}")
+
+    async def close(self):
+        """
+        Kill every shell, named sessions, jobs and idle ones, wait for them and
+        remove the files their output spilled to.
+        """
+        for job in self._jobs.values():
+            job.task.cancel()
+        await asyncio.gather(
+            *(session.close() for session in self._sessions.values()),
+            *(job.session.close() for job in self._jobs.values()),
+        )
+        if self._pool:
+            await self._pool.close()
+            self._pool = None
+        if self._spill_dir:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._sessions.clear()
+        self._jobs.clear()
 
     def to_params(self) -> BetaToolBash20241022Param:
         return {
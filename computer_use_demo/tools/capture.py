@@ -0,0 +1,391 @@
+"""
+Screen capture backends used by the display backends to take screenshots.
+
+`XShmCapture` reads the X server's framebuffer through a shared memory segment (the
+MIT-SHM extension), which avoids copying every frame over the X socket. `MSSCapture`
+uses the `mss` package if it is installed, `XGrabCapture` PIL's X11 grab and
+`PyAutoGUICapture` pyautogui, which shells out to `scrot` on Linux. `FakeCapture`
+returns copies of an in-memory image. `select_capture` times the backends available
+for a display and returns the fastest.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from collections.abc import Callable, Sequence
+
+from PIL import Image, ImageGrab
+
+
+class CaptureUnavailable(Exception):
+    """Raised when a capture backend cannot be used on this system or display."""
+
+
+class ScreenCapture(metaclass=ABCMeta):
+    """
+    Grabs frames of one screen. `grab` blocks, so async callers run it in a thread;
+    implementations must allow that.
+    """
+
+    name: str
+
+    @abstractmethod
+    def size(self) -> tuple[int, int]:
+        """Width and height of the screen in pixels."""
+        ...
+
+    @abstractmethod
+    def grab(self) -> Image.Image:
+        """The current contents of the screen as an RGB image."""
+        ...
+
+    def close(self):
+        pass
+
+
+class FakeCapture(ScreenCapture):
+    """Copies of `image`, which the caller may keep drawing on."""
+
+    name = "fake"
+
+    def __init__(self, image: Image.Image):
+        self.image = image
+
+    def size(self):
+        return self.image.size
+
+    def grab(self):
+        return self.image.copy()
+
+
+class PyAutoGUICapture(ScreenCapture):
+    """The current desktop session through `pyautogui.screenshot`."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        try:
+            import pyautogui
+        except Exception as e:
+            # pyautogui raises more than ImportError without a usable display
+            raise CaptureUnavailable(f"pyautogui: {e}") from e
+        self._pyautogui = pyautogui
+
+    def size(self):
+        width, height = self._pyautogui.size()
+        return int(width), int(height)
+
+    def grab(self):
+        return self._pyautogui.screenshot()
+
+
+class XGrabCapture(ScreenCapture):
+    """An X display through PIL's XCB screen grab, one request per frame."""
+
+    name = "xgrab"
+
+    def __init__(self, display: str):
+        self.display = display
+        try:
+            self._size = ImageGrab.grab(xdisplay=display).size
+        except OSError as e:
+            raise CaptureUnavailable(f"xgrab: {e}") from e
+
+    def size(self):
+        return self._size
+
+    def grab(self):
+        return ImageGrab.grab(xdisplay=self.display)
+
+
+class MSSCapture(ScreenCapture):
+    """An X display through the optional `mss` package."""
+
+    name = "mss"
+
+    def __init__(self, display: str):
+        try:
+            import mss
+        except ImportError as e:
+            raise CaptureUnavailable("mss is not installed") from e
+        self.display = display
+        self._mss = mss
+        # mss instances must not be shared between threads
+        self._local = threading.local()
+        try:
+            monitor = self._instance().monitors[0]
+        except mss.ScreenShotError as e:
+            raise CaptureUnavailable(f"mss: {e}") from e
+        self._size = monitor["width"], monitor["height"]
+
+    def _instance(self):
+        instance = getattr(self._local, "instance", None)
+        if instance is None:
+            instance = self._local.instance = self._mss.mss(display=self.display)
+        return instance
+
+    def size(self):
+        return self._size
+
+    def grab(self):
+        instance = self._instance()
+        shot = instance.grab(instance.monitors[0])
+        return Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+
+class _XImage(ctypes.Structure):
+    # the leading fields of Xlib's XImage, up to the ones read here
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+_ZPIXMAP = 2
+_ALL_PLANES = ctypes.c_ulong(-1)
+_IPC_PRIVATE = 0
+_IPC_CREAT = 0o1000
+_IPC_RMID = 0
+_SHMAT_FAILED = ctypes.c_void_p(-1).value
+
+
+def _load_library(name: str) -> ctypes.CDLL:
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise CaptureUnavailable(f"lib{name} is not installed")
+    return ctypes.CDLL(path, use_errno=True)
+
+
+def _x_libraries() -> tuple[ctypes.CDLL, ctypes.CDLL, ctypes.CDLL]:
+    x11, xext, libc = _load_library("X11"), _load_library("Xext"), _load_library("c")
+    x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+    x11.XOpenDisplay.restype = ctypes.c_void_p
+    x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+    x11.XDefaultScreen.argtypes = [ctypes.c_void_p]
+    for function in ("XDisplayWidth", "XDisplayHeight", "XDefaultDepth"):
+        getattr(x11, function).argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XRootWindow.restype = ctypes.c_ulong
+    x11.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XDefaultVisual.restype = ctypes.c_void_p
+    x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    x11.XDestroyImage.argtypes = [ctypes.POINTER(_XImage)]
+
+    segment = ctypes.POINTER(_XShmSegmentInfo)
+    xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+    xext.XShmCreateImage.argtypes = [
+        ctypes.c_void_p,
+        ctypes.c_void_p,
+        ctypes.c_uint,
+        ctypes.c_int,
+        ctypes.c_char_p,
+        segment,
+        ctypes.c_uint,
+        ctypes.c_uint,
+    ]
+    xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+    xext.XShmAttach.argtypes = [ctypes.c_void_p, segment]
+    xext.XShmDetach.argtypes = [ctypes.c_void_p, segment]
+    xext.XShmGetImage.argtypes = [
+        ctypes.c_void_p,
+        ctypes.c_ulong,
+        ctypes.POINTER(_XImage),
+        ctypes.c_int,
+        ctypes.c_int,
+        ctypes.c_ulong,
+    ]
+
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    return x11, xext, libc
+
+
+class XShmCapture(ScreenCapture):
+    """
+    An X display captured with `XShmGetImage` into a shared memory segment that the
+    server writes frames to directly. Needs a local X server with the MIT-SHM
+    extension and a 24/32-bit TrueColor root window, as Xvfb provides.
+    """
+
+    name = "xshm"
+
+    def __init__(self, display: str):
+        self.display = display
+        self._lock = threading.Lock()
+        self._shminfo = _XShmSegmentInfo()
+        self._image = None
+        self._dpy = None
+        self._x11, self._xext, self._libc = _x_libraries()
+        self._dpy = self._x11.XOpenDisplay(display.encode())
+        if not self._dpy:
+            raise CaptureUnavailable(f"cannot open X display {display}")
+        try:
+            self._attach()
+        except BaseException:
+            self.close()
+            raise
+
+    def _attach(self):
+        x11, xext, libc, dpy = self._x11, self._xext, self._libc, self._dpy
+        if not xext.XShmQueryExtension(dpy):
+            raise CaptureUnavailable(f"{self.display} has no MIT-SHM extension")
+        screen = x11.XDefaultScreen(dpy)
+        self._root = x11.XRootWindow(dpy, screen)
+        self._size = x11.XDisplayWidth(dpy, screen), x11.XDisplayHeight(dpy, screen)
+        image = xext.XShmCreateImage(
+            dpy,
+            x11.XDefaultVisual(dpy, screen),
+            x11.XDefaultDepth(dpy, screen),
+            _ZPIXMAP,
+            None,
+            ctypes.byref(self._shminfo),
+            *self._size,
+        )
+        if not image:
+            raise CaptureUnavailable("XShmCreateImage failed")
+        self._image = image
+        if image.contents.bits_per_pixel != 32:
+            raise CaptureUnavailable(
+                f"unsupported pixel size: {image.contents.bits_per_pixel} bits"
+            )
+
+        self._frame_bytes = image.contents.bytes_per_line * image.contents.height
+        shmid = libc.shmget(_IPC_PRIVATE, self._frame_bytes, _IPC_CREAT | 0o600)
+        if shmid < 0:
+            raise CaptureUnavailable(f"shmget: {os.strerror(ctypes.get_errno())}")
+        self._shminfo.shmid = shmid
+        address = libc.shmat(shmid, None, 0)
+        if address == _SHMAT_FAILED:
+            libc.shmctl(shmid, _IPC_RMID, None)
+            raise CaptureUnavailable(f"shmat: {os.strerror(ctypes.get_errno())}")
+        self._shminfo.shmaddr = image.contents.data = address
+        self._shminfo.readOnly = 0
+        attached = xext.XShmAttach(dpy, ctypes.byref(self._shminfo))
+        x11.XSync(dpy, 0)
+        # the segment is freed once both sides have detached, even after a crash
+        libc.shmctl(shmid, _IPC_RMID, None)
+        if not attached:
+            raise CaptureUnavailable("XShmAttach failed")
+
+    def size(self):
+        return self._size
+
+    def grab(self):
+        with self._lock:
+            if not self._xext.XShmGetImage(
+                self._dpy, self._root, self._image, 0, 0, _ALL_PLANES
+            ):
+                raise OSError(f"XShmGetImage failed on {self.display}")
+            image = self._image.contents
+            frame = (ctypes.c_char * self._frame_bytes).from_address(image.data)
+            # the conversion from BGRX copies the frame out of the shared segment
+            return Image.frombuffer(
+                "RGB", self._size, frame, "raw", "BGRX", image.bytes_per_line, 1
+            )
+
+    def close(self):
+        with self._lock:
+            if self._shminfo.shmaddr:
+                self._xext.XShmDetach(self._dpy, ctypes.byref(self._shminfo))
+                self._libc.shmdt(self._shminfo.shmaddr)
+                self._shminfo.shmaddr = None
+            if self._image:
+                # frees the XImage structure only; its data was the segment
+                self._x11.XDestroyImage(self._image)
+                self._image = None
+            if self._dpy:
+                self._x11.XCloseDisplay(self._dpy)
+                self._dpy = None
+
+    def __del__(self):
+        self.close()
+
+
+# X11 capture backends, fastest first as a rule
+X11_CAPTURES: Sequence[Callable[[str], ScreenCapture]] = (
+    XShmCapture,
+    MSSCapture,
+    XGrabCapture,
+)
+
+
+def available_captures(
+    display: str | None,
+    candidates: Sequence[Callable[[str], ScreenCapture]] = X11_CAPTURES,
+) -> list[ScreenCapture]:
+    """Open every candidate backend that works on `display`."""
+    captures = []
+    for candidate in candidates if display else ():
+        try:
+            captures.append(candidate(display))
+        except CaptureUnavailable:
+            continue
+    return captures
+
+
+def select_capture(
+    display: str | None,
+    candidates: Sequence[Callable[[str], ScreenCapture]] = X11_CAPTURES,
+    *,
+    fallback: Callable[[], ScreenCapture] | None = None,
+    trials: int = 3,
+) -> ScreenCapture:
+    """
+    The fastest of the `candidates` available on `display`, by the best of `trials`
+    grabs each; `fallback()` if none is (or `display` is None). The
+    `COMPUTER_USE_CAPTURE` environment variable names a backend to use instead.
+    """
+    forced = os.environ.get("COMPUTER_USE_CAPTURE")
+    if forced:
+        candidates = [c for c in candidates if getattr(c, "name", None) == forced]
+    captures = available_captures(display, candidates)
+    if not captures:
+        if fallback is None:
+            raise CaptureUnavailable(f"no screen capture backend works on {display}")
+        return fallback()
+
+    def best_time(capture: ScreenCapture) -> float:
+        times = []
+        for _ in range(trials):
+            start = time.perf_counter()
+            capture.grab()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    timed = []
+    for capture in captures:
+        try:
+            timed.append((best_time(capture), capture))
+        except OSError:
+            capture.close()
+    if not timed:
+        return select_capture(None, fallback=fallback)
+    timed.sort(key=lambda pair: pair[0])
+    for _, capture in timed[1:]:
+        capture.close()
+    return timed[0][1]
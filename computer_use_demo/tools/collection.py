@@ -1,11 +1,15 @@
 """Collection classes for managing multiple tools."""
 
+import asyncio
+from collections.abc import Hashable
 from typing import Any
 
 from anthropic.types.beta import BetaToolUnionParam
 
+from .. import tracing
 from .base import (
     BaseAnthropicTool,
+    CLIResult,
     ToolError,
     ToolFailure,
     ToolResult,
@@ -24,11 +28,94 @@ class ToolCollection:
     ) -> list[BetaToolUnionParam]:
         return [tool.to_params() for tool in self.tools]
 
-    async def run(self, *, name: str, tool_input: dict[str, Any]) -> ToolResult:
+    def resource_keys(
+        self, *, name: str, tool_input: dict[str, Any]
+    ) -> tuple[Hashable, ...]:
         tool = self.tool_map.get(name)
         if not tool:
-            return ToolFailure(error=f"Tool {name} is invalid")
+            return (name,)
+        return tool.resource_keys(**tool_input)
+
+    async def run(self, *, name: str, tool_input: dict[str, Any]) -> ToolResult:
+        with tracing.span("tool", tool=name, action=tool_input.get("action")) as span:
+            tool = self.tool_map.get(name)
+            if not tool:
+                result = ToolFailure(error=f"Tool {name} is invalid")
+            else:
+                try:
+                    result = await tool(**tool_input)
+                except ToolError as e:
+                    result = ToolFailure(error=e.message)
+            span.set(failed=bool(result.error))
+            if isinstance(result, CLIResult):
+                span.set(
+                    exit_code=result.exit_code,
+                    cpu_seconds=result.cpu_seconds,
+                    peak_rss_bytes=result.peak_rss_bytes,
+                )
+            return result
+
+    def scheduler(self) -> "ToolScheduler":
+        return ToolScheduler(self)
+
+    async def close(self):
+        """Close every tool; see `BaseAnthropicTool.close`."""
+        await asyncio.gather(*(tool.close() for tool in self.tools))
+
+
+class ToolScheduler:
+    """
+    Runs the tool calls of one assistant turn, overlapping calls that are independent.
+
+    Each call waits for the most recent earlier call sharing one of its resource keys
+    (see `BaseAnthropicTool.resource_keys`), so `computer` actions and bash commands
+    keep their order relative to each other and edits to the same path are
+    serialized, while edits and views of unrelated paths run concurrently. Results are returned as tasks in submission order.
+    """
+
+    def __init__(self, tool_collection: ToolCollection):
+        self.tool_collection = tool_collection
+        self._last_use: dict[Hashable, asyncio.Task[ToolResult]] = {}
+        self.tasks: list[asyncio.Task[ToolResult]] = []
+
+    def submit(
+        self, *, name: str, tool_input: dict[str, Any]
+    ) -> asyncio.Task[ToolResult]:
+        keys = self.tool_collection.resource_keys(name=name, tool_input=tool_input)
+        dependencies = {self._last_use[key] for key in keys if key in self._last_use}
+        task = asyncio.create_task(
+            self._run_after(dependencies, name=name, tool_input=tool_input)
+        )
+        for key in keys:
+            self._last_use[key] = task
+        self.tasks.append(task)
+        return task
+
+    async def _run_after(
+        self,
+        dependencies: set[asyncio.Task[ToolResult]],
+        *,
+        name: str,
+        tool_input: dict[str, Any],
+    ) -> ToolResult:
+        if dependencies:
+            await asyncio.wait(dependencies)
+        return await self.tool_collection.run(name=name, tool_input=tool_input)
+
+    def cancel(self):
+        """Cancel every call that has not finished yet."""
+        for task in self.tasks:
+            task.cancel()
+
+    async def run_all(
+        self, calls: list[tuple[str, dict[str, Any]]]
+    ) -> list[ToolResult]:
+        """Submit `(name, tool_input)` calls and return their results in order."""
+        tasks = [
+            self.submit(name=name, tool_input=tool_input) for name, tool_input in calls
+        ]
         try:
-            return await tool(**tool_input)
-        except ToolError as e:
-            return ToolFailure(error=e.message)
+            return [await task for task in tasks]
+        except BaseException:
+            self.cancel()
+            raise
@@ -1,18 +1,36 @@
 import asyncio
-import base64
-import io
+import time
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Literal, TypedDict
-import pyautogui
+
 from anthropic.types.beta import BetaToolComputerUse20241022Param
+from PIL import Image
 
+from .. import tracing
+from ..blobs import BlobStore, default_blob_store
+from .backends import DisplayBackend, PyAutoGUIBackend, XdotoolBackend
 from .base import BaseAnthropicTool, ToolError, ToolResult
+from .encoding import EncodeSettings, encode_pool, encode_screenshot_async
+from .frames import (
+    UNCHANGED_NOTE,
+    FrameDiffSettings,
+    SettleSettings,
+    box_fraction,
+    changed_box,
+    grow_box,
+    settle_frame,
+)
+from .keyboard import (  # the constants and chunks() were first defined here
+    TYPING_DELAY_MS,
+    TYPING_GROUP_SIZE,
+    TypingSettings,
+    chunks,
+    type_text,
+)
 
 OUTPUT_DIR = "/tmp/outputs"
 
-TYPING_DELAY_MS = 12
-TYPING_GROUP_SIZE = 50
-
 Action = Literal[
     "key",
     "type",
@@ -26,6 +44,22 @@ Action = Literal[
     "cursor_position",
 ]
 
+# actions after which the screen is likely to have changed
+MUTATING_ACTIONS = frozenset(
+    {
+        "key",
+        "type",
+        "mouse_move",
+        "left_click",
+        "left_click_drag",
+        "right_click",
+        "middle_click",
+        "double_click",
+    }
+)
+
+SpeculationMode = Literal["cache", "attach"]
+
 
 class ScalingSource(str, Enum):
     COMPUTER = "computer"
@@ -41,14 +75,60 @@ class ComputerToolOptions(TypedDict):
     display_number: int | None
 
 
-def chunks(s: str, chunk_size: int) -> list[str]:
-    return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
+@dataclass
+class SpeculationStats:
+    """Counters for speculative screenshots; see `ComputerTool`."""
+
+    scheduled: int = 0
+    # screenshots requested by the model while speculation is on
+    requests: int = 0
+    # requests served from a speculative screenshot
+    hits: int = 0
+    # speculative screenshots attached to the result of an action
+    attached: int = 0
+    # speculative screenshots discarded before they were used
+    wasted: int = 0
+    # capture and encode time the hits did not have to wait for, in seconds
+    time_saved: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+
+
+@dataclass
+class _Speculation:
+    task: "asyncio.Task[ToolResult]" = field(init=False)
+    frame: Image.Image | None = None
+    capture_started: float | None = None
+    captured_at: float | None = None
+    cost: float = 0.0
 
 
 class ComputerTool(BaseAnthropicTool):
     """
     A tool that allows the agent to interact with the screen, keyboard, and mouse of the current computer.
     The tool parameters are defined by Anthropic and are not editable.
+
+    By default the tool drives the current desktop through pyautogui. Pass
+    `display_num` to drive that X display (e.g. an Xvfb server) instead, or `backend`
+    for any other `DisplayBackend`. Screenshots are kept in `blob_store`, the
+    process-wide store by default, encoded as `encoding` says (PNG by default).
+
+    With `speculative_screenshots`, a screenshot is captured in the background
+    `_screenshot_delay` seconds after every action that may change the screen. In
+    "cache" mode it answers the model's next `screenshot` request without another
+    capture; in "attach" mode the action waits for it and returns it with its result,
+    so the model needs no extra turn to see the effect. Each speculative screenshot
+    is served once, so a later request captures the screen afresh; one older than
+    `_speculation_max_age` seconds is not served. `speculation_stats` counts
+    hits and the time they saved.
+
+    With `frame_diff`, screenshots are compared with the last one the model was
+    shown; see `FrameDiffSettings`. With `settle`, screenshots wait until the screen
+    has stopped changing, and speculative ones are taken as soon as it has, instead
+    of after `_screenshot_delay`; see `SettleSettings`. Text is typed as `typing`
+    says: in chunks, or pasted if it is long.
     """
 
     name: Literal["computer"] = "computer"
@@ -56,8 +136,10 @@ class ComputerTool(BaseAnthropicTool):
     width: int
     height: int
     display_num: int | None
+    backend: DisplayBackend
 
     _screenshot_delay = 1.0
+    _speculation_max_age = 10.0
     _scaling_enabled = True
 
     @property
@@ -71,13 +153,42 @@ class ComputerTool(BaseAnthropicTool):
     def to_params(self) -> BetaToolComputerUse20241022Param:
         return {"name": self.name, "type": self.api_type, **self.options}
 
-    def __init__(self):
+    def __init__(
+        self,
+        display_num: int | None = None,
+        backend: DisplayBackend | None = None,
+        blob_store: BlobStore | None = None,
+        speculative_screenshots: SpeculationMode | None = None,
+        encoding: EncodeSettings | None = None,
+        frame_diff: FrameDiffSettings | None = None,
+        settle: SettleSettings | None = None,
+        typing: TypingSettings | None = None,
+    ):
         super().__init__()
+        # an empty store is falsy
+        self.blob_store = blob_store if blob_store is not None else default_blob_store()
+        self.encoding = encoding or EncodeSettings()
+        self.speculative_screenshots = speculative_screenshots
+        self.speculation_stats = SpeculationStats()
+        self._speculation: _Speculation | None = None
+        self.frame_diff = frame_diff
+        self.settle = settle
+        self.typing = typing or TypingSettings()
+        # what the model has last seen of the screen, and how many results in a
+        # row have relied on it instead of showing a full screenshot
+        self._shown_frame: Image.Image | None = None
+        self._reused = 0
+
+        if backend is None:
+            backend = (
+                PyAutoGUIBackend()
+                if display_num is None
+                else XdotoolBackend(display_num)
+            )
+        self.backend = backend
+        self.width, self.height = backend.size()
 
-        self.width = int(pyautogui.size()[0])
-        self.height = int(pyautogui.size()[1])
-
-        self.display_num = None  # Not used on MacOS
+        self.display_num = display_num
 
         MAX_WIDTH = 1280  # Max screenshot width
         if self.width > MAX_WIDTH:
@@ -96,6 +207,32 @@ class ComputerTool(BaseAnthropicTool):
         text: str | None = None,
         coordinate: list[int] | None = None,
         **kwargs,
+    ):
+        if not self.speculative_screenshots or action not in MUTATING_ACTIONS:
+            return await self._act(action, text, coordinate)
+
+        self._discard_speculation()
+        result = await self._act(action, text, coordinate)
+        speculation = self._speculation = _Speculation()
+        speculation.task = asyncio.create_task(self._speculate(speculation))
+        self.speculation_stats.scheduled += 1
+        if self.speculative_screenshots == "attach":
+            try:
+                screenshot = await asyncio.shield(speculation.task)
+            except Exception:
+                # the action itself succeeded; the model can still ask for a screenshot
+                return result
+            self.speculation_stats.attached += 1
+            # shown now; a later request captures the screen afresh
+            self._speculation = None
+            assert speculation.frame is not None
+            shown = await self._show(speculation.frame, screenshot)
+            output = "\n".join(filter(None, (result.output, shown.output)))
+            return result.replace(output=output, image=shown.image)
+        return result
+
+    async def _act(
+        self, action: Action, text: str | None, coordinate: list[int] | None
     ):
         print(
             f"### Performing action: {action}{f', text: {text}' if text else ''}{f', coordinate: {coordinate}' if coordinate else ''}"
@@ -115,12 +252,10 @@ class ComputerTool(BaseAnthropicTool):
             )
 
             if action == "mouse_move":
-                await asyncio.to_thread(pyautogui.moveTo, x, y)
+                await self.backend.move_to(x, y)
                 return ToolResult(output=f"Mouse moved successfully to X={x}, Y={y}")
             elif action == "left_click_drag":
-                await asyncio.to_thread(pyautogui.mouseDown)
-                await asyncio.to_thread(pyautogui.moveTo, x, y)
-                await asyncio.to_thread(pyautogui.mouseUp)
+                await self.backend.drag(x, y)
                 return ToolResult(output="Mouse drag action completed.")
 
         if action in ("key", "type"):
@@ -162,12 +297,11 @@ class ComputerTool(BaseAnthropicTool):
                     # Add more special keys as needed
                 }
                 key_sequence = [special_keys.get(key, key) for key in key_sequence]
-                await asyncio.to_thread(pyautogui.hotkey, *key_sequence)
+                await self.backend.hotkey(*key_sequence)
                 return ToolResult(output=f"Key combination '{text}' pressed.")
             elif action == "type":
-                await asyncio.to_thread(
-                    pyautogui.write, text, interval=TYPING_DELAY_MS / 1000.0
-                )
+                with tracing.span("type", chars=len(text)) as span:
+                    span.set(method=await type_text(self.backend, text, self.typing))
                 return ToolResult(output=f"Typed text: {text}")
 
         if action in (
@@ -183,39 +317,167 @@ class ComputerTool(BaseAnthropicTool):
                 raise ToolError(f"coordinate is not accepted for {action}")
 
             if action == "screenshot":
-                return await self.screenshot()
+                if self.speculative_screenshots:
+                    return await self._speculative_screenshot()
+                return await self._show(await self._capture())
             elif action == "cursor_position":
-                x, y = pyautogui.position()
-                x, y = self.scale_coordinates(ScalingSource.COMPUTER, int(x), int(y))
+                x, y = await self.backend.position()
+                x, y = self.scale_coordinates(ScalingSource.COMPUTER, x, y)
                 return ToolResult(output=f"X={x},Y={y}")
             else:
                 if action == "left_click":
-                    await asyncio.to_thread(pyautogui.click, button="left")
+                    await self.backend.click("left")
                     return ToolResult(output="Left click performed.")
                 elif action == "right_click":
-                    await asyncio.to_thread(pyautogui.click, button="right")
+                    await self.backend.click("right")
                     return ToolResult(output="Right click performed.")
                 elif action == "double_click":
-                    await asyncio.to_thread(pyautogui.doubleClick)
+                    await self.backend.click("left", clicks=2)
                     return ToolResult(output="Double click performed.")
 
         raise ToolError(f"Invalid action: {action}")
 
     async def screenshot(self):
-        """Take a screenshot of the current screen and return the base64 encoded image."""
-        # Capture screenshot using PyAutoGUI
-        screenshot = await asyncio.to_thread(pyautogui.screenshot)
-
-        if self._scaling_enabled and self.scale_factor < 1.0:
-            screenshot = screenshot.resize((self.target_width, self.target_height))
+        """Take a screenshot of the current screen and return it as an image blob."""
+        return await self._encode(await self._capture())
+
+    async def _capture(self) -> Image.Image:
+        if self.settle is None:
+            with tracing.span("screenshot.capture"):
+                return await self.backend.screenshot()
+        with tracing.span("screenshot.settle") as span:
+            settled = await settle_frame(self.backend.screenshot, self.settle)
+            span.set(polls=settled.polls, stable=settled.stable)
+        return settled.frame
+
+    async def _encode(
+        self,
+        frame: Image.Image,
+        size: tuple[int, int] | None = None,
+    ) -> ToolResult:
+        with tracing.span("screenshot.encode", codec=self.encoding.codec) as span:
+            if size is None:
+                size = (
+                    (self.target_width, self.target_height)
+                    if self._scaling_enabled
+                    else frame.size
+                )
+            data, (width, height) = await encode_screenshot_async(
+                frame, size, self.encoding
+            )
+            image = self.blob_store.put(
+                data, self.encoding.media_type, width=width, height=height
+            )
+            span.set(bytes=image.size)
+
+        return ToolResult(image=image)
+
+    async def _show(
+        self, frame: Image.Image, encoded: ToolResult | None = None
+    ) -> ToolResult:
+        """
+        The result for showing `frame` to the model: `encoded` (or a fresh encoding
+        of the whole frame), or with `frame_diff`, a note that the screen is
+        unchanged or a crop of the changed area.
+        """
+        settings = self.frame_diff
+        shown = self._shown_frame
+        if (
+            settings is None
+            or shown is None
+            or shown.size != frame.size
+            or self._reused >= settings.max_reused
+        ):
+            self._shown_frame, self._reused = frame, 0
+            return encoded or await self._encode(frame)
 
-        img_buffer = io.BytesIO()
-        # Save the image to an in-memory buffer
-        screenshot.save(img_buffer, format="PNG", optimize=True)
-        img_buffer.seek(0)
-        base64_image = base64.b64encode(img_buffer.read()).decode()
+        with tracing.span("screenshot.diff") as span:
+            box = await asyncio.get_running_loop().run_in_executor(
+                encode_pool(), changed_box, shown, frame, settings.tolerance
+            )
+            span.set(changed=box is not None)
+        if box is None:
+            self._reused += 1
+            return ToolResult(output=UNCHANGED_NOTE)
+
+        box = grow_box(box, settings.margin, frame.size)
+        if (
+            not settings.crop
+            or box_fraction(box, frame.size) > settings.max_crop_fraction
+        ):
+            self._shown_frame, self._reused = frame, 0
+            return encoded or await self._encode(frame)
+
+        # the model now sees the previous frame with this region replaced
+        region = frame.crop(box)
+        self._shown_frame = shown.copy()
+        self._shown_frame.paste(region, box[:2])
+        self._reused += 1
+        left, top = self.scale_coordinates(ScalingSource.COMPUTER, box[0], box[1])
+        right, bottom = self.scale_coordinates(ScalingSource.COMPUTER, box[2], box[3])
+        result = await self._encode(region, (right - left, bottom - top))
+        return result.replace(
+            output=(
+                "Only part of the screen changed since the last screenshot. The image "
+                f"shows the region at X={left}, Y={top} of size {right - left}x"
+                f"{bottom - top}; the rest of the screen is unchanged."
+            )
+        )
 
-        return ToolResult(base64_image=base64_image)
+    async def _speculate(self, speculation: _Speculation) -> ToolResult:
+        if self.settle is None:
+            await asyncio.sleep(self._screenshot_delay)
+        speculation.capture_started = time.perf_counter()
+        speculation.frame = await self._capture()
+        result = await self._encode(speculation.frame)
+        speculation.captured_at = time.perf_counter()
+        speculation.cost = speculation.captured_at - speculation.capture_started
+        return result
+
+    async def _speculative_screenshot(self) -> ToolResult:
+        """Serve a screenshot request from the pending speculation if possible."""
+        stats = self.speculation_stats
+        stats.requests += 1
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return await self._show(await self._capture())
+        if speculation.capture_started is None:
+            # still waiting out the delay: capture now, as without speculation
+            self._speculation = speculation
+            self._discard_speculation()
+            return await self._show(await self._capture())
+
+        start = time.perf_counter()
+        try:
+            screenshot = await asyncio.shield(speculation.task)
+        except Exception:
+            stats.wasted += 1
+            return await self._show(await self._capture())
+        assert speculation.captured_at is not None
+        if time.perf_counter() - speculation.captured_at > self._speculation_max_age:
+            stats.wasted += 1
+            return await self._show(await self._capture())
+        stats.hits += 1
+        stats.time_saved += max(0.0, speculation.cost - (time.perf_counter() - start))
+        # served once: a later request, e.g. to see whether a page has loaded since,
+        # captures the screen afresh
+        assert speculation.frame is not None
+        return await self._show(speculation.frame, screenshot)
+
+    async def close(self):
+        self._discard_speculation()
+        await self.backend.close()
+
+    def _discard_speculation(self):
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return
+        if not speculation.task.done():
+            speculation.task.cancel()
+        elif not speculation.task.cancelled():
+            # mark a failed capture's exception as retrieved
+            speculation.task.exception()
+        self.speculation_stats.wasted += 1
 
     def scale_coordinates(self, source: ScalingSource, x: int, y: int):
         """Scale coordinates between the assistant's coordinate system and the real screen coordinates."""
@@ -1,3 +1,4 @@
+import asyncio
 from collections import defaultdict
 from pathlib import Path
 from typing import Literal, get_args
@@ -5,7 +6,8 @@ from typing import Literal, get_args
 from anthropic.types.beta import BetaToolTextEditor20241022Param
 
 from .base import BaseAnthropicTool, CLIResult, ToolError, ToolResult
-from .run import maybe_truncate, run
+from .listing import DirectoryLister
+from .run import maybe_truncate
 
 Command = Literal[
     "view",
@@ -30,6 +32,7 @@ class EditTool(BaseAnthropicTool):
 
     def __init__(self):
         self._file_history = defaultdict(list)
+        self._lister = DirectoryLister()
         super().__init__()
 
     def to_params(self) -> BetaToolTextEditor20241022Param:
@@ -38,6 +41,12 @@ class EditTool(BaseAnthropicTool):
             "type": self.api_type,
         }
 
+    def resource_keys(self, *, path: str | None = None, **kwargs):
+        """Edits are serialized per path; calls on different paths may overlap."""
+        if path is None:
+            return super().resource_keys()
+        return ((type(self), Path(path)),)
+
     async def __call__(
         self,
         *,
@@ -114,9 +123,12 @@ class EditTool(BaseAnthropicTool):
                     "The `view_range` parameter is not allowed when `path` points to a directory."
                 )
 
-            _, stdout, stderr = await run(
-                rf"find {path} -maxdepth 2 -not -path '*/\.*'"
-            )
+            listing = await asyncio.to_thread(self._lister.walk, path, 2)
+            stdout = "\n".join(listing.paths)
+            if not listing.complete:
+                stdout += f"\n<listing stopped after {self._lister.max_entries} entries; view a subdirectory to see more>"
+            stdout = maybe_truncate(stdout)
+            stderr = "\n".join(listing.errors)
             if not stderr:
                 stdout = f"Here's the files and directories up to 2 levels deep in {path}, excluding hidden items:\n{stdout}\n"
             return CLIResult(output=stdout, error=stderr)
@@ -0,0 +1,152 @@
+"""
+Scaling and encoding of screenshots for the API.
+
+`EncodeSettings` chooses the codec: PNG at a zlib compress level, optionally
+quantized to a palette, or lossy JPEG or WebP at a quality. `encode_screenshot`
+scales a captured frame to the size the model sees and encodes it; it runs on a
+shared thread pool (`encode_screenshot_async`), since Pillow releases the GIL while
+it resizes and compresses, so the event loop keeps serving other turns.
+"""
+
+import asyncio
+import base64
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Literal
+
+from PIL import Image
+
+Codec = Literal["png", "jpeg", "webp"]
+
+MEDIA_TYPES: dict[Codec, str] = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+# magic numbers of the image formats the API accepts
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+)
+
+
+@dataclass(frozen=True, kw_only=True)
+class EncodeSettings:
+    """
+    How screenshots are encoded. `compress_level` (0-9) applies to PNG, `quality`
+    (1-100) to JPEG and WebP. `palette` quantizes PNGs to that many colors, which
+    shrinks typical desktop screenshots a lot at some cost in fidelity.
+    """
+
+    codec: Codec = "png"
+    compress_level: int = 6
+    quality: int = 80
+    palette: int | None = None
+
+    def __post_init__(self):
+        if self.codec not in MEDIA_TYPES:
+            raise ValueError(f"unknown codec: {self.codec}")
+        if not 0 <= self.compress_level <= 9:
+            raise ValueError("compress_level must be between 0 and 9")
+        if not 1 <= self.quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+        if self.palette is not None:
+            if self.codec != "png":
+                raise ValueError("palette quantization is only supported for PNG")
+            if not 2 <= self.palette <= 256:
+                raise ValueError("palette must have between 2 and 256 colors")
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.codec]
+
+
+def sniff_media_type(data: bytes | str) -> str:
+    """The media type of encoded image bytes, or of base64 data; PNG if unknown."""
+    if isinstance(data, str):
+        # 16 base64 characters decode to the first 12 bytes
+        data = base64.b64decode(data[:16])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, media_type in _SIGNATURES:
+        if data.startswith(signature):
+            return media_type
+    return "image/png"
+
+
+def scale_image(image: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """
+    Scale `image` to `size`. Integer downscales use `Image.reduce`, a box filter
+    that is several times faster than resampling; other sizes are first reduced by
+    the largest integer factor that stays above twice the target, then resampled.
+    """
+    if image.size == size:
+        return image
+    width, height = image.size
+    factor_x, factor_y = width / size[0], height / size[1]
+    if factor_x == factor_y and factor_x.is_integer():
+        return image.reduce(int(factor_x))
+    return image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+
+# encoder buffers are reused per worker thread
+_buffers = threading.local()
+
+
+def encode_image(image: Image.Image, settings: EncodeSettings) -> bytes:
+    buffer: io.BytesIO | None = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+
+    if settings.codec == "png":
+        if settings.palette:
+            image = image.quantize(settings.palette, Image.Quantize.FASTOCTREE)
+        image.save(buffer, format="PNG", compress_level=settings.compress_level)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        if settings.codec == "jpeg":
+            image.save(buffer, format="JPEG", quality=settings.quality)
+        else:
+            image.save(buffer, format="WEBP", quality=settings.quality, method=0)
+    return buffer.getvalue()
+
+
+def encode_screenshot(
+    image: Image.Image, size: tuple[int, int], settings: EncodeSettings
+) -> tuple[bytes, tuple[int, int]]:
+    """Scale and encode a frame; returns the encoded bytes and the scaled size."""
+    image = scale_image(image, size)
+    return encode_image(image, settings), image.size
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def encode_pool() -> ThreadPoolExecutor:
+    """The thread pool that screenshots are encoded on, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                thread_name_prefix="screenshot-encode",
+            )
+        return _pool
+
+
+async def encode_screenshot_async(
+    image: Image.Image, size: tuple[int, int], settings: EncodeSettings
+) -> tuple[bytes, tuple[int, int]]:
+    """`encode_screenshot` on the encode pool."""
+    return await asyncio.get_running_loop().run_in_executor(
+        encode_pool(), encode_screenshot, image, size, settings
+    )
@@ -0,0 +1,119 @@
+"""
+Differencing of consecutive screenshots.
+
+With `FrameDiffSettings`, `ComputerTool` compares every screenshot with the last one
+the model was shown. An unchanged screen is reported in a line of text instead of
+an image; optionally, a change confined to a small area is sent as a crop of that
+area with its position. Both save encoding, upload and input tokens, which adds up
+in long sessions where many actions leave the screen as it was.
+
+With `SettleSettings`, screenshots wait until the screen stops changing, instead of
+being taken a fixed delay after an action; see `settle_frame`.
+"""
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from PIL import Image, ImageChops
+
+Box = tuple[int, int, int, int]
+
+UNCHANGED_NOTE = "The screen has not changed since the last screenshot."
+
+
+@dataclass(frozen=True, kw_only=True)
+class FrameDiffSettings:
+    """
+    `tolerance` is the per-channel difference below which pixels count as equal, so
+    that dithering or compression noise does not register as a change. With `crop`,
+    a changed area of at most `max_crop_fraction` of the screen is sent on its own,
+    grown by `margin` pixels for context. After `max_reused` text or cropped results
+    in a row a full screenshot is sent again; keep it below the sampling loop's
+    `only_n_most_recent_images`, so that the full screenshot those results refer to
+    is still in the history.
+    """
+
+    tolerance: int = 8
+    crop: bool = False
+    max_crop_fraction: float = 0.25
+    margin: int = 16
+    max_reused: int = 2
+
+
+def changed_box(
+    previous: Image.Image, current: Image.Image, tolerance: int = 0
+) -> Box | None:
+    """The bounding box of the pixels that differ by more than `tolerance`."""
+    if previous.mode != current.mode:
+        current = current.convert(previous.mode)
+    diff = ImageChops.difference(previous, current)
+    if tolerance:
+        threshold = [0] * (tolerance + 1) + [255] * (255 - tolerance)
+        diff = diff.point(threshold * len(diff.getbands()))
+    return diff.getbbox()
+
+
+def grow_box(box: Box, margin: int, size: tuple[int, int]) -> Box:
+    left, top, right, bottom = box
+    return (
+        max(0, left - margin),
+        max(0, top - margin),
+        min(size[0], right + margin),
+        min(size[1], bottom + margin),
+    )
+
+
+def box_fraction(box: Box, size: tuple[int, int]) -> float:
+    left, top, right, bottom = box
+    return (right - left) * (bottom - top) / (size[0] * size[1])
+
+
+@dataclass(frozen=True, kw_only=True)
+class SettleSettings:
+    """
+    Poll the screen every `interval` seconds until `stable_frames` consecutive
+    frames match, comparing them at 1/`scale` of the screen size within
+    `tolerance`; give up after `timeout` seconds and use the latest frame.
+    """
+
+    interval: float = 0.025
+    stable_frames: int = 3
+    timeout: float = 5.0
+    scale: int = 4
+    tolerance: int = 8
+
+    def __post_init__(self):
+        if self.stable_frames < 2:
+            raise ValueError("stable_frames must be at least 2")
+
+
+@dataclass(frozen=True)
+class SettledFrame:
+    frame: Image.Image
+    polls: int
+    # False if the timeout ran out first
+    stable: bool
+
+
+async def settle_frame(
+    capture: Callable[[], Awaitable[Image.Image]], settings: SettleSettings
+) -> SettledFrame:
+    """Capture frames until the screen is stable; returns the last one."""
+    deadline = time.monotonic() + settings.timeout
+    frame = await capture()
+    thumbnail = frame.reduce(settings.scale)
+    polls, matches = 1, 1
+    while matches < settings.stable_frames:
+        if time.monotonic() + settings.interval > deadline:
+            return SettledFrame(frame, polls, False)
+        await asyncio.sleep(settings.interval)
+        frame = await capture()
+        previous, thumbnail = thumbnail, frame.reduce(settings.scale)
+        polls += 1
+        if changed_box(previous, thumbnail, settings.tolerance) is None:
+            matches += 1
+        else:
+            matches = 1
+    return SettledFrame(frame, polls, True)
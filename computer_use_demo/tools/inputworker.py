@@ -0,0 +1,164 @@
+"""
+A long-lived thread for synchronous input libraries such as pyautogui.
+
+Every call used to be its own `asyncio.to_thread` hop followed by pyautogui's global
+`PAUSE`. An `InputWorker` runs input steps on one thread, in order: the steps of
+one `run` call form a batch that nothing else interleaves with, and the pause is
+taken once per batch. Calls made while a batch runs are merged into one batch, and
+consecutive steps with the same `coalesce` key are collapsed to the last one, so a
+burst of moves queued from several tasks costs a single move.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass(frozen=True, kw_only=True)
+class InputSettings:
+    """
+    `pause` is slept after every batch of input, giving applications time to react
+    (pyautogui's `PAUSE`, which it applies after every call, defaults to 0.1 s).
+    `failsafe` enables pyautogui's abort when the mouse is moved into a corner.
+    """
+
+    pause: float = 0.05
+    failsafe: bool = True
+
+
+@dataclass(frozen=True)
+class InputStep:
+    function: Callable[..., Any]
+    args: tuple[Any, ...] = ()
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    # consecutive steps with the same key are redundant but for the last one
+    coalesce: str | None = None
+    # False for queries, which give applications nothing to react to
+    pauses: bool = True
+
+
+@dataclass
+class _Batch:
+    steps: list[InputStep] = field(default_factory=list)
+    # the future of each `run` call merged into this batch, with the index of its
+    # last step
+    waiters: list[tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = field(
+        default_factory=list
+    )
+
+
+class InputWorker:
+    """Runs `InputStep`s on a daemon thread; `pause` is slept after each batch."""
+
+    def __init__(self, pause: float = 0.0, name: str = "input-worker"):
+        self.pause = pause
+        self.coalesced = 0
+        self._pending: deque[_Batch] = deque()
+        self._condition = threading.Condition()
+        # raised by the next call after a posted step failed
+        self._error: BaseException | None = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._serve, name=name, daemon=True)
+        self._thread.start()
+
+    def post(self, *steps: InputStep):
+        """Queue steps without waiting for them."""
+        self._enqueue(steps, None)
+
+    async def run(self, *steps: InputStep) -> Any:
+        """Run steps after everything queued before; returns the last step's result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._enqueue(steps, (loop, future))
+        return await future
+
+    async def flush(self):
+        """Wait until all queued steps have run."""
+        await self.run()
+
+    def close(self):
+        """Let the thread exit once the queued steps have run."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def _enqueue(self, steps, waiter):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("input worker is closed")
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            # batches that have not started yet are merged; they would run back to
+            # back anyway, and merging lets moves coalesce and saves pauses
+            if not self._pending:
+                self._pending.append(_Batch())
+            batch = self._pending[-1]
+            batch.steps.extend(steps)
+            if waiter is not None:
+                batch.waiters.append((len(batch.steps) - 1, *waiter))
+            self._condition.notify()
+
+    def _serve(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                batch = self._pending.popleft()
+            results: list[Any] = []
+            error, failed_at = None, len(batch.steps)
+            for index, step in enumerate(batch.steps):
+                following = batch.steps[index + 1 : index + 2]
+                if (
+                    step.coalesce
+                    and following
+                    and following[0].coalesce == step.coalesce
+                ):
+                    self.coalesced += 1
+                    results.append(None)
+                    continue
+                try:
+                    results.append(step.function(*step.args, **step.kwargs))
+                except BaseException as e:
+                    error, failed_at = e, index
+                    break
+            else:
+                if self.pause and any(step.pauses for step in batch.steps):
+                    time.sleep(self.pause)
+
+            reported = False
+            for index, loop, future in batch.waiters:
+                if index < failed_at:
+                    value = results[index] if index >= 0 else None
+                    _notify(loop, future, future.set_result, value)
+                else:
+                    reported = True
+                    _notify(loop, future, future.set_exception, error)
+            if error is not None and not reported:
+                # a posted step failed: the next caller hears about it
+                with self._condition:
+                    self._error = error
+
+
+def _resolve(future: asyncio.Future, setter: Callable[[Any], None], value: Any):
+    if not future.done():
+        setter(value)
+
+
+def _notify(
+    loop: asyncio.AbstractEventLoop,
+    future: asyncio.Future,
+    setter: Callable[[Any], None],
+    value: Any,
+):
+    try:
+        loop.call_soon_threadsafe(_resolve, future, setter, value)
+    except RuntimeError:
+        # the caller's event loop has been closed; nobody is waiting any more
+        pass
@@ -0,0 +1,83 @@
+"""
+Typing text through a display backend.
+
+`type_text` pastes long strings through the clipboard when the backend can, and
+otherwise types the text in chunks of `chunk_size` characters, one backend call per
+chunk (a single `xdotool type` run, for example). Newlines and tabs are sent as key
+presses, and characters the backend cannot type are pasted on their own.
+"""
+
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from .backends import DisplayBackend
+from .base import ToolError
+
+TYPING_DELAY_MS = 12
+TYPING_GROUP_SIZE = 50
+
+# characters sent as key presses rather than typed
+SPECIAL_KEYS = {"\n": "enter", "\t": "tab"}
+
+
+def chunks(s: str, chunk_size: int) -> list[str]:
+    return [s[i : i + chunk_size] for i in range(0, len(s), chunk_size)]
+
+
+@dataclass(frozen=True, kw_only=True)
+class TypingSettings:
+    """
+    Text of at least `paste_threshold` characters (None: never) is pasted with
+    `paste_keys`, by default the backend's own paste shortcut. Shorter text, and text
+    the backend has no clipboard to paste, is typed `chunk_size` characters per
+    backend call with `delay_ms` between keystrokes.
+    """
+
+    chunk_size: int = TYPING_GROUP_SIZE
+    delay_ms: int = TYPING_DELAY_MS
+    paste_threshold: int | None = 200
+    paste_keys: tuple[str, ...] | None = None
+
+
+def segments(text: str, can_type: Callable[[str], bool]) -> list[tuple[str, str]]:
+    """
+    Split `text` into runs of ("text", typeable characters), ("key", special keys)
+    and ("paste", characters that `can_type` rejects).
+    """
+    runs: list[tuple[str, str]] = []
+    for char in text.replace("\r\n", "\n"):
+        if char in SPECIAL_KEYS:
+            kind = "key"
+        elif can_type(char):
+            kind = "text"
+        else:
+            kind = "paste"
+        if runs and runs[-1][0] == kind:
+            runs[-1] = (kind, runs[-1][1] + char)
+        else:
+            runs.append((kind, char))
+    return runs
+
+
+async def type_text(
+    backend: DisplayBackend, text: str, settings: TypingSettings
+) -> str:
+    """Type `text` into the focused window; returns "pasted" or "typed"."""
+    if (
+        settings.paste_threshold is not None
+        and len(text) >= settings.paste_threshold
+        and await backend.paste(text, settings.paste_keys or backend.paste_keys)
+    ):
+        return "pasted"
+
+    interval = settings.delay_ms / 1000.0
+    for kind, run in segments(text, backend.can_type):
+        if kind == "text":
+            for chunk in chunks(run, settings.chunk_size):
+                await backend.write(chunk, interval=interval)
+        elif kind == "key":
+            for char in run:
+                await backend.hotkey(SPECIAL_KEYS[char])
+        elif not await backend.paste(run, settings.paste_keys or backend.paste_keys):
+            raise ToolError(f"cannot type {run!r}: no clipboard to paste it with")
+    return "typed"
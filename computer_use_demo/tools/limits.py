@@ -0,0 +1,110 @@
+"""
+Resource caps and accounting for the processes a bash session starts.
+
+A session's shell leads a process group of its own, and every command it runs, with
+everything that command starts, belongs to that group unless it moves itself out.
+`ResourceLimits` caps each of those processes with rlimits, set on the shell and
+inherited by its children, and caps the resident memory of the group as a whole,
+which is sampled while a command runs. The helpers here read what a group uses
+from /proc; on systems without it they report nothing. The group is found by
+walking the shell's descendants rather than the whole process table, so a process
+that detaches from the shell by forking twice is not counted.
+"""
+
+import os
+import resource
+from dataclasses import dataclass
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+@dataclass(frozen=True, kw_only=True)
+class ResourceLimits:
+    """
+    `cpu_seconds`, `address_space_bytes` and `file_size_bytes` are rlimits of every
+    process in a session, the shell included (a process over its CPU time is killed
+    with SIGXCPU). `group_memory_bytes` caps the summed RSS of the session's process
+    group: when a sample taken every `sample_interval` seconds exceeds it, the group
+    is killed and the shell restarted. None leaves a resource uncapped.
+
+    The group is only sampled with a memory cap or `track_peak_rss`, which reports
+    the largest sample as the `peak_rss_bytes` of each command's result.
+    """
+
+    cpu_seconds: int | None = None
+    address_space_bytes: int | None = None
+    file_size_bytes: int | None = None
+    group_memory_bytes: int | None = None
+    sample_interval: float = 0.25
+    track_peak_rss: bool = False
+
+    @property
+    def samples_memory(self) -> bool:
+        return self.group_memory_bytes is not None or self.track_peak_rss
+
+    def apply(self):
+        """Set the rlimits on the current process; run in the child before exec."""
+        for limit, value in (
+            (resource.RLIMIT_CPU, self.cpu_seconds),
+            (resource.RLIMIT_AS, self.address_space_bytes),
+            (resource.RLIMIT_FSIZE, self.file_size_bytes),
+        ):
+            if value is not None:
+                resource.setrlimit(limit, (value, value))
+
+
+def _stat_fields(pid: int | str) -> list[str] | None:
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read().decode()
+    except OSError:
+        return None
+    # the command name may contain spaces and parentheses; fields follow the last ")"
+    return stat[stat.rindex(")") + 2 :].split()
+
+
+def children_cpu_seconds(pid: int) -> float | None:
+    """CPU time of the children `pid` has waited for, as counted by the kernel."""
+    fields = _stat_fields(pid)
+    if fields is None:
+        return None
+    # cutime and cstime, fields 16 and 17 of proc(5)
+    return (int(fields[13]) + int(fields[14])) / _CLOCK_TICKS
+
+
+def _children(pid: str) -> list[str]:
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "rb") as f:
+                children += f.read().split()
+        except OSError:
+            pass
+    return [child.decode() for child in children]
+
+
+def group_rss(pgid: int) -> int | None:
+    """
+    The summed resident memory, in bytes, of group leader `pgid` and those of its
+    descendants still in its group.
+    """
+    if not os.path.exists(f"/proc/{pgid}/task/{pgid}/children"):
+        # no /proc, or a kernel without CONFIG_PROC_CHILDREN
+        return None
+    total = 0
+    pids = [str(pgid)]
+    while pids:
+        pid = pids.pop()
+        fields = _stat_fields(pid)
+        if fields is None:
+            continue
+        # pgrp and rss, fields 5 and 24 of proc(5)
+        if int(fields[2]) == pgid:
+            total += int(fields[21]) * _PAGE_SIZE
+        pids += _children(pid)
+    return total
@@ -0,0 +1,99 @@
+"""
+In-process directory listings for the `view` command of `EditTool`.
+
+`DirectoryLister` lists a tree as `find PATH -maxdepth N -not -path '*/.*'` would,
+without starting a process: paths in depth-first order, the entries of every
+directory sorted by name, hidden entries left out and symlinks not followed. It
+stops after `max_entries` paths, leaving the rest of a huge tree unread. The
+sorted entries of each directory are cached with the directory's mtime, which
+changes whenever an entry is added, removed or renamed, so viewing an unchanged
+tree again costs a `stat` per directory.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+MAX_ENTRIES = 1000
+
+# a directory modified this recently may change again within the same mtime tick
+# on file systems with coarse timestamps, so its entries are not cached yet
+_RACY_SECONDS = 2.0
+
+
+@dataclass
+class Listing:
+    paths: list[str] = field(default_factory=list)
+    # directories that could not be read, and why
+    errors: list[str] = field(default_factory=list)
+    # False if the listing stopped at `max_entries`
+    complete: bool = True
+
+
+class _Full(Exception):
+    pass
+
+
+class DirectoryLister:
+    """Lists directory trees, caching each directory's entries by its mtime."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_cached_dirs: int = 4096):
+        self.max_entries = max_entries
+        self.max_cached_dirs = max_cached_dirs
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, tuple[int, list[tuple[str, bool]]]] = (
+            OrderedDict()
+        )
+        # views of different paths may run in threads at the same time
+        self._lock = threading.Lock()
+
+    def walk(self, root: Path, depth: int = 2) -> Listing:
+        listing = Listing(paths=[str(root)])
+        try:
+            self._visit(str(root), 1, depth, listing)
+        except _Full:
+            listing.complete = False
+        return listing
+
+    def _visit(self, directory: str, level: int, depth: int, listing: Listing):
+        try:
+            entries = self._entries(directory)
+        except OSError as e:
+            listing.errors.append(f"cannot read {directory}: {e.strerror}")
+            return
+        for name, is_dir in entries:
+            if len(listing.paths) > self.max_entries:
+                raise _Full
+            path = os.path.join(directory, name)
+            listing.paths.append(path)
+            if is_dir and level < depth:
+                self._visit(path, level + 1, depth, listing)
+
+    def _entries(self, directory: str) -> list[tuple[str, bool]]:
+        """The sorted (name, is a directory) pairs of `directory`'s visible entries."""
+        mtime = os.stat(directory).st_mtime_ns
+        with self._lock:
+            cached = self._cache.get(directory)
+            if cached and cached[0] == mtime:
+                self._cache.move_to_end(directory)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        with os.scandir(directory) as scan:
+            entries = sorted(
+                (entry.name, entry.is_dir(follow_symlinks=False))
+                for entry in scan
+                if not entry.name.startswith(".")
+            )
+        if time.time_ns() - mtime > _RACY_SECONDS * 1e9:
+            with self._lock:
+                self._cache[directory] = (mtime, entries)
+                self._cache.move_to_end(directory)
+                while len(self._cache) > self.max_cached_dirs:
+                    self._cache.popitem(last=False)
+        return entries
@@ -0,0 +1,124 @@
+"""
+Bounded capture of command output.
+
+A `BoundedOutput` keeps the first `head_bytes` and the last `tail_bytes` of a
+stream in memory, however much is written to it. Once the output outgrows that, all
+of it goes to a temporary file instead, and the rendered text shows the head and
+the tail around a note that points to the file, so the model can page through the
+rest with `grep` or `sed` rather than receive it whole.
+"""
+
+import codecs
+import os
+import tempfile
+from dataclasses import dataclass
+
+from .run import MAX_RESPONSE_LEN
+
+
+@dataclass(frozen=True, kw_only=True)
+class OutputSettings:
+    """
+    At most `head_bytes + tail_bytes` of each of stdout and stderr are returned; with
+    `spill`, output beyond that is written in full to a file in `spill_dir` (the
+    system's temporary directory by default); `BashTool` gives its sessions a
+    directory of their own in it, which its `close` removes. While a command runs,
+    what it has printed is reported every `stream_interval` seconds (None never
+    reports it), at most `head_bytes + tail_bytes` at a time.
+    """
+
+    head_bytes: int = MAX_RESPONSE_LEN // 2
+    tail_bytes: int = MAX_RESPONSE_LEN // 2
+    spill: bool = True
+    spill_dir: str | None = None
+    stream_interval: float | None = 0.5
+
+
+class BoundedOutput:
+    """Output of one stream of one command; see the module docstring."""
+
+    def __init__(
+        self, settings: OutputSettings, name: str = "output", stream: bool = False
+    ):
+        self.settings = settings
+        self.name = name
+        self.stream = stream
+        self.total = 0
+        self.path: str | None = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._file = None
+        # written since the last `take_new`, for streaming
+        self._new = bytearray()
+        self._skipped = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    @property
+    def clipped(self) -> bool:
+        return self.total > len(self._head) + len(self._tail)
+
+    def write(self, data: bytes | bytearray | memoryview):
+        if not data:
+            return
+        settings = self.settings
+        limit = settings.head_bytes + settings.tail_bytes
+        if settings.spill and self._file is None and self.total + len(data) > limit:
+            self._start_spill()
+        if self._file is not None:
+            self._file.write(data)
+        self.total += len(data)
+
+        if self.stream:
+            self._new += data
+            excess = len(self._new) - limit
+            if excess > 0:
+                del self._new[:excess]
+                self._skipped += excess
+
+        room = settings.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if settings.tail_bytes and data:
+            self._tail += data[-settings.tail_bytes :]
+            del self._tail[: -settings.tail_bytes]
+
+    def take_new(self) -> str:
+        """What was written since the last call, clipped at the front if too long."""
+        data, self._new = self._new, bytearray()
+        if not self._skipped:
+            return self._decoder.decode(data)
+        skipped, self._skipped = self._skipped, 0
+        # the decoder's state belonged to the skipped bytes
+        self._decoder.reset()
+        return f"<{skipped} bytes skipped>\n" + self._decoder.decode(data)
+
+    def _start_spill(self):
+        fd, self.path = tempfile.mkstemp(
+            prefix=f"bash-{self.name}-", suffix=".log", dir=self.settings.spill_dir
+        )
+        self._file = os.fdopen(fd, "wb")
+        # everything so far is still in memory
+        self._file.write(self._head)
+        self._file.write(self._tail)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def text(self) -> str:
+        """The output, with its middle replaced by a note if it was clipped."""
+        self.close()
+        head = self._head.decode(errors="replace")
+        if not self.clipped:
+            return head + self._tail.decode(errors="replace")
+        omitted = self.total - len(self._head) - len(self._tail)
+        where = (
+            f"; the full {self.name} ({self.total} bytes) is in {self.path}"
+            if self.path
+            else ""
+        )
+        return (
+            f"{head}\n<response clipped: {omitted} bytes omitted{where}>\n"
+            f"{self._tail.decode(errors='replace')}"
+        )
@@ -0,0 +1,270 @@
+"""
+Lightweight tracing of the sampling loop.
+
+`sampling_loop(tracer=...)` activates a `Tracer` for the duration of the loop; code
+running inside it, including tool calls on other tasks, opens nested spans with
+`span(name, **attributes)`. Finished spans go to the tracer's exporters: a JSONL
+file, an in-memory list for tests, or OTLP/JSON lines that an OpenTelemetry
+collector can ingest. Without an active tracer `span` returns a shared no-op object,
+so instrumented code costs next to nothing when tracing is off.
+"""
+
+import json
+import random
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Any
+
+AttributeValue = str | int | float | bool
+
+
+@dataclass
+class Span:
+    """A timed operation; times are wall-clock nanoseconds since the epoch."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, AttributeValue] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def duration(self) -> float:
+        """Duration in seconds."""
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes: AttributeValue | None):
+        """Attach attributes; None values are skipped."""
+        for key, value in attributes.items():
+            if value is not None:
+                self.attributes[key] = value
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter(metaclass=ABCMeta):
+    """Receives every finished span."""
+
+    @abstractmethod
+    def export(self, span: Span): ...
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps finished spans in `spans`, in the order they ended."""
+
+    def __init__(self):
+        self.spans: list[Span] = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def named(self, name: str) -> list[Span]:
+        return [span for span in self.spans if span.name == name]
+
+
+class _BufferedFileExporter(SpanExporter):
+    """Buffers spans and writes them `batch_size` at a time."""
+
+    def __init__(self, path: str | Path, batch_size: int = 64):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self._buffer: list[Span] = []
+        self._lock = threading.Lock()
+        self._file: IO[str] | None = None
+
+    def export(self, span):
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) < self.batch_size:
+                return
+            spans, self._buffer = self._buffer, []
+            self._write(spans)
+
+    def flush(self):
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+            if spans:
+                self._write(spans)
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, spans: list[Span]):
+        if self._file is None:
+            self._file = self.path.open("a", encoding="utf-8")
+        self._file.write(self._format(spans))
+
+    @abstractmethod
+    def _format(self, spans: list[Span]) -> str: ...
+
+
+class JSONLExporter(_BufferedFileExporter):
+    """Appends one JSON object per span to a file."""
+
+    def _format(self, spans):
+        return "".join(json.dumps(asdict(span)) + "\n" for span in spans)
+
+
+def _otlp_value(value: AttributeValue) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 values are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPJSONExporter(_BufferedFileExporter):
+    """
+    Appends batches of spans as OTLP/JSON `ExportTraceServiceRequest` lines, the
+    format read by the OpenTelemetry collector's `otlpjsonfile` receiver.
+    """
+
+    SPAN_KIND_INTERNAL = 1
+    STATUS_CODE_ERROR = 2
+
+    def __init__(
+        self,
+        path: str | Path,
+        batch_size: int = 64,
+        service_name: str = "computer-use-demo",
+    ):
+        super().__init__(path, batch_size)
+        self.service_name = service_name
+
+    def _format(self, spans):
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [self._span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        return json.dumps(request) + "\n"
+
+    def _span(self, span: Span) -> dict[str, Any]:
+        otlp_span: dict[str, Any] = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": self.SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in span.attributes.items()
+            ],
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        if span.error:
+            otlp_span["status"] = {
+                "code": self.STATUS_CODE_ERROR,
+                "message": span.error,
+            }
+        return otlp_span
+
+
+class Tracer:
+    """Creates spans and hands finished ones to `exporters`."""
+
+    def __init__(self, *exporters: SpanExporter):
+        self.exporters = exporters
+
+    @contextmanager
+    def span(self, name: str, **attributes: AttributeValue | None):
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else f"{random.getrandbits(128):032x}",
+            span_id=f"{random.getrandbits(64):016x}",
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+        )
+        span.set(**attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            for exporter in self.exporters:
+                exporter.export(span)
+
+    @contextmanager
+    def activate(self):
+        """Make this the tracer used by `span` in the current context."""
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    def flush(self):
+        for exporter in self.exporters:
+            exporter.flush()
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+
+_current_tracer: ContextVar[Tracer | None] = ContextVar("tracer", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("span", default=None)
+
+
+def span(name: str, **attributes: AttributeValue | None):
+    """A span under the active tracer, or a no-op if tracing is off."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return _NOOP_SPAN
+    return tracer.span(name, **attributes)
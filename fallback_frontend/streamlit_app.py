@@ -3,7 +3,7 @@ import asyncio
 import os
 import base64
 from computer_use_demo.loop import sampling_loop, APIProvider
-from computer_use_demo.tools import ToolResult
+from computer_use_demo.tools import PartialResult, ToolResult
 from anthropic.types.beta import BetaMessageParam, BetaMessage
 from anthropic import APIResponse
 import json
@@ -102,13 +102,17 @@ async def run_computer_use():
             st.session_state.messages.append(("assistant", content_block.get("text")))
 
     def tool_output_callback(result: ToolResult, tool_use_id: str):
+        if isinstance(result, PartialResult):
+            # output of a command that is still running; the final result follows
+            tool_output.write(f"> Tool Output [{tool_use_id}]: {result.output or result.error}")
+            return
         if result.output:
             tool_output.write(f"> Tool Output [{tool_use_id}]: {result.output}")
         if result.error:
             tool_output.write(f"!!! Tool Error [{tool_use_id}]: {result.error}")
-        if result.base64_image:
+        if result.image or result.base64_image:
             st.session_state.screenshots.append(
-                (f"screenshot_{tool_use_id}.png", result.base64_image)
+                (f"screenshot_{tool_use_id}.png", result)
             )
 
     def api_response_callback(response: APIResponse[BetaMessage]):
@@ -154,9 +158,9 @@ for role, message in st.session_state.messages:
 if st.session_state.screenshots:
     st.subheader("Screenshots")
     cols = st.columns(3)
-    for idx, (filename, base64_image) in enumerate(st.session_state.screenshots):
+    for idx, (filename, result) in enumerate(st.session_state.screenshots):
         col = cols[idx % 3]
-        image_data = base64.b64decode(base64_image)
+        image_data = result.image_data()
         col.image(image_data, caption=filename)
         
         # Add download button for each image
@@ -2,10 +2,9 @@ import asyncio
 import os
 import sys
 import json
-import base64
 
 from computer_use_demo.loop import sampling_loop, APIProvider
-from computer_use_demo.tools import ToolResult
+from computer_use_demo.tools import CLIResult, PartialResult, ToolResult
 from anthropic.types.beta import BetaMessage, BetaMessageParam
 from anthropic import APIResponse
 
@@ -42,17 +41,35 @@ async def main():
         if isinstance(content_block, dict) and content_block.get("type") == "text":
             print("Assistant:", content_block.get("text"))
 
+    # tool calls whose output was printed while they ran
+    streamed: set[str] = set()
+
     def tool_output_callback(result: ToolResult, tool_use_id: str):
+        if isinstance(result, PartialResult):
+            # output of a command that is still running, printed as it arrives
+            if tool_use_id not in streamed:
+                streamed.add(tool_use_id)
+                print(f"> Tool Output [{tool_use_id}] (running):")
+            if result.output:
+                print(result.output, end="", flush=True)
+            if result.error:
+                print(result.error, end="", file=sys.stderr, flush=True)
+            return
+        if tool_use_id in streamed:
+            streamed.discard(tool_use_id)
+            if isinstance(result, CLIResult):
+                # the output was printed above; show only how the command ended
+                print(f"\n> Tool Finished [{tool_use_id}]", result.system or "")
+                return
         if result.output:
             print(f"> Tool Output [{tool_use_id}]:", result.output)
         if result.error:
             print(f"!!! Tool Error [{tool_use_id}]:", result.error)
-        if result.base64_image:
+        if result.image or result.base64_image:
             # Save the image to a file if needed
             os.makedirs("screenshots", exist_ok=True)
-            image_data = result.base64_image
             with open(f"screenshots/screenshot_{tool_use_id}.png", "wb") as f:
-                f.write(base64.b64decode(image_data))
+                f.write(result.image_data())
             print(f"Took screenshot screenshot_{tool_use_id}.png")
 
     def api_response_callback(response: APIResponse[BetaMessage]):
@@ -62,6 +79,13 @@ async def main():
             "\n",
         )
 
+    def usage_callback(usage):
+        print(
+            f"Tokens: input {usage.input_tokens}, output {usage.output_tokens}, "
+            f"cache read {usage.cache_read_input_tokens or 0}, "
+            f"cache write {usage.cache_creation_input_tokens or 0}"
+        )
+
     # Run the sampling loop
     messages = await sampling_loop(
         model="anthropic.claude-3-5-sonnet-20241022-v2:0",
@@ -74,6 +98,7 @@ async def main():
         api_key="",
         only_n_most_recent_images=10,
         max_tokens=4096,
+        usage_callback=usage_callback,
     )
 
 
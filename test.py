@@ -1,3 +1,5 @@
+import asyncio
+
 from computer_use_demo.loop import APIProvider, sampling_loop
 
 # Setup
@@ -12,14 +14,30 @@ messages = [
     }
 ]
 
+
+def your_output_handler(content_block):
+    if content_block.type == "text":
+        print("Assistant:", content_block.text)
+
+
+def your_tool_handler(result, tool_use_id):
+    print(f"Tool result [{tool_use_id}]:", result.output or result.error or "(image)")
+
+
+def your_response_handler(response):
+    pass
+
+
 # Run the loop
-sampling_loop(
-    model=model,
-    provider=provider,
-    system_prompt_suffix="",
-    messages=messages,
-    output_callback=your_output_handler,
-    tool_output_callback=your_tool_handler,
-    api_response_callback=your_response_handler,
-    api_key=""  # Not needed for Bedrock
-)
\ No newline at end of file
+asyncio.run(
+    sampling_loop(
+        model=model,
+        provider=provider,
+        system_prompt_suffix="",
+        messages=messages,
+        output_callback=your_output_handler,
+        tool_output_callback=your_tool_handler,
+        api_response_callback=your_response_handler,
+        api_key=""  # Not needed for Bedrock
+    )
+)
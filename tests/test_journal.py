@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.stub_server import StubMessagesServer, tool_use_block
+from computer_use_demo.context import ContextManager
+from computer_use_demo.journal import SessionJournal, resume_session
+from computer_use_demo.loop import sampling_loop
+from computer_use_demo.tools import EditTool, ToolCollection
+
+CRASH_AT = 6
+
+
+def test_resume_after_compaction(tmp_path, monkeypatch):
+    """
+    With a tiny budget every turn drops exactly the turn pair it adds, so the
+    history keeps its length; the journal must still record each turn and the
+    eviction note folded into the first message.
+    """
+    requests = []
+    crash = {"on": True}
+
+    def script(body):
+        requests.append(body["messages"])
+        turn = len(requests)
+        if turn > CRASH_AT + 1:
+            return None
+        return [
+            tool_use_block(
+                "str_replace_editor",
+                command="create",
+                path=str(tmp_path / f"f{turn}.txt"),
+                file_text=f"{turn}\n",
+            )
+        ]
+
+    # the request of turn CRASH_AT fails, after that turn was compacted
+    def hook(body):
+        if len(requests) == CRASH_AT - 1 and crash["on"]:
+            requests.append(body["messages"])
+            return 400, {}, {"type": "error", "error": {"type": "x", "message": "x"}}
+
+    options = dict(
+        output_callback=lambda block: None,
+        tool_output_callback=lambda result, tool_use_id: None,
+        api_response_callback=lambda response: None,
+        api_key="key",
+        prompt_caching=False,
+    )
+    messages = [{"role": "user", "content": "go"}]
+    with StubMessagesServer(script, hook=hook) as server:
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        with SessionJournal(tmp_path / "journal") as journal:
+            with pytest.raises(Exception):
+                asyncio.run(
+                    sampling_loop(
+                        model="stub",
+                        provider="anthropic",
+                        system_prompt_suffix="",
+                        messages=messages,
+                        tool_collection=ToolCollection(EditTool()),
+                        context_manager=ContextManager(1, keep_recent_turns=2),
+                        journal=journal,
+                        **options,
+                    )
+                )
+        # compaction kept the history at a fixed length over several turns
+        assert len(requests[2]) == len(requests[-1]) == 5
+        assert "removed" in json.dumps(requests[-1][0])
+
+        crash["on"] = False
+        asyncio.run(
+            resume_session(
+                tmp_path / "journal",
+                tool_collection=ToolCollection(EditTool()),
+                context_manager=ContextManager(1, keep_recent_turns=2),
+                **options,
+            )
+        )
+    # the resumed session repeats the failed request, apart from the note on resuming
+    failed, resumed = requests[CRASH_AT - 1], requests[CRASH_AT]
+    assert resumed[:-1] == failed[:-1]
+    assert resumed[-1]["content"][:-1] == failed[-1]["content"]